@@ -12,5 +12,7 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "config.settings")
+# Настройки выбирают соединения с БД для ASGI (CONN_MAX_AGE по умолчанию 0)
+os.environ.setdefault("DJANGO_ASGI", "True")
 
 application = get_asgi_application()
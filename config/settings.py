@@ -42,6 +42,7 @@ INSTALLED_APPS = [
     "django.contrib.sessions",
     "django.contrib.messages",
     "django.contrib.staticfiles",
+    "django.contrib.postgres",
     "rest_framework",
     "django_filters",
     "rest_framework_simplejwt",
@@ -49,13 +50,16 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    "djangoDDS.middleware.RequestMetricsMiddleware",
     "django.middleware.security.SecurityMiddleware",
+    "djangoDDS.middleware.ReplicaRoutingMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
     "django.contrib.auth.middleware.AuthenticationMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
+    "djangoDDS.middleware.ProfilingMiddleware",
 ]
 
 REST_FRAMEWORK = {
@@ -70,11 +74,36 @@ SIMPLE_JWT = {
     "REFRESH_TOKEN_LIFETIME": timedelta(days=1),
 }
 
+# Метрики запросов (GET /metrics/ с адресов METRICS_ALLOWED_IPS) и журнал
+# запросов дольше SLOW_REQUEST_MS миллисекунд вместе с их SQL
+SLOW_REQUEST_MS = int(os.getenv("SLOW_REQUEST_MS", "500"))
+METRICS_ALLOWED_IPS = os.getenv("METRICS_ALLOWED_IPS", "127.0.0.1,::1").split(",")
+
+# Профилирование запросов: по заголовку X-Profile от сотрудника или со
+# значением PROFILER_TOKEN и случайно с долей PROFILER_SAMPLE_RATE
+PROFILER_SAMPLE_RATE = float(os.getenv("PROFILER_SAMPLE_RATE", "0"))
+PROFILER_TOKEN = os.getenv("PROFILER_TOKEN", "")
+PROFILER_INTERVAL_MS = float(os.getenv("PROFILER_INTERVAL_MS", "5"))
+PROFILER_DIR = os.getenv("PROFILER_DIR") or str(BASE_DIR / "profiles")
+
+LOGGING = {
+    "version": 1,
+    "disable_existing_loggers": False,
+    "handlers": {"console": {"class": "logging.StreamHandler"}},
+    "loggers": {
+        "djangoDDS.slow_requests": {"handlers": ["console"], "level": "WARNING"},
+        "djangoDDS.health": {"handlers": ["console"], "level": "WARNING"},
+    },
+}
+
 ROOT_URLCONF = "config.urls"
 
 TEMPLATES = [
     {
-        "BACKEND": "django.template.backends.django.DjangoTemplates",
+        # DjangoTemplates с учётом времени отрисовки в метриках запроса
+        "BACKEND": "djangoDDS.metrics.InstrumentedDjangoTemplates",
+        # Имя прежнего бэкенда: DRF обращается к engines["django"]
+        "NAME": "django",
         "DIRS": [],
         "APP_DIRS": True,
         "OPTIONS": {
@@ -101,9 +130,80 @@ DATABASES = {
         "PASSWORD": os.getenv("PASSWORD"),
         "HOST": os.getenv("HOST"),
         "PORT": os.getenv("PORT"),
+        # Перед использованием соединение проверяется и при обрыве заменяется
+        "CONN_HEALTH_CHECKS": os.getenv("DB_HEALTH_CHECKS", "True") == "True",
     }
 }
 
+# Пул соединений psycopg 3 (DB_POOL=True) или постоянные соединения
+# (DB_CONN_MAX_AGE секунд), чтобы не открывать соединение на каждый запрос.
+# Вместе их использовать нельзя: при пуле CONN_MAX_AGE должен быть 0.
+# Под ASGI (config/asgi.py ставит DJANGO_ASGI) постоянные соединения
+# по умолчанию выключены: синхронный код выполняется в разных потоках, и
+# соединения потоков копятся до max_connections. Там используйте пул.
+ASGI = os.getenv("DJANGO_ASGI") == "True"
+if os.getenv("DB_POOL") == "True":
+    DATABASES["default"]["OPTIONS"] = {
+        "pool": {
+            "min_size": int(os.getenv("DB_POOL_MIN_SIZE", "2")),
+            "max_size": int(os.getenv("DB_POOL_MAX_SIZE", "10")),
+            "timeout": float(os.getenv("DB_POOL_TIMEOUT", "10")),
+            "max_idle": float(os.getenv("DB_POOL_MAX_IDLE", "600")),
+            "max_lifetime": float(os.getenv("DB_POOL_MAX_LIFETIME", "3600")),
+        }
+    }
+else:
+    DATABASES["default"]["CONN_MAX_AGE"] = int(
+        os.getenv("DB_CONN_MAX_AGE") or ("0" if ASGI else "60")
+    )
+
+# Реплики для чтения: DB_REPLICAS="хост[:порт]=вес,...", например
+# "replica1=3,replica2:5433=1". Остальные параметры подключения — как у
+# основной БД. Чтения безопасных запросов распределяются по весам, запись и
+# чтения после своей записи (DB_REPLICA_PIN_SECONDS) идут в основную БД.
+DATABASE_REPLICAS = {}
+for index, item in enumerate(filter(None, os.getenv("DB_REPLICAS", "").split(",")), 1):
+    address, _, weight = item.strip().partition("=")
+    host, _, port = address.partition(":")
+    alias = f"replica_{index}"
+    DATABASES[alias] = {
+        **DATABASES["default"],
+        "HOST": host,
+        "PORT": port or DATABASES["default"]["PORT"],
+        "TEST": {"MIRROR": "default"},
+    }
+    DATABASE_REPLICAS[alias] = int(weight or 1)
+
+DATABASE_ROUTERS = ["djangoDDS.routers.PrimaryReplicaRouter"]
+REPLICA_PIN_SECONDS = int(os.getenv("DB_REPLICA_PIN_SECONDS", "5"))
+
+# Общий кеш процессов: снимок справочников, версии областей кеша таблицы и
+# счётчики попаданий. CACHE_URL="redis://хост:6379/0" (Redis) или
+# "memcached://хост:11211" (memcached). Без CACHE_URL кеш в памяти процесса
+# подходит только для одного процесса: остальные воркеры не узнают об
+# изменениях справочников и записей.
+CACHE_URL = os.getenv("CACHE_URL", "")
+if CACHE_URL.startswith(("redis://", "rediss://")):
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.redis.RedisCache",
+            "LOCATION": CACHE_URL,
+        }
+    }
+elif CACHE_URL.startswith("memcached://"):
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.memcached.PyMemcacheCache",
+            "LOCATION": CACHE_URL.removeprefix("memcached://"),
+        }
+    }
+else:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        }
+    }
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -0,0 +1,133 @@
+from django.http import Http404, JsonResponse
+from django.views import View
+from rest_framework.exceptions import NotFound
+
+from .filters import CashFlowRecordFilter
+from .models import CashFlowRecord, Category, Status, SubCategory, Type
+from .pagination import CashFlowKeysetPaginator
+from .search import atrigram_available
+from .serializers import (CashFlowRecordSerializer, CategorySerializer,
+                          StatusSerializer, SubCategorySerializer,
+                          TypeSerializer)
+
+# Асинхронные JSON-представления для работы под ASGI.
+#
+# Запросы к БД выполняются асинхронным ORM (aget, async for, acount): цикл
+# событий на время ожидания базы свободен и обслуживает других клиентов, но
+# каждый запрос ORM по-прежнему выполняется в рабочем потоке через
+# sync_to_async и занимает его, пока база не ответит. Сериализаторы здесь
+# работают только с уже загруженными объектами и к БД не обращаются.
+
+
+class AsyncCashFlowListView(View):
+    """
+    Список записей с фильтрами и курсорной пагинацией, как у cashflow_list.
+
+    С параметром count=1 в ответ добавляется общее количество записей
+    по фильтру.
+    """
+
+    async def get(self, request):
+        if request.GET.get("search"):
+            # Проверка pg_trgm синхронная: прогреваем её до построения фильтра
+            await atrigram_available(CashFlowRecord.objects.db)
+        queryset = CashFlowRecordFilter(
+            request.GET, queryset=CashFlowRecord.objects.with_refs()
+        ).qs
+
+        paginator = CashFlowKeysetPaginator()
+        try:
+            page = await paginator.apaginate_queryset(queryset, request)
+        except NotFound as exc:
+            return JsonResponse({"detail": str(exc.detail)}, status=404)
+
+        data = {
+            "results": CashFlowRecordSerializer(page.objects, many=True).data,
+            "next": page.next_cursor,
+            "prev": page.prev_cursor,
+        }
+        if request.GET.get("count") in ("1", "true"):
+            data["count"] = await queryset.acount()
+        return JsonResponse(data)
+
+
+class AsyncCashFlowDetailView(View):
+    """
+    Карточка записи.
+    """
+
+    async def get(self, request, pk):
+        try:
+            obj = await CashFlowRecord.objects.with_refs().aget(pk=pk)
+        except CashFlowRecord.DoesNotExist:
+            raise Http404
+        return JsonResponse(CashFlowRecordSerializer(obj).data)
+
+
+class AsyncReferenceListView(View):
+    """
+    Список элементов справочника.
+    """
+
+    model = None
+    serializer_class = None
+
+    async def get(self, request):
+        objects = [obj async for obj in self.model.objects.order_by("id")]
+        return JsonResponse({"results": self.serializer_class(objects, many=True).data})
+
+
+class AsyncReferenceDetailView(View):
+    """
+    Элемент справочника.
+    """
+
+    model = None
+    serializer_class = None
+
+    async def get(self, request, pk):
+        try:
+            obj = await self.model.objects.aget(pk=pk)
+        except self.model.DoesNotExist:
+            raise Http404
+        return JsonResponse(self.serializer_class(obj).data)
+
+
+class AsyncStatusListView(AsyncReferenceListView):
+    model = Status
+    serializer_class = StatusSerializer
+
+
+class AsyncStatusDetailView(AsyncReferenceDetailView):
+    model = Status
+    serializer_class = StatusSerializer
+
+
+class AsyncTypeListView(AsyncReferenceListView):
+    model = Type
+    serializer_class = TypeSerializer
+
+
+class AsyncTypeDetailView(AsyncReferenceDetailView):
+    model = Type
+    serializer_class = TypeSerializer
+
+
+class AsyncCategoryListView(AsyncReferenceListView):
+    model = Category
+    serializer_class = CategorySerializer
+
+
+class AsyncCategoryDetailView(AsyncReferenceDetailView):
+    model = Category
+    serializer_class = CategorySerializer
+
+
+class AsyncSubCategoryListView(AsyncReferenceListView):
+    model = SubCategory
+    serializer_class = SubCategorySerializer
+
+
+class AsyncSubCategoryDetailView(AsyncReferenceDetailView):
+    model = SubCategory
+    serializer_class = SubCategorySerializer
@@ -0,0 +1,254 @@
+from collections import defaultdict
+from datetime import date, timedelta
+from decimal import Decimal
+
+from django.db import connections, router, transaction
+from django.db.models import Case, DecimalField, F, Value, When
+from django.utils import timezone
+from rest_framework.exceptions import ValidationError
+
+from .models import CashFlowBalanceSnapshot, CashFlowDailyRollup, Type
+from .partitioning import next_period, period_start
+from .references import get_references
+
+# Знак типа операции в остатке; записи других типов остаток не меняют
+BALANCE_SIGNS = {"Пополнение": 1, "Списание": -1}
+SNAPSHOT_INTERVALS = ("month", "year")
+
+BALANCE_FIELD = DecimalField(max_digits=18, decimal_places=2)
+
+
+def parse_balance_params(query_params):
+    """
+    Читает date_from и date_to (YYYY-MM-DD) из параметров запроса.
+    """
+    dates = []
+    for name in ("date_from", "date_to"):
+        value = query_params.get(name) or None
+        if value is not None:
+            try:
+                value = date.fromisoformat(value)
+            except ValueError:
+                raise ValidationError({name: "Ожидается дата в формате YYYY-MM-DD."})
+        dates.append(value)
+    date_from, date_to = dates
+    if date_from and date_to and date_from > date_to:
+        raise ValidationError({"date_to": "Дата окончания раньше даты начала."})
+    return date_from, date_to
+
+
+def period_end(day, interval):
+    return next_period(period_start(day, interval), interval) - timedelta(days=1)
+
+
+def boundary_snapshot(using=None):
+    """
+    Последний снимок на границе отключённых секций или None.
+    """
+    return (
+        CashFlowBalanceSnapshot.objects.using(using)
+        .filter(is_boundary=True)
+        .order_by("-date")
+        .first()
+    )
+
+
+def daily_balances(date_from=None, date_to=None, using=None):
+    """
+    Остаток на конец каждого дня с операциями от date_from до date_to.
+
+    Движение за день и нарастающий итог считаются в БД по дневным итогам:
+    SUM(...) OVER (ORDER BY date). Итог начинается от последнего снимка
+    остатка до date_from, поэтому просматриваются только дни после него.
+    Без такого снимка остаток отсчитывается от границы отключённых секций
+    (снимок is_boundary), а если секции не отключались — от нуля.
+
+    Возвращает (остаток на начало date_from, [{"date", "change",
+    "balance"}, ...]).
+    """
+    # Последний снимок до date_from и последняя граница — одним запросом
+    snapshots = CashFlowBalanceSnapshot.objects.using(using).order_by("-date")
+    candidates = snapshots.filter(is_boundary=True)[:1]
+    if date_from is not None:
+        candidates = snapshots.filter(date__lt=date_from)[:1].union(candidates)
+    candidates = sorted(candidates, key=lambda snapshot: snapshot.date)
+    anchor = boundary = None
+    for snapshot in candidates:
+        if date_from is not None and snapshot.date < date_from:
+            anchor = snapshot
+        if snapshot.is_boundary:
+            boundary = snapshot
+    if anchor is not None:
+        boundary = None
+
+    using = using or router.db_for_read(CashFlowDailyRollup)
+    connection = connections[using]
+    qn = connection.ops.quote_name
+    signs = " ".join("WHEN %s THEN r.total * %s" for _ in BALANCE_SIGNS)
+    params = [value for item in BALANCE_SIGNS.items() for value in item]
+    conditions = []
+    if anchor is not None:
+        conditions.append("r.date > %s")
+        params.append(anchor.date)
+    if date_to is not None:
+        # Остаток границы задан на её дату: итог до неё нужен целиком
+        conditions.append("r.date <= %s")
+        params.append(max(date_to, boundary.date) if boundary else date_to)
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"WITH days AS ("
+            f" SELECT r.date, SUM(CASE t.name {signs} ELSE 0 END) AS change"
+            f" FROM {qn(CashFlowDailyRollup._meta.db_table)} AS r"
+            f" JOIN {qn(Type._meta.db_table)} AS t ON t.id = r.type_id"
+            f" {where} GROUP BY r.date"
+            f") SELECT date, change, SUM(change) OVER (ORDER BY date)"
+            f" FROM days ORDER BY date",
+            params,
+        )
+        rows = cursor.fetchall()
+
+    start = Decimal("0.00")
+    if anchor is not None:
+        start = anchor.balance
+    elif boundary is not None:
+        # Операции задним числом до границы уже входят в её остаток
+        start = boundary.balance
+        for day, _, running in rows:
+            if day > boundary.date:
+                break
+            start = boundary.balance - running
+    opening = start
+    days = []
+    for day, change, running in rows:
+        if date_to is not None and day > date_to:
+            break
+        balance = start + running
+        # Дни между снимком и date_from нужны только для остатка на начало
+        if date_from is not None and day < date_from:
+            opening = balance
+            continue
+        days.append({"date": day, "change": change, "balance": balance})
+    return opening, days
+
+
+def build_snapshots(interval="month", until=None, rebuild=False):
+    """
+    Создаёт снимки остатка на концы периодов interval до until
+    (по умолчанию — вчера) после последнего имеющегося снимка.
+
+    rebuild удаляет снимки и считает остаток заново: с начала журнала или,
+    после отключения старых секций (detach_cashflow_partitions), от
+    последнего снимка на их границе — он и более ранние снимки остаются.
+    """
+    until = until or timezone.localdate() - timedelta(days=1)
+    using = router.db_for_write(CashFlowBalanceSnapshot)
+    connection = connections[using]
+    table = connection.ops.quote_name(CashFlowBalanceSnapshot._meta.db_table)
+    with transaction.atomic(using=using):
+        # Запись операций сдвигает снимки в своей транзакции (shift_snapshots)
+        # и ждёт этой блокировки, поэтому ни одно изменение не пропадёт из
+        # создаваемых снимков
+        with connection.cursor() as cursor:
+            cursor.execute(f"LOCK TABLE {table} IN SHARE ROW EXCLUSIVE MODE")
+        snapshots = CashFlowBalanceSnapshot.objects.using(using)
+        if rebuild:
+            boundary = boundary_snapshot(using)
+            if boundary is not None:
+                snapshots.filter(date__gt=boundary.date).delete()
+            else:
+                snapshots.all().delete()
+        last = snapshots.order_by("-date").first()
+        start = last.date + timedelta(days=1) if last is not None else None
+        balance, days = daily_balances(start, until, using=using)
+        if start is None:
+            if not days:
+                return []
+            start = days[0]["date"]
+
+        created = []
+        days = iter(days)
+        day = next(days, None)
+        end = period_end(start, interval)
+        while end <= until:
+            while day is not None and day["date"] <= end:
+                balance = day["balance"]
+                day = next(days, None)
+            created.append(CashFlowBalanceSnapshot(date=end, balance=balance))
+            end = period_end(end + timedelta(days=1), interval)
+        return snapshots.bulk_create(created)
+
+
+def refresh_snapshots(date_from=None, using=None):
+    """
+    Пересчитывает имеющиеся снимки с датой не раньше date_from (без неё —
+    все) по дневным итогам, например после rebuild_rollups. Остаток
+    считается от последнего снимка до date_from.
+
+    Снимки по границу отключённых секций не пересчитываются: итогов
+    отключённых периодов больше нет.
+    """
+    using = using or router.db_for_write(CashFlowBalanceSnapshot)
+    connection = connections[using]
+    table = connection.ops.quote_name(CashFlowBalanceSnapshot._meta.db_table)
+    with transaction.atomic(using=using):
+        with connection.cursor() as cursor:
+            cursor.execute(f"LOCK TABLE {table} IN SHARE ROW EXCLUSIVE MODE")
+        boundary = boundary_snapshot(using)
+        if boundary is not None and (date_from is None or date_from <= boundary.date):
+            date_from = boundary.date + timedelta(days=1)
+        snapshots = CashFlowBalanceSnapshot.objects.using(using).order_by("date")
+        if date_from is not None:
+            snapshots = snapshots.filter(date__gte=date_from)
+        snapshots = list(snapshots)
+        if not snapshots:
+            return []
+        balance, days = daily_balances(date_from, snapshots[-1].date, using=using)
+
+        days = iter(days)
+        day = next(days, None)
+        for snapshot in snapshots:
+            while day is not None and day["date"] <= snapshot.date:
+                balance = day["balance"]
+                day = next(days, None)
+            snapshot.balance = balance
+        CashFlowBalanceSnapshot.objects.using(using).bulk_update(snapshots, ["balance"])
+        return snapshots
+
+
+def write_boundary_snapshot(day, using=None):
+    """
+    Запоминает остаток на конец day как границу отключённых секций.
+    Вызывается до удаления дневных итогов отключаемых периодов.
+    """
+    # Остаток на начало следующего дня — от ближайшего снимка до него
+    balance, _ = daily_balances(day + timedelta(days=1), day, using=using)
+    snapshot, _ = CashFlowBalanceSnapshot.objects.using(using).update_or_create(
+        date=day, defaults={"balance": balance, "is_boundary": True}
+    )
+    return snapshot
+
+
+def shift_snapshots(changes, using=None):
+    """
+    Сдвигает снимки на изменения дневных итогов: изменение за день d
+    входит во все снимки с датой не раньше d. Один UPDATE с CASE по датам.
+
+    changes — [(ключ итога, сумма, количество), ...] из RollupDelta.
+    """
+    type_names = get_references().type_names
+    deltas = defaultdict(Decimal)
+    for (day, type_id, *_), total, _count in changes:
+        deltas[day] += BALANCE_SIGNS.get(type_names.get(type_id), 0) * total
+    dates = sorted(day for day, delta in deltas.items() if delta)
+    if not dates:
+        return
+
+    cumulative = Decimal("0.00")
+    whens = []
+    for day in dates:
+        cumulative += deltas[day]
+        whens.append(When(date__gte=day, then=Value(cumulative)))
+    CashFlowBalanceSnapshot.objects.using(using).filter(date__gte=dates[0]).update(
+        balance=F("balance") + Case(*reversed(whens), output_field=BALANCE_FIELD)
+    )
@@ -0,0 +1,244 @@
+import random
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from decimal import Decimal
+from urllib.parse import urlencode
+
+from django.db import connections
+from django.test import Client
+from django.urls import reverse
+
+from .filters import FILTER_COMBINATIONS, sample_filter_values
+from .models import CashFlowRecord
+
+PERCENTILES = (50, 90, 95, 99)
+
+
+@dataclass
+class Scenario:
+    """
+    Один замер: запрос к представлению, повторяемый iterations раз.
+
+    request(client, index) выполняет запрос и возвращает ответ; index —
+    номер повтора, по нему сценарии выбирают разные записи. writes —
+    сценарий создаёт или изменяет записи в БД.
+    """
+
+    name: str
+    request: callable
+    params: dict = field(default_factory=dict)
+    writes: bool = False
+
+
+def percentile(values, q):
+    """
+    Перцентиль отсортированных значений (линейная интерполяция).
+    """
+    if not values:
+        return None
+    position = (len(values) - 1) * q / 100
+    lower = int(position)
+    upper = min(lower + 1, len(values) - 1)
+    return values[lower] + (values[upper] - values[lower]) * (position - lower)
+
+
+def summarize(name, params, latencies, errors, elapsed):
+    latencies = sorted(latencies)
+    total = len(latencies) + errors
+    result = {
+        "name": name,
+        "params": params,
+        "requests": total,
+        "errors": errors,
+        "throughput_rps": round(total / elapsed, 2) if elapsed else None,
+    }
+    if latencies:
+        result.update(
+            {
+                "min_ms": round(latencies[0], 3),
+                "mean_ms": round(statistics.fmean(latencies), 3),
+                "max_ms": round(latencies[-1], 3),
+            }
+        )
+        for q in PERCENTILES:
+            result[f"p{q}_ms"] = round(percentile(latencies, q), 3)
+    return result
+
+
+def run_scenario(scenario, iterations, warmup=5, concurrency=1):
+    """
+    Выполняет сценарий и возвращает задержки (мс) и пропускную способность.
+
+    При concurrency > 1 запросы идут из нескольких потоков, у каждого свой
+    клиент и своё соединение с БД.
+    """
+
+    def worker(indexes):
+        client = Client(HTTP_ACCEPT="application/json")
+        latencies, errors = [], 0
+        try:
+            for index in indexes:
+                started = time.perf_counter()
+                response = scenario.request(client, index)
+                elapsed = (time.perf_counter() - started) * 1000
+                if response.status_code >= 400:
+                    errors += 1
+                else:
+                    latencies.append(elapsed)
+        finally:
+            # Соединения потоков закрываем сами, основное остаётся открытым
+            if concurrency > 1:
+                connections.close_all()
+        return latencies, errors
+
+    client = Client(HTTP_ACCEPT="application/json")
+    for index in range(warmup):
+        scenario.request(client, index)
+
+    started = time.perf_counter()
+    if concurrency > 1:
+        with ThreadPoolExecutor(concurrency) as executor:
+            chunks = executor.map(
+                worker, [range(i, iterations, concurrency) for i in range(concurrency)]
+            )
+            latencies, errors = [], 0
+            for chunk_latencies, chunk_errors in chunks:
+                latencies += chunk_latencies
+                errors += chunk_errors
+    else:
+        latencies, errors = worker(range(iterations))
+    elapsed = time.perf_counter() - started
+    return summarize(scenario.name, scenario.params, latencies, errors, elapsed)
+
+
+def sample_record_ids(count, seed=0):
+    """
+    Идентификаторы действующих записей, равномерно по диапазону id: без
+    ORDER BY random(), который на больших таблицах читает всю таблицу.
+    """
+    bounds = CashFlowRecord.objects.order_by("pk").values_list("pk", flat=True)
+    first, last = bounds.first(), bounds.last()
+    if first is None:
+        return []
+    rng = random.Random(seed)
+    ids = set()
+    for _ in range(count):
+        pk = (
+            CashFlowRecord.objects.filter(pk__gte=rng.randint(first, last))
+            .order_by("pk")
+            .values_list("pk", flat=True)
+            .first()
+        )
+        if pk is not None:
+            ids.add(pk)
+    return sorted(ids)
+
+
+def default_scenarios(days=30, sample_size=50, include_writes=False):
+    """
+    Сценарии по умолчанию: список записей с каждой комбинацией фильтров
+    (JSON и закешированная HTML-страница), вторая страница списка и
+    карточка. С include_writes — ещё создание и изменение записи: они
+    меняют данные в БД, на которой идут замеры.
+    """
+    values = sample_filter_values(days)
+    record_ids = sample_record_ids(sample_size)
+    if values is None or not record_ids:
+        return []
+
+    list_url = reverse("cashflow_list")
+    scenarios = []
+    for combination in FILTER_COMBINATIONS:
+        params = {name: str(values[name]) for name in combination}
+        name = "list:" + ("+".join(combination) or "all")
+        scenarios.append(
+            Scenario(
+                name,
+                lambda client, index, url=f"{list_url}?{urlencode(params)}": (
+                    client.get(url)
+                ),
+                params,
+            )
+        )
+
+    cursor = _next_cursor(list_url)
+    if cursor:
+        scenarios.append(
+            Scenario(
+                "list:next_page",
+                lambda client, index: client.get(list_url, {"cursor": cursor}),
+                {"cursor": cursor},
+            )
+        )
+    scenarios.append(
+        Scenario(
+            "list:html",
+            lambda client, index: client.get(list_url, HTTP_ACCEPT="text/html"),
+        )
+    )
+    scenarios.append(
+        Scenario(
+            "detail",
+            lambda client, index: client.get(
+                reverse("cashflow_detail", args=[record_ids[index % len(record_ids)]])
+            ),
+        )
+    )
+    if not include_writes:
+        return scenarios
+
+    form = {
+        "created_at": str(values["date_to"]),
+        "status": values["status"],
+        "type": values["type"],
+        "category": values["category"],
+        "subcategory": values["subcategory"],
+        "comment": "Нагрузочный тест",
+    }
+    scenarios.append(
+        Scenario(
+            "create",
+            lambda client, index: client.post(
+                reverse("cashflow_create"),
+                {**form, "amount": str(Decimal(100) + index)},
+            ),
+            writes=True,
+        )
+    )
+    updatable = list(
+        CashFlowRecord.objects.filter(pk__in=record_ids).values(
+            "pk", "created_at", "status", "type", "category", "subcategory", "amount"
+        )
+    )
+    scenarios.append(
+        Scenario(
+            "update",
+            lambda client, index: _update_record(
+                client, updatable[index % len(updatable)], index
+            ),
+            writes=True,
+        )
+    )
+    return scenarios
+
+
+def _next_cursor(list_url):
+    response = Client(HTTP_ACCEPT="application/json").get(list_url)
+    if response.status_code != 200:
+        return None
+    return response.json().get("next")
+
+
+def _update_record(client, record, index):
+    data = {
+        "created_at": str(record["created_at"]),
+        "status": record["status"],
+        "type": record["type"],
+        "category": record["category"],
+        "subcategory": record["subcategory"],
+        "amount": str(record["amount"]),
+        "comment": f"Нагрузочный тест {index}",
+    }
+    return client.post(reverse("cashflow_update", args=[record["pk"]]), data)
@@ -0,0 +1,121 @@
+from dataclasses import dataclass, field
+
+from django.db import transaction
+from django.utils import timezone
+
+from .models import CashFlowRecord
+from .references import get_references
+from .rollups import RollupDelta
+from .serializers import CashFlowRecordBulkItemSerializer
+
+# Поля записи, которые пишет пакетная загрузка
+BULK_FIELDS = (
+    "created_at",
+    "status_id",
+    "type_id",
+    "category_id",
+    "subcategory_id",
+    "amount",
+    "comment",
+    "updated_at",
+)
+
+BULK_BATCH_SIZE = 1000
+
+
+@dataclass
+class BulkResult:
+    """
+    Итог пакетной загрузки: созданные и обновлённые записи и ошибки по строкам.
+    """
+
+    created: list = field(default_factory=list)
+    updated: list = field(default_factory=list)
+    errors: list = field(default_factory=list)
+
+
+def bulk_save_records(rows, references=None):
+    """
+    Проверяет и сохраняет пакет записей.
+
+    Справочники берутся из кешированного снимка (get_references), обновляемые
+    записи — одним запросом с блокировкой строк. Корректные строки пишутся
+    через bulk_create и bulk_update в одной транзакции вместе с дневными
+    итогами, а ошибки возвращаются по индексу строки и не мешают сохранению
+    остальных.
+    """
+    references = references or get_references()
+    result = BulkResult()
+
+    valid = []
+    for index, row in enumerate(rows):
+        serializer = CashFlowRecordBulkItemSerializer(
+            data=row, context={"references": references}
+        )
+        if serializer.is_valid():
+            valid.append((index, serializer.validated_data))
+        else:
+            result.errors.append({"index": index, "errors": serializer.errors})
+
+    update_ids = [data["id"] for _, data in valid if "id" in data]
+    with transaction.atomic():
+        # Обновляемые строки блокируются до конца транзакции, и из итогов
+        # вычитаются их текущие значения, а не прочитанные до параллельной записи
+        existing = (
+            CashFlowRecord.objects.select_for_update()
+            .only("id", *BULK_FIELDS)
+            .in_bulk(update_ids)
+        )
+
+        # bulk_update не заполняет auto_now-поля, время изменения ставим сами
+        now = timezone.now()
+        delta = RollupDelta()
+        to_create = []
+        to_update = []
+        seen_ids = set()
+        for index, data in valid:
+            if "id" in data:
+                record = existing.get(data["id"])
+                if record is None:
+                    result.errors.append(
+                        {"index": index, "errors": {"id": ["Запись не найдена."]}}
+                    )
+                    continue
+                if record.pk in seen_ids:
+                    result.errors.append(
+                        {
+                            "index": index,
+                            "errors": {"id": ["Запись повторяется в пакете."]},
+                        }
+                    )
+                    continue
+                seen_ids.add(record.pk)
+                delta.remove(record)
+                to_update.append(record)
+            else:
+                record = CashFlowRecord()
+                to_create.append(record)
+            record.created_at = data["created_at"]
+            record.status_id = data["status"]
+            record.type_id = data["type"]
+            record.category_id = data["category"]
+            record.subcategory_id = data["subcategory"]
+            record.amount = data["amount"]
+            # Строка обновления без comment оставляет прежний комментарий
+            if "comment" in data:
+                record.comment = data["comment"]
+            record.updated_at = now
+            delta.add(record)
+
+        result.created = CashFlowRecord.objects.bulk_create(
+            to_create, batch_size=BULK_BATCH_SIZE
+        )
+        if to_update:
+            CashFlowRecord.objects.bulk_update(
+                to_update, BULK_FIELDS, batch_size=BULK_BATCH_SIZE
+            )
+        result.updated = to_update
+        delta.apply()
+
+    result.errors.sort(key=lambda error: error["index"])
+    return result
@@ -0,0 +1,64 @@
+import hashlib
+from calendar import timegm
+
+from django.conf import settings
+from django.utils.cache import (get_conditional_response, patch_cache_control,
+                                patch_vary_headers)
+from django.utils.http import http_date, quote_etag
+
+
+class ConditionalGet:
+    """
+    Валидаторы условного GET-запроса: ETag и Last-Modified.
+
+    ETag строится по частям состояния, от которых зависит ответ (время
+    последнего изменения записей, версия справочников, ...), и по формату
+    ответа. В HTML-страницах есть формы с CSRF-токеном, поэтому для них в
+    ETag входит и CSRF-cookie.
+
+    Использование в представлении:
+        conditional = ConditionalGet(request, state, last_modified=...)
+        response = conditional.not_modified()
+        if response is None:
+            response = Response(...)
+        return conditional.finalize(response)
+    """
+
+    def __init__(self, request, *state, last_modified=None):
+        self.request = request
+        self.last_modified = last_modified
+        response_format = request.accepted_renderer.format
+        parts = [response_format, *state]
+        if response_format == "html":
+            parts.append(request.COOKIES.get(settings.CSRF_COOKIE_NAME, ""))
+        self.etag = quote_etag(
+            hashlib.md5(repr(parts).encode(), usedforsecurity=False).hexdigest()
+        )
+
+    @property
+    def timestamp(self):
+        if self.last_modified is None:
+            return None
+        return timegm(self.last_modified.utctimetuple())
+
+    def not_modified(self):
+        """
+        Ответ 304 (или 412), если у клиента актуальная копия; иначе None.
+        """
+        return get_conditional_response(
+            self.request, etag=self.etag, last_modified=self.timestamp
+        )
+
+    def finalize(self, response):
+        """
+        Проставляет валидаторы в ответ. Клиент хранит копию, но перед
+        использованием перепроверяет её условным запросом.
+        """
+        if response.status_code not in (200, 304):
+            return response
+        response["ETag"] = self.etag
+        if self.timestamp is not None:
+            response["Last-Modified"] = http_date(self.timestamp)
+        patch_cache_control(response, private=True, no_cache=True)
+        patch_vary_headers(response, ("Accept", "Cookie"))
+        return response
@@ -0,0 +1,44 @@
+from django.db import DatabaseError, connections
+
+
+def pool_stats(using="default"):
+    """
+    Состояние пула соединений psycopg 3 в текущем процессе; None, если
+    пул не настроен (DB_POOL=False).
+
+    Кроме счётчиков пула (get_stats) возвращает занятость: долю выданных
+    соединений от max_size. Если она близка к 1, а requests_waiting больше
+    нуля, запросы ждут свободного соединения — пул мал для нагрузки.
+    """
+    pool = connections[using].pool
+    if pool is None:
+        return None
+    stats = pool.get_stats()
+    size = stats.get("pool_size", 0)
+    in_use = size - stats.get("pool_available", 0)
+    return {
+        "min_size": pool.min_size,
+        "max_size": pool.max_size,
+        "size": size,
+        "in_use": in_use,
+        "saturation": in_use / pool.max_size if pool.max_size else 0.0,
+        "requests_waiting": stats.get("requests_waiting", 0),
+        "requests_num": stats.get("requests_num", 0),
+        "requests_queued": stats.get("requests_queued", 0),
+        "requests_wait_ms": stats.get("requests_wait_ms", 0),
+        "requests_errors": stats.get("requests_errors", 0),
+        "connections_lost": stats.get("connections_lost", 0),
+    }
+
+
+def check_database(using="default"):
+    """
+    Проверка доступности БД простым запросом; возвращает (ok, ошибка).
+    """
+    try:
+        with connections[using].cursor() as cursor:
+            cursor.execute("SELECT 1")
+            cursor.fetchone()
+    except DatabaseError as exc:
+        return False, str(exc)
+    return True, None
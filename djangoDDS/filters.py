@@ -0,0 +1,88 @@
+from datetime import timedelta
+
+import django_filters
+
+from .models import CashFlowDailyRollup, CashFlowRecord
+from .search import parse_search_query
+
+# Комбинации фильтров, которые встречаются в списке записей
+FILTER_COMBINATIONS = [
+    (),
+    ("type",),
+    ("category",),
+    ("subcategory",),
+    ("status",),
+    ("date_from", "date_to"),
+    ("type", "date_from", "date_to"),
+    ("status", "date_from", "date_to"),
+    ("type", "category", "subcategory"),
+    ("type", "category", "subcategory", "status", "date_from", "date_to"),
+]
+
+
+class CashFlowRecordFilter(django_filters.FilterSet):
+    """
+    Фильтры списка движений денежных средств.
+
+    Используется списком записей и служебными командами, чтобы все они
+    строили одинаковые запросы к БД. Фильтрация идёт по *_id колонкам, без
+    дополнительных запросов к справочникам; некорректные значения
+    параметров игнорируются.
+    """
+
+    type = django_filters.NumberFilter(field_name="type_id")
+    category = django_filters.NumberFilter(field_name="category_id")
+    subcategory = django_filters.NumberFilter(field_name="subcategory_id")
+    status = django_filters.NumberFilter(field_name="status_id")
+    search = django_filters.CharFilter(method="filter_search")
+    date_from = django_filters.DateFilter(field_name="created_at", lookup_expr="gte")
+    date_to = django_filters.DateFilter(field_name="created_at", lookup_expr="lte")
+
+    class Meta:
+        model = CashFlowRecord
+        fields = []
+
+    def filter_search(self, queryset, name, value):
+        return queryset.filter(parse_search_query(value).to_q(queryset.db))
+
+
+class CashFlowDailyRollupFilter(django_filters.FilterSet):
+    """
+    Фильтры списка записей, применённые к дневным итогам.
+
+    Поиск по тексту и сумме отдельной записи по итогам невозможен, поэтому
+    параметр search здесь не поддерживается.
+    """
+
+    type = django_filters.NumberFilter(field_name="type_id")
+    category = django_filters.NumberFilter(field_name="category_id")
+    subcategory = django_filters.NumberFilter(field_name="subcategory_id")
+    status = django_filters.NumberFilter(field_name="status_id")
+    date_from = django_filters.DateFilter(field_name="date", lookup_expr="gte")
+    date_to = django_filters.DateFilter(field_name="date", lookup_expr="lte")
+
+    class Meta:
+        model = CashFlowDailyRollup
+        fields = []
+
+
+def sample_filter_values(days=30):
+    """
+    Значения фильтров списка по самой новой записи: её справочники и
+    диапазон дат шириной days дней. None, если записей нет.
+    """
+    sample = (
+        CashFlowRecord.objects.order_by("-created_at", "-id")
+        .values("type_id", "category_id", "subcategory_id", "status_id", "created_at")
+        .first()
+    )
+    if sample is None:
+        return None
+    return {
+        "type": sample["type_id"],
+        "category": sample["category_id"],
+        "subcategory": sample["subcategory_id"],
+        "status": sample["status_id"],
+        "date_from": sample["created_at"] - timedelta(days=days),
+        "date_to": sample["created_at"],
+    }
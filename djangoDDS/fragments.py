@@ -0,0 +1,202 @@
+import hashlib
+import uuid
+from urllib.parse import urlencode
+
+from django.core.cache import cache
+from django.utils import timezone
+from django.utils.safestring import mark_safe
+
+from .references import references_version
+
+FRAGMENT_KEY = "djangoDDS:fragments:cashflow_table:{digest}"
+SCOPE_KEY = "djangoDDS:fragments:scope:{scope}"
+STATS_KEY = "djangoDDS:fragments:stats:{counter}"
+RECORDS_CHANGED_KEY = "djangoDDS:records:changed_at"
+FRAGMENT_CACHE_TIMEOUT = 60 * 10
+SCOPE_CACHE_TIMEOUT = 60 * 60 * 24
+
+# Параметры списка записей, от которых зависит таблица
+FRAGMENT_PARAMS = (
+    "type",
+    "category",
+    "subcategory",
+    "status",
+    "search",
+    "date_from",
+    "date_to",
+    "cursor",
+    "page_size",
+)
+
+# Фильтры-справочники, по которым таблица зависит только от части записей
+SCOPE_PARAMS = ("type", "category", "subcategory", "status")
+
+
+def record_scopes(type_id, category_id, subcategory_id, status_id):
+    """
+    Области кеша, которые затрагивает изменение записи с этими ссылками.
+    """
+    return {
+        "all",
+        f"type:{type_id}",
+        f"category:{category_id}",
+        f"subcategory:{subcategory_id}",
+        f"status:{status_id}",
+    }
+
+
+def all_scopes(references):
+    """
+    Все области кеша — для изменений записей в обход приложения.
+    """
+    return {
+        "all",
+        *(f"type:{pk}" for pk in references.type_names),
+        *(f"category:{pk}" for pk in references.category_names),
+        *(f"subcategory:{pk}" for pk in references.subcategory_names),
+        *(f"status:{pk}" for pk in references.status_names),
+    }
+
+
+def invalidate_scopes(scopes):
+    """
+    Сбрасывает кешированные таблицы, зависящие от этих областей: у области
+    меняется версия, и старые фрагменты больше не находятся по ключу.
+    """
+    cache.set_many(
+        {SCOPE_KEY.format(scope=scope): uuid.uuid4().hex for scope in scopes},
+        SCOPE_CACHE_TIMEOUT,
+    )
+
+
+def mark_records_changed():
+    """
+    Запоминает время изменения записей, которое не видно по updated_at
+    (отключение секций): от него зависят Last-Modified и ETag списка.
+    """
+    cache.set(RECORDS_CHANGED_KEY, timezone.now(), SCOPE_CACHE_TIMEOUT)
+
+
+def records_changed_at():
+    """
+    Время последнего mark_records_changed() или None.
+    """
+    return cache.get(RECORDS_CHANGED_KEY)
+
+
+def _scope_versions(scopes):
+    keys = [SCOPE_KEY.format(scope=scope) for scope in scopes]
+    versions = cache.get_many(keys)
+    missing = {key: uuid.uuid4().hex for key in keys if key not in versions}
+    for key, version in missing.items():
+        if not cache.add(key, version, SCOPE_CACHE_TIMEOUT):
+            version = cache.get(key, version)
+        versions[key] = version
+    return [versions[key] for key in keys]
+
+
+def _count(counter):
+    key = STATS_KEY.format(counter=counter)
+    if not cache.add(key, 1, None):
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, 1, None)
+
+
+def fragment_cache_stats():
+    """
+    Счётчики попаданий и промахов кеша таблицы записей.
+    """
+    hits = cache.get(STATS_KEY.format(counter="hits"), 0)
+    misses = cache.get(STATS_KEY.format(counter="misses"), 0)
+    total = hits + misses
+    return {
+        "hits": hits,
+        "misses": misses,
+        "hit_ratio": hits / total if total else 0.0,
+    }
+
+
+def fragment_cache_metrics():
+    """
+    Счётчики кеша таблицы в формате Prometheus для /metrics/. Хранятся в
+    общем кеше (CACHE_URL), поэтому одинаковы во всех процессах.
+    """
+    stats = fragment_cache_stats()
+    lines = []
+    for counter in ("hits", "misses"):
+        name = f"dds_fragment_cache_{counter}_total"
+        lines += [
+            f"# HELP {name} Обращения к кешу таблицы записей ({counter}).",
+            f"# TYPE {name} counter",
+            f"{name} {stats[counter]}",
+        ]
+    return "\n".join(lines) + "\n"
+
+
+def reset_fragment_cache_stats():
+    cache.delete_many([STATS_KEY.format(counter=name) for name in ("hits", "misses")])
+
+
+class CashFlowTableFragment:
+    """
+    Кеш отрисованной таблицы записей (строки и навигация по страницам).
+
+    Ключ строится по нормализованным параметрам списка (пустые и
+    посторонние параметры отбрасываются, порядок не важен), версии
+    справочников и версиям областей записей. Таблица с фильтром по типу,
+    категории, подкатегории или статусу зависит только от записей с этими
+    ссылками, остальные — от всех записей (область "all"). Изменение записи
+    меняет версии её областей (см. RollupDelta.apply).
+    """
+
+    def __init__(self, query_params):
+        self.params = sorted(
+            (name, query_params.get(name).strip())
+            for name in FRAGMENT_PARAMS
+            if query_params.get(name, "").strip()
+        )
+        scopes = []
+        for name, value in self.params:
+            if name in SCOPE_PARAMS:
+                try:
+                    scopes.append(f"{name}:{int(value)}")
+                except ValueError:
+                    pass
+        self.scopes = scopes or ["all"]
+        self._key = None
+
+    @property
+    def key(self):
+        if self._key is None:
+            state = [
+                urlencode(self.params),
+                references_version(),
+                *_scope_versions(self.scopes),
+            ]
+            digest = hashlib.md5(
+                repr(state).encode(), usedforsecurity=False
+            ).hexdigest()
+            self._key = FRAGMENT_KEY.format(digest=digest)
+        return self._key
+
+    def page_url(self, cursor):
+        """
+        Ссылка на соседнюю страницу только из нормализованных параметров:
+        таблица из кеша отдаётся всем запросам с тем же ключом, и
+        посторонние параметры первого запроса в неё попадать не должны.
+        """
+        if cursor is None:
+            return None
+        params = [(name, value) for name, value in self.params if name != "cursor"]
+        return f"?{urlencode([*params, ('cursor', cursor)])}"
+
+    def get(self):
+        html = cache.get(self.key)
+        _count("misses" if html is None else "hits")
+        return None if html is None else mark_safe(html)
+
+    def set(self, html):
+        cache.set(self.key, str(html), FRAGMENT_CACHE_TIMEOUT)
+        return mark_safe(html)
@@ -0,0 +1,218 @@
+import csv
+import io
+from dataclasses import dataclass
+from datetime import date, datetime
+from decimal import Decimal
+
+from .bulk import bulk_save_records
+from .references import get_references
+from .search import parse_date
+
+IMPORT_CHUNK_SIZE = 5000
+
+# Допустимые заголовки колонок выписки
+COLUMN_ALIASES = {
+    "created_at": "created_at",
+    "date": "created_at",
+    "дата": "created_at",
+    "status": "status",
+    "статус": "status",
+    "type": "type",
+    "тип": "type",
+    "category": "category",
+    "категория": "category",
+    "subcategory": "subcategory",
+    "подкатегория": "subcategory",
+    "amount": "amount",
+    "сумма": "amount",
+    "comment": "comment",
+    "комментарий": "comment",
+}
+
+REQUIRED_COLUMNS = {"created_at", "status", "type", "category", "subcategory", "amount"}
+
+
+class ImportFormatError(ValueError):
+    """
+    Файл выписки не удаётся прочитать: неизвестный формат или нет колонок.
+    """
+
+
+def normalize_header(header):
+    columns = [COLUMN_ALIASES.get(str(name or "").strip().lower()) for name in header]
+    missing = REQUIRED_COLUMNS - set(columns)
+    if missing:
+        raise ImportFormatError(
+            f"В файле нет обязательных колонок: {', '.join(sorted(missing))}"
+        )
+    return columns
+
+
+def iter_csv_rows(stream):
+    """
+    Построчно читает CSV из текстового потока; разделитель определяется по
+    началу файла. Возвращает пары (номер строки, словарь значений).
+    """
+    sample = stream.read(4096)
+    stream.seek(0)
+    try:
+        dialect = csv.Sniffer().sniff(sample, delimiters=",;\t")
+    except csv.Error:
+        dialect = csv.excel
+    reader = csv.reader(stream, dialect)
+    columns = normalize_header(next(reader, []))
+    for line, values in enumerate(reader, start=2):
+        if not any(values):
+            continue
+        yield line, {column: value for column, value in zip(columns, values) if column}
+
+
+def iter_xlsx_rows(file):
+    """
+    Построчно читает первый лист XLSX в режиме read_only (openpyxl).
+    """
+    try:
+        from openpyxl import load_workbook
+    except ImportError:
+        raise ImportFormatError("Для импорта XLSX установите пакет openpyxl")
+
+    workbook = load_workbook(file, read_only=True, data_only=True)
+    try:
+        rows = workbook.worksheets[0].iter_rows(values_only=True)
+        columns = normalize_header(next(rows, ()))
+        for line, values in enumerate(rows, start=2):
+            if not any(value not in (None, "") for value in values):
+                continue
+            yield line, {
+                column: value for column, value in zip(columns, values) if column
+            }
+    finally:
+        workbook.close()
+
+
+def iter_rows(file, file_format):
+    """
+    Строки выписки из бинарного файла в формате csv или xlsx.
+    """
+    if file_format == "csv":
+        return iter_csv_rows(io.TextIOWrapper(file, encoding="utf-8-sig", newline=""))
+    if file_format == "xlsx":
+        return iter_xlsx_rows(file)
+    raise ImportFormatError(f"Неизвестный формат файла: {file_format}")
+
+
+def _text(value):
+    return "" if value is None else str(value).strip()
+
+
+def resolve_row(raw, references):
+    """
+    Переводит строку выписки (названия справочников, дата и сумма в
+    свободном формате) в строку пакетной загрузки с идентификаторами.
+    Возвращает (строка, None) или (None, ошибки).
+    """
+    errors = {}
+
+    created_at = raw.get("created_at")
+    if isinstance(created_at, datetime):
+        created_at = created_at.date()
+    elif not isinstance(created_at, date):
+        created_at = parse_date(_text(created_at))
+        if created_at is None:
+            errors["created_at"] = "Некорректная дата."
+
+    amount = raw.get("amount")
+    if not isinstance(amount, (int, float, Decimal)):
+        amount = _text(amount).replace(" ", "").replace("\xa0", "").replace(",", ".")
+
+    status_id = references.find_status(_text(raw.get("status")))
+    if status_id is None:
+        errors["status"] = f"Статус «{_text(raw.get('status'))}» не найден."
+    type_id = references.find_type(_text(raw.get("type")))
+    if type_id is None:
+        errors["type"] = f"Тип «{_text(raw.get('type'))}» не найден."
+    category_id = references.find_category(_text(raw.get("category")), type_id)
+    if category_id is None:
+        errors["category"] = f"Категория «{_text(raw.get('category'))}» не найдена."
+    subcategory_id = references.find_subcategory(
+        _text(raw.get("subcategory")), category_id
+    )
+    if subcategory_id is None:
+        errors["subcategory"] = (
+            f"Подкатегория «{_text(raw.get('subcategory'))}» не найдена."
+        )
+
+    if errors:
+        return None, errors
+    return {
+        "created_at": created_at,
+        "status": status_id,
+        "type": type_id,
+        "category": category_id,
+        "subcategory": subcategory_id,
+        "amount": str(amount),
+        "comment": _text(raw.get("comment")) or None,
+    }, None
+
+
+@dataclass
+class ImportStats:
+    processed: int = 0
+    created: int = 0
+    rejected: int = 0
+    last_line: int = 0
+
+
+class StatementImporter:
+    """
+    Импорт выписки порциями.
+
+    Названия справочников переводятся в идентификаторы по снимку в памяти,
+    порция проверяется и пишется через bulk_save_records (bulk_create в
+    одной транзакции). Отклонённые строки передаются в on_reject, после
+    каждой порции вызывается on_chunk — например, для записи контрольной
+    точки.
+    """
+
+    def __init__(self, chunk_size=IMPORT_CHUNK_SIZE, on_reject=None, on_chunk=None):
+        self.chunk_size = chunk_size
+        self.on_reject = on_reject or (lambda line, raw, errors: None)
+        self.on_chunk = on_chunk or (lambda stats: None)
+        self.references = get_references()
+        self.stats = ImportStats()
+
+    def run(self, rows, skip_until=0):
+        chunk = []
+        for line, raw in rows:
+            if line <= skip_until:
+                continue
+            chunk.append((line, raw))
+            if len(chunk) >= self.chunk_size:
+                self.import_chunk(chunk)
+                chunk = []
+        if chunk:
+            self.import_chunk(chunk)
+        return self.stats
+
+    def import_chunk(self, chunk):
+        resolved = []
+        for line, raw in chunk:
+            row, errors = resolve_row(raw, self.references)
+            if errors:
+                self.reject(line, raw, errors)
+            else:
+                resolved.append((line, raw, row))
+
+        result = bulk_save_records([row for _, _, row in resolved], self.references)
+        for error in result.errors:
+            line, raw, _ = resolved[error["index"]]
+            self.reject(line, raw, error["errors"])
+
+        self.stats.processed += len(chunk)
+        self.stats.created += len(result.created)
+        self.stats.last_line = chunk[-1][0]
+        self.on_chunk(self.stats)
+
+    def reject(self, line, raw, errors):
+        self.stats.rejected += 1
+        self.on_reject(line, raw, errors)
@@ -0,0 +1,148 @@
+import json
+import platform
+
+import django
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.utils import timezone
+
+from djangoDDS.benchmarks import default_scenarios, run_scenario
+from djangoDDS.models import CashFlowRecord
+from djangoDDS.partitioning import is_partitioned
+
+
+class Command(BaseCommand):
+    help = (
+        "Замеряет задержки (p50/p90/p95/p99) и пропускную способность списка "
+        "записей с разными фильтрами и карточки записи (с --include-writes — "
+        "ещё создания и изменения записи). Результат сохраняется в JSON, "
+        "чтобы сравнивать прогоны между собой; данные для замеров готовит "
+        "generate_ledger."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--iterations", type=int, default=200, help="Запросов на сценарий."
+        )
+        parser.add_argument(
+            "--warmup", type=int, default=5, help="Запросов для прогрева."
+        )
+        parser.add_argument(
+            "--concurrency",
+            type=int,
+            default=1,
+            help="Количество потоков, одновременно отправляющих запросы.",
+        )
+        parser.add_argument(
+            "--only",
+            action="append",
+            default=[],
+            help="Выполнить только сценарии с этим префиксом имени (list, detail...).",
+        )
+        parser.add_argument(
+            "--include-writes",
+            action="store_true",
+            help=(
+                "Замерять также создание и изменение записей. ВНИМАНИЕ: "
+                "сценарии создают и изменяют записи в БД и не откатываются — "
+                "запускайте только на отдельной БД с синтетическими данными."
+            ),
+        )
+        parser.add_argument("--label", default="", help="Метка прогона.")
+        parser.add_argument(
+            "--output", help="Файл для результатов в JSON (по умолчанию stdout)."
+        )
+        parser.add_argument(
+            "--compare", help="Предыдущий результат в JSON для сравнения p95."
+        )
+
+    def handle(self, *args, **options):
+        if options["iterations"] < 1 or options["concurrency"] < 1:
+            raise CommandError("Укажите --iterations > 0 и --concurrency > 0.")
+        if settings.DEBUG:
+            self.stderr.write(
+                self.style.WARNING(
+                    "DEBUG=True: Django сохраняет все SQL-запросы, замеры завышены."
+                )
+            )
+
+        if options["include_writes"]:
+            self.stderr.write(
+                self.style.WARNING(
+                    f"Сценарии записи создадут и изменят записи в БД "
+                    f"{connection.settings_dict['NAME']}."
+                )
+            )
+
+        scenarios = [
+            scenario
+            for scenario in default_scenarios(include_writes=options["include_writes"])
+            if not options["only"]
+            or any(scenario.name.startswith(prefix) for prefix in options["only"])
+        ]
+        if not scenarios:
+            raise CommandError("Нет сценариев: заполните БД командой generate_ledger.")
+
+        results = []
+        for scenario in scenarios:
+            result = run_scenario(
+                scenario,
+                options["iterations"],
+                warmup=options["warmup"],
+                concurrency=options["concurrency"],
+            )
+            results.append(result)
+            self.stderr.write(
+                f"{result['name']}: p50={result.get('p50_ms')} мс, "
+                f"p95={result.get('p95_ms')} мс, {result['throughput_rps']} запр./с, "
+                f"ошибок: {result['errors']}"
+            )
+
+        report = {
+            "meta": {
+                "label": options["label"],
+                "started_at": timezone.now().isoformat(),
+                "rows": CashFlowRecord.all_objects.count(),
+                "partitioned": is_partitioned(),
+                "iterations": options["iterations"],
+                "warmup": options["warmup"],
+                "concurrency": options["concurrency"],
+                "include_writes": options["include_writes"],
+                "database": connection.vendor,
+                "database_version": connection.pg_version,
+                "python": platform.python_version(),
+                "django": django.get_version(),
+            },
+            "results": results,
+        }
+        data = json.dumps(report, ensure_ascii=False, indent=2)
+        if options["output"]:
+            with open(options["output"], "w", encoding="utf-8") as output:
+                output.write(data)
+        else:
+            self.stdout.write(data)
+
+        if options["compare"]:
+            self.compare(results, options["compare"])
+
+    def compare(self, results, path):
+        try:
+            with open(path, encoding="utf-8") as baseline_file:
+                baseline = {
+                    result["name"]: result
+                    for result in json.load(baseline_file)["results"]
+                }
+        except (OSError, ValueError, KeyError) as exc:
+            raise CommandError(f"Не удалось прочитать {path}: {exc}")
+
+        for result in results:
+            before = baseline.get(result["name"], {}).get("p95_ms")
+            after = result.get("p95_ms")
+            if not before or after is None:
+                continue
+            change = (after - before) / before
+            style = self.style.WARNING if change > 0.1 else self.style.SUCCESS
+            self.stderr.write(
+                style(f"{result['name']}: p95 {before} -> {after} мс ({change:+.1%})")
+            )
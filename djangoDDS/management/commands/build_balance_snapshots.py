@@ -0,0 +1,48 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand
+
+from djangoDDS.balances import SNAPSHOT_INTERVALS, build_snapshots
+
+
+class Command(BaseCommand):
+    help = (
+        "Создаёт снимки остатка денежных средств на концы месяцев (или лет) "
+        "после последнего снимка. Остаток на дату считается от ближайшего "
+        "снимка, поэтому команду стоит запускать по расписанию."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--interval",
+            choices=SNAPSHOT_INTERVALS,
+            default="month",
+            help="Период между снимками.",
+        )
+        parser.add_argument(
+            "--until",
+            type=date.fromisoformat,
+            help="Последняя дата снимка (YYYY-MM-DD), по умолчанию вчера.",
+        )
+        parser.add_argument(
+            "--rebuild",
+            action="store_true",
+            help=(
+                "Удалить все снимки и посчитать остаток с начала журнала "
+                "(записи отключённых секций в него не войдут)."
+            ),
+        )
+
+    def handle(self, *args, **options):
+        created = build_snapshots(
+            options["interval"], until=options["until"], rebuild=options["rebuild"]
+        )
+        if created:
+            self.stdout.write(
+                self.style.SUCCESS(
+                    f"Создано снимков: {len(created)}, последний: "
+                    f"{created[-1].date} ({created[-1].balance})"
+                )
+            )
+        else:
+            self.stdout.write("Новых снимков нет.")
@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+
+from djangoDDS.fragments import (fragment_cache_stats,
+                                 reset_fragment_cache_stats)
+
+
+class Command(BaseCommand):
+    help = "Выводит счётчики попаданий и промахов кеша таблицы записей."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--reset",
+            action="store_true",
+            help="Обнулить счётчики после вывода.",
+        )
+
+    def handle(self, *args, **options):
+        stats = fragment_cache_stats()
+        self.stdout.write(
+            f"Попаданий: {stats['hits']}, промахов: {stats['misses']}, "
+            f"доля попаданий: {stats['hit_ratio']:.1%}"
+        )
+        if options["reset"]:
+            reset_fragment_cache_stats()
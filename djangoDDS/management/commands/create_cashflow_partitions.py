@@ -0,0 +1,42 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from djangoDDS.partitioning import (PartitioningError, ensure_partitions,
+                                    list_partitions, next_period,
+                                    partition_interval, period_start)
+
+
+class Command(BaseCommand):
+    help = (
+        "Заранее создаёт секции таблицы записей на будущие периоды. "
+        "Запускается по расписанию, чтобы новые записи не попадали в секцию "
+        "по умолчанию."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--ahead",
+            type=int,
+            default=3,
+            help="На сколько периодов вперёд от текущего должны быть секции.",
+        )
+
+    def handle(self, *args, **options):
+        if options["ahead"] < 0:
+            raise CommandError("Укажите --ahead >= 0.")
+        partitions = list_partitions()
+        if not partitions:
+            raise CommandError(
+                "Таблица записей не секционирована, выполните partition_cashflow."
+            )
+        interval = partition_interval(partitions)
+        until = period_start(timezone.localdate(), interval)
+        for _ in range(options["ahead"]):
+            until = next_period(until, interval)
+        try:
+            created = ensure_partitions(until)
+        except PartitioningError as exc:
+            raise CommandError(str(exc))
+        for name in created:
+            self.stdout.write(f"Создана секция {name}")
+        self.stdout.write(self.style.SUCCESS(f"Создано секций: {len(created)}"))
@@ -0,0 +1,46 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from djangoDDS.partitioning import detach_partitions, list_partitions
+
+
+class Command(BaseCommand):
+    help = (
+        "Отключает секции таблицы записей за периоды до указанной даты и "
+        "переносит их в архивную схему (или удаляет). Данные не копируются, "
+        "дневные итоги этих периодов удаляются."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--before",
+            type=date.fromisoformat,
+            required=True,
+            help="Отключить секции, которые целиком раньше этой даты (YYYY-MM-DD).",
+        )
+        parser.add_argument(
+            "--archive-schema",
+            default="archive",
+            help="Схема, куда переносятся отключённые секции.",
+        )
+        parser.add_argument(
+            "--drop",
+            action="store_true",
+            help="Удалить отключённые секции вместо переноса в архив.",
+        )
+
+    def handle(self, *args, **options):
+        if not list_partitions():
+            raise CommandError("Таблица записей не секционирована.")
+        detached = detach_partitions(
+            options["before"],
+            archive_schema=options["archive_schema"],
+            drop=options["drop"],
+        )
+        for partition in detached:
+            self.stdout.write(
+                f"Отключена секция {partition.name}"
+                f" ({partition.start} — {partition.end})"
+            )
+        self.stdout.write(self.style.SUCCESS(f"Отключено секций: {len(detached)}"))
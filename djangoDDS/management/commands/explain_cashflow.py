@@ -0,0 +1,67 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from djangoDDS.filters import (FILTER_COMBINATIONS, CashFlowRecordFilter,
+                               sample_filter_values)
+from djangoDDS.models import CashFlowRecord
+from djangoDDS.pagination import CashFlowKeysetPaginator
+
+
+class Command(BaseCommand):
+    help = (
+        "Выводит планы выполнения (EXPLAIN ANALYZE) запросов списка записей "
+        "для каждой комбинации фильтров."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--page-size",
+            type=int,
+            default=CashFlowKeysetPaginator.page_size,
+            help="Размер страницы, как в списке записей.",
+        )
+        parser.add_argument(
+            "--days",
+            type=int,
+            default=30,
+            help="Ширина диапазона дат для фильтров date_from/date_to.",
+        )
+        parser.add_argument(
+            "--no-analyze",
+            action="store_true",
+            help="Только EXPLAIN, без выполнения запросов.",
+        )
+
+    def handle(self, *args, **options):
+        values = sample_filter_values(options["days"])
+        if values is None:
+            raise CommandError("Нет записей для построения планов.")
+
+        explain_options = {}
+        if connection.vendor == "postgresql" and not options["no_analyze"]:
+            explain_options = {"analyze": True, "buffers": True}
+
+        seq_scans = 0
+        for combination in FILTER_COMBINATIONS:
+            params = {name: values[name] for name in combination}
+            queryset = CashFlowRecordFilter(
+                params, queryset=CashFlowRecord.objects.with_refs()
+            ).qs.order_by("-created_at", "-id")[: options["page_size"]]
+            plan = queryset.explain(**explain_options)
+
+            title = ", ".join(f"{k}={v}" for k, v in params.items()) or "без фильтров"
+            self.stdout.write(self.style.MIGRATE_HEADING(f"== {title}"))
+            self.stdout.write(plan)
+            if "Seq Scan on" in plan and "djangoDDS_cashflowrecord" in plan:
+                seq_scans += 1
+                self.stdout.write(
+                    self.style.WARNING("Последовательное сканирование таблицы записей")
+                )
+            self.stdout.write("")
+
+        if seq_scans:
+            self.stdout.write(self.style.WARNING(f"Планов с Seq Scan: {seq_scans}"))
+        else:
+            self.stdout.write(
+                self.style.SUCCESS("Seq Scan по таблице записей не найден")
+            )
@@ -0,0 +1,211 @@
+import math
+import random
+from datetime import timedelta
+from itertools import accumulate
+
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.utils import timezone
+
+from djangoDDS.fragments import invalidate_scopes
+from djangoDDS.models import (CashFlowBalanceSnapshot, CashFlowDailyRollup,
+                              CashFlowRecord, Category, Status, SubCategory,
+                              Type)
+
+# Справочники синтетического журнала: тип -> категория -> подкатегории
+REFERENCE_TREE = {
+    "Пополнение": {
+        "Продажи": ["Онлайн", "Розница", "Опт"],
+        "Инвестиции": ["Дивиденды", "Проценты"],
+        "Займы": ["Банк", "Партнёры"],
+    },
+    "Списание": {
+        "Инфраструктура": ["VPS", "Proxy", "Домены"],
+        "Маркетинг": ["Farpost", "Avito", "Контекст"],
+        "Зарплата": ["Оклад", "Премии"],
+        "Налоги": ["НДС", "НДФЛ"],
+    },
+}
+# Доля записей по статусам
+STATUS_WEIGHTS = {"Бизнес": 70, "Личное": 25, "Налог": 5}
+COMMENT_WORDS = (
+    "оплата",
+    "счёт",
+    "договор",
+    "аренда",
+    "сервер",
+    "реклама",
+    "возврат",
+    "перевод",
+    "поставщик",
+    "клиент",
+    "подписка",
+    "комиссия",
+)
+COPY_COLUMNS = (
+    "created_at",
+    "status_id",
+    "type_id",
+    "category_id",
+    "subcategory_id",
+    "amount",
+    "comment",
+    "updated_at",
+    "is_deleted",
+    "deleted_at",
+)
+MAX_AMOUNT = 10**10 - 1
+
+
+class Command(BaseCommand):
+    help = (
+        "Заполняет БД синтетическим журналом операций для нагрузочных "
+        "замеров. Распределение неравномерное, как в реальных данных: "
+        "несколько подкатегорий и статус «Бизнес» встречаются чаще, "
+        "последние месяцы плотнее старых, суммы — логнормальные."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--rows", type=int, required=True, help="Сколько записей создать."
+        )
+        parser.add_argument(
+            "--days",
+            type=int,
+            default=730,
+            help="За сколько последних дней распределить записи.",
+        )
+        parser.add_argument(
+            "--deleted-share",
+            type=float,
+            default=0.02,
+            help="Доля записей, помеченных удалёнными.",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=100_000,
+            help="Количество записей в одной транзакции загрузки.",
+        )
+        parser.add_argument(
+            "--seed", type=int, default=0, help="Начальное значение генератора."
+        )
+        parser.add_argument(
+            "--clear",
+            action="store_true",
+            help="Удалить существующие записи и дневные итоги перед загрузкой.",
+        )
+
+    def handle(self, *args, **options):
+        if options["rows"] < 1 or options["days"] < 1 or options["batch_size"] < 1:
+            raise CommandError("Укажите --rows, --days и --batch-size больше 0.")
+        if not 0 <= options["deleted_share"] <= 1:
+            raise CommandError("--deleted-share должен быть от 0 до 1.")
+
+        rng = random.Random(options["seed"])
+        subcategories, statuses = self.ensure_references()
+        table = connection.ops.quote_name(CashFlowRecord._meta.db_table)
+
+        # Ранг подкатегории задаёт её частоту по закону Ципфа
+        rng.shuffle(subcategories)
+        self.subcategories = subcategories
+        self.subcategory_weights = list(
+            accumulate(1 / rank**1.1 for rank in range(1, len(subcategories) + 1))
+        )
+        self.status_ids = [status.pk for status in statuses]
+        self.status_weights = list(
+            accumulate(STATUS_WEIGHTS.get(status.name, 1) for status in statuses)
+        )
+
+        if options["clear"]:
+            derived = ", ".join(
+                connection.ops.quote_name(model._meta.db_table)
+                for model in (CashFlowDailyRollup, CashFlowBalanceSnapshot)
+            )
+            with connection.cursor() as cursor:
+                cursor.execute(f"TRUNCATE {table}, {derived}")
+
+        # Записи загружаются через COPY: на миллионах строк это на порядок
+        # быстрее bulk_create. Каждая порция — отдельная транзакция, чтобы
+        # очередь проверок внешних ключей не росла на весь объём. Дневные
+        # итоги и снимки остатка пересчитываются после загрузки.
+        self.today = timezone.localdate()
+        self.now = timezone.now()
+        loaded = 0
+        while loaded < options["rows"]:
+            size = min(options["batch_size"], options["rows"] - loaded)
+            with transaction.atomic(), connection.cursor() as cursor:
+                with cursor.cursor.copy(
+                    f"COPY {table} ({', '.join(COPY_COLUMNS)}) FROM STDIN"
+                ) as copy:
+                    for _ in range(size):
+                        copy.write_row(self.make_row(rng, options))
+            loaded += size
+            self.stdout.write(f"Загружено записей: {loaded}")
+
+        with connection.cursor() as cursor:
+            cursor.execute(f"ANALYZE {table}")
+        call_command("rebuild_rollups", stdout=self.stdout)
+        call_command("build_balance_snapshots", rebuild=True, stdout=self.stdout)
+        invalidate_scopes(self.all_scopes())
+        self.stdout.write(self.style.SUCCESS(f"Создано записей: {loaded}"))
+
+    def ensure_references(self):
+        statuses = [
+            Status.objects.get_or_create(name=name)[0] for name in STATUS_WEIGHTS
+        ]
+        subcategories = []
+        for type_name, categories in REFERENCE_TREE.items():
+            type_obj = Type.objects.get_or_create(name=type_name)[0]
+            for category_name, names in categories.items():
+                category = Category.objects.get_or_create(
+                    name=category_name, type=type_obj
+                )[0]
+                for name in names:
+                    subcategory, _ = SubCategory.objects.get_or_create(
+                        name=name, category=category
+                    )
+                    subcategories.append((subcategory.pk, category.pk, type_obj.pk))
+        return subcategories, statuses
+
+    def make_row(self, rng, options):
+        # Плотность записей растёт к сегодняшнему дню
+        age = int(options["days"] * (1 - math.sqrt(rng.random())))
+        amount = min(max(rng.lognormvariate(8, 1.2), 1), MAX_AMOUNT)
+        deleted = rng.random() < options["deleted_share"]
+        subcategory_id, category_id, type_id = rng.choices(
+            self.subcategories, cum_weights=self.subcategory_weights
+        )[0]
+        status_id = rng.choices(self.status_ids, cum_weights=self.status_weights)[0]
+        return (
+            self.today - timedelta(days=age),
+            status_id,
+            type_id,
+            category_id,
+            subcategory_id,
+            f"{amount:.2f}",
+            self.make_comment(rng),
+            self.now,
+            deleted,
+            self.now if deleted else None,
+        )
+
+    def make_comment(self, rng):
+        if rng.random() < 0.1:
+            return None
+        first, second = rng.sample(COMMENT_WORDS, 2)
+        return f"{first.capitalize()} {second} №{rng.randint(1, 99999)}"
+
+    def all_scopes(self):
+        scopes = {"all"}
+        for prefix, model in (
+            ("type", Type),
+            ("category", Category),
+            ("subcategory", SubCategory),
+            ("status", Status),
+        ):
+            scopes.update(
+                f"{prefix}:{pk}" for pk in model.objects.values_list("pk", flat=True)
+            )
+        return scopes
@@ -0,0 +1,115 @@
+import csv
+import json
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+
+from djangoDDS.importing import (IMPORT_CHUNK_SIZE, ImportFormatError,
+                                 StatementImporter, iter_rows)
+
+
+class Command(BaseCommand):
+    help = (
+        "Импортирует выписку (CSV или XLSX) в движения денежных средств. "
+        "Файл читается потоково, записи вставляются порциями; после каждой "
+        "порции сохраняется контрольная точка, отклонённые строки пишутся "
+        "в отдельный CSV."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="Путь к файлу выписки.")
+        parser.add_argument(
+            "--format",
+            choices=["csv", "xlsx"],
+            help="Формат файла; по умолчанию определяется по расширению.",
+        )
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=IMPORT_CHUNK_SIZE,
+            help="Количество строк в одной транзакции.",
+        )
+        parser.add_argument(
+            "--rejects",
+            help="Файл для отклонённых строк (по умолчанию <path>.rejects.csv).",
+        )
+        parser.add_argument(
+            "--checkpoint",
+            help="Файл контрольной точки (по умолчанию <path>.checkpoint).",
+        )
+        parser.add_argument(
+            "--restart",
+            action="store_true",
+            help="Начать импорт заново, игнорируя контрольную точку.",
+        )
+
+    def handle(self, *args, **options):
+        path = options["path"]
+        if not os.path.exists(path):
+            raise CommandError(f"Файл не найден: {path}")
+        file_format = options["format"] or os.path.splitext(path)[1].lstrip(".").lower()
+        rejects_path = options["rejects"] or f"{path}.rejects.csv"
+        checkpoint_path = options["checkpoint"] or f"{path}.checkpoint"
+        file_size = os.path.getsize(path)
+
+        skip_until = 0
+        if not options["restart"] and os.path.exists(checkpoint_path):
+            with open(checkpoint_path, encoding="utf-8") as checkpoint_file:
+                checkpoint = json.load(checkpoint_file)
+            if checkpoint.get("size") != file_size:
+                raise CommandError(
+                    "Контрольная точка относится к другой версии файла; "
+                    "запустите импорт с --restart."
+                )
+            skip_until = checkpoint["line"]
+            self.stdout.write(f"Продолжение импорта после строки {skip_until}")
+
+        rejects_mode = "a" if skip_until else "w"
+        with open(path, "rb") as source, open(
+            rejects_path, rejects_mode, encoding="utf-8", newline=""
+        ) as rejects_file:
+            rejects = csv.writer(rejects_file)
+            if not skip_until:
+                rejects.writerow(["line", "errors", "row"])
+
+            def reject(line, raw, errors):
+                rejects.writerow(
+                    [
+                        line,
+                        json.dumps(errors, ensure_ascii=False),
+                        json.dumps(raw, ensure_ascii=False, default=str),
+                    ]
+                )
+
+            def save_checkpoint(stats):
+                # Отклонённые строки порции должны попасть на диск раньше точки
+                rejects_file.flush()
+                with open(checkpoint_path, "w", encoding="utf-8") as checkpoint_file:
+                    json.dump(
+                        {"size": file_size, "line": stats.last_line}, checkpoint_file
+                    )
+                self.stdout.write(
+                    f"Строка {stats.last_line}: добавлено {stats.created}, "
+                    f"отклонено {stats.rejected}"
+                )
+
+            importer = StatementImporter(
+                chunk_size=options["chunk_size"],
+                on_reject=reject,
+                on_chunk=save_checkpoint,
+            )
+            try:
+                stats = importer.run(iter_rows(source, file_format), skip_until)
+            except ImportFormatError as exc:
+                raise CommandError(str(exc))
+
+        if os.path.exists(checkpoint_path):
+            os.remove(checkpoint_path)
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Импорт завершён: обработано {stats.processed}, "
+                f"добавлено {stats.created}, отклонено {stats.rejected}"
+            )
+        )
+        if stats.rejected:
+            self.stdout.write(f"Отклонённые строки: {rejects_path}")
@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from djangoDDS.partitioning import (INTERVALS, PartitioningError,
+                                    convert_to_partitioned, list_partitions)
+
+
+class Command(BaseCommand):
+    help = (
+        "Переводит таблицу записей на секционирование по дате операции "
+        "(по месяцам или годам). Таблица пересоздаётся с копированием данных "
+        "и на это время блокируется."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--interval",
+            choices=INTERVALS,
+            default="month",
+            help="Период одной секции.",
+        )
+        parser.add_argument(
+            "--ahead",
+            type=int,
+            default=3,
+            help="Сколько будущих периодов создать заранее.",
+        )
+
+    def handle(self, *args, **options):
+        if options["ahead"] < 0:
+            raise CommandError("Укажите --ahead >= 0.")
+        try:
+            convert_to_partitioned(options["interval"], options["ahead"])
+        except PartitioningError as exc:
+            raise CommandError(str(exc))
+        self.stdout.write(
+            self.style.SUCCESS(f"Создано секций: {len(list_partitions())}")
+        )
@@ -0,0 +1,64 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from djangoDDS.models import CashFlowRecord
+
+PURGE_BATCH_SIZE = 1000
+
+
+class Command(BaseCommand):
+    help = (
+        "Окончательно удаляет записи, помеченные удалёнными больше N дней "
+        "назад. Удаление идёт порциями, каждая в своей транзакции, чтобы "
+        "не держать долгих блокировок; команду можно запускать по расписанию."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--days",
+            type=int,
+            default=30,
+            help="Сколько дней хранить удалённые записи.",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=PURGE_BATCH_SIZE,
+            help="Количество записей, удаляемых одним запросом.",
+        )
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Только посчитать записи, ничего не удаляя.",
+        )
+
+    def handle(self, *args, **options):
+        if options["days"] < 0 or options["batch_size"] < 1:
+            raise CommandError("Укажите --days >= 0 и --batch-size > 0.")
+
+        cutoff = timezone.now() - timedelta(days=options["days"])
+        tombstones = CashFlowRecord.all_objects.deleted().filter(deleted_at__lt=cutoff)
+
+        if options["dry_run"]:
+            self.stdout.write(f"К удалению: {tombstones.count()}")
+            return
+
+        # Записи уже вычтены из дневных итогов при пометке, поэтому
+        # удаляются напрямую, без пересчёта итогов
+        purged = 0
+        while True:
+            batch = list(
+                tombstones.order_by("deleted_at").values_list("pk", flat=True)[
+                    : options["batch_size"]
+                ]
+            )
+            if not batch:
+                break
+            # Условие повторяется: запись могли восстановить после выборки
+            deleted, _ = tombstones.filter(pk__in=batch).delete()
+            purged += deleted
+            self.stdout.write(f"Удалено записей: {purged}")
+
+        self.stdout.write(self.style.SUCCESS(f"Очистка завершена: {purged}"))
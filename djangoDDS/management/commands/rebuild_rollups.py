@@ -0,0 +1,99 @@
+from datetime import date
+from functools import partial
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections, router, transaction
+
+from djangoDDS.balances import refresh_snapshots
+from djangoDDS.fragments import all_scopes, invalidate_scopes
+from djangoDDS.models import CashFlowDailyRollup, CashFlowRecord
+from djangoDDS.references import get_references
+from djangoDDS.rollups import UPSERT_BATCH_SIZE, rollup_rows
+
+
+class Command(BaseCommand):
+    help = (
+        "Пересчитывает дневные итоги (CashFlowDailyRollup) по записям "
+        "и снимки остатка после них или проверяет согласованность итогов."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--check",
+            action="store_true",
+            help="Только сравнить итоги с записями, ничего не меняя.",
+        )
+        parser.add_argument(
+            "--date-from", type=date.fromisoformat, help="Начальная дата (YYYY-MM-DD)."
+        )
+        parser.add_argument(
+            "--date-to", type=date.fromisoformat, help="Конечная дата (YYYY-MM-DD)."
+        )
+
+    def handle(self, *args, **options):
+        records = CashFlowRecord.objects.all()
+        rollups = CashFlowDailyRollup.objects.all()
+        if options["date_from"]:
+            records = records.filter(created_at__gte=options["date_from"])
+            rollups = rollups.filter(date__gte=options["date_from"])
+        if options["date_to"]:
+            records = records.filter(created_at__lte=options["date_to"])
+            rollups = rollups.filter(date__lte=options["date_to"])
+
+        if options["check"]:
+            self.check_rollups(records, rollups)
+            return
+
+        using = router.db_for_write(CashFlowDailyRollup)
+        connection = connections[using]
+        table = connection.ops.quote_name(CashFlowDailyRollup._meta.db_table)
+        with transaction.atomic(using=using):
+            # Запись операций меняет итоги в своей транзакции (RollupDelta)
+            # и ждёт этой блокировки: изменения, не вошедшие в пересчёт,
+            # применятся к уже пересчитанным итогам
+            with connection.cursor() as cursor:
+                cursor.execute(f"LOCK TABLE {table} IN SHARE ROW EXCLUSIVE MODE")
+            deleted, _ = rollups.using(using).delete()
+            created = CashFlowDailyRollup.objects.using(using).bulk_create(
+                rollup_rows(records.using(using)), batch_size=UPSERT_BATCH_SIZE
+            )
+            snapshots = refresh_snapshots(options["date_from"], using=using)
+            # Записи могли измениться в обход приложения (loaddata)
+            scopes = all_scopes(get_references())
+            invalidate_scopes(scopes)
+            transaction.on_commit(partial(invalidate_scopes, scopes), using=using)
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Удалено итогов: {deleted}, создано итогов: {len(created)}, "
+                f"пересчитано снимков остатка: {len(snapshots)}"
+            )
+        )
+
+    def check_rollups(self, records, rollups):
+        def key(rollup):
+            return (
+                rollup.date,
+                rollup.type_id,
+                rollup.category_id,
+                rollup.subcategory_id,
+                rollup.status_id,
+            )
+
+        expected = {key(row): (row.total, row.count) for row in rollup_rows(records)}
+        actual = {
+            key(row): (row.total, row.count)
+            for row in rollups.iterator(chunk_size=UPSERT_BATCH_SIZE)
+        }
+
+        mismatches = 0
+        for rollup_key in sorted(expected.keys() | actual.keys()):
+            if expected.get(rollup_key) != actual.get(rollup_key):
+                mismatches += 1
+                self.stdout.write(
+                    f"{rollup_key}: ожидается {expected.get(rollup_key)}, "
+                    f"в итогах {actual.get(rollup_key)}"
+                )
+
+        if mismatches:
+            raise CommandError(f"Расхождений в итогах: {mismatches}")
+        self.stdout.write(self.style.SUCCESS(f"Итоги согласованы ({len(expected)})"))
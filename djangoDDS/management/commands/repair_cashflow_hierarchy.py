@@ -0,0 +1,75 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+# Запросы написаны на SQL, чтобы команда работала и на схеме до миграции
+# 0008, которая без исправления записей не применяется
+MISMATCHED_RECORDS = """
+SELECT r.id, r.type_id, r.category_id, r.subcategory_id,
+       c.type_id AS category_type_id, s.category_id AS subcategory_category_id
+  FROM "djangoDDS_cashflowrecord" AS r
+  JOIN "djangoDDS_category" AS c ON c.id = r.category_id
+  JOIN "djangoDDS_subcategory" AS s ON s.id = r.subcategory_id
+ WHERE r.category_id <> s.category_id OR r.type_id <> c.type_id
+ ORDER BY r.id
+"""
+
+# Подкатегория определяет категорию, категория — тип
+REPAIR_RECORDS = (
+    """
+    UPDATE "djangoDDS_cashflowrecord" AS r
+       SET category_id = s.category_id
+      FROM "djangoDDS_subcategory" AS s
+     WHERE r.subcategory_id = s.id AND r.category_id <> s.category_id
+    """,
+    """
+    UPDATE "djangoDDS_cashflowrecord" AS r
+       SET type_id = c.type_id
+      FROM "djangoDDS_category" AS c
+     WHERE r.category_id = c.id AND r.type_id <> c.type_id
+    """,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Показывает записи, у которых категория не принадлежит типу или "
+        "подкатегория — категории. С --fix категория и тип записи берутся "
+        "из её подкатегории; после исправления пересчитайте дневные итоги "
+        "командой rebuild_rollups."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--fix",
+            action="store_true",
+            help="Исправить записи по подкатегории (иначе только показать).",
+        )
+
+    def handle(self, *args, **options):
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(MISMATCHED_RECORDS)
+            rows = cursor.fetchall()
+            for pk, type_id, category_id, subcategory_id, *expected in rows:
+                self.stdout.write(
+                    f"id={pk}: type={type_id} (у категории {expected[0]}), "
+                    f"category={category_id} (у подкатегории {expected[1]}), "
+                    f"subcategory={subcategory_id}"
+                )
+            if not rows:
+                self.stdout.write(
+                    self.style.SUCCESS("Все записи соответствуют иерархии.")
+                )
+                return
+            if not options["fix"]:
+                raise CommandError(
+                    f"Записей с нарушенной иерархией: {len(rows)}. "
+                    "Исправить: repair_cashflow_hierarchy --fix"
+                )
+            for sql in REPAIR_RECORDS:
+                cursor.execute(sql)
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Исправлено записей: {len(rows)}. Пересчитайте дневные итоги: "
+                "rebuild_rollups"
+            )
+        )
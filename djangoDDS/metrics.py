@@ -0,0 +1,263 @@
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+
+from django.template.backends.django import DjangoTemplates
+
+# Метрики запросов: количество и время SQL, время шаблонов и сериализаторов.
+#
+# RequestMetricsMiddleware заводит RequestMetrics на время запроса; SQL
+# учитывается обёрткой execute_wrappers, шаблоны — бэкендом
+# InstrumentedDjangoTemplates, сериализаторы — TimedSerializerMixin. Вне
+# запроса (команды, тесты без middleware) учёт сводится к проверке
+# ContextVar. Гистограммы копятся в памяти процесса и отдаются в формате
+# Prometheus; при нескольких процессах у каждого свои значения.
+
+SECONDS_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERIES_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500)
+# Сколько SQL-запросов запоминать для журнала медленных запросов
+MAX_RECORDED_QUERIES = 100
+MAX_SQL_LENGTH = 2000
+
+_current = ContextVar("djangoDDS_request_metrics", default=None)
+
+
+@dataclass
+class RequestMetrics:
+    queries: int = 0
+    sql_seconds: float = 0.0
+    template_seconds: float = 0.0
+    serializer_seconds: float = 0.0
+    sql: list = field(default_factory=list)
+    _active: set = field(default_factory=set)
+
+
+@contextmanager
+def collect_metrics():
+    """
+    Собирает метрики кода внутри блока в новый RequestMetrics.
+    """
+    metrics = RequestMetrics()
+    token = _current.set(metrics)
+    try:
+        yield metrics
+    finally:
+        _current.reset(token)
+
+
+@contextmanager
+def timer(name):
+    """
+    Добавляет время блока к метрике name ("template", "serializer")
+    текущего запроса. Вложенные блоки с тем же именем не считаются
+    повторно.
+    """
+    metrics = _current.get()
+    if metrics is None or name in metrics._active:
+        yield
+        return
+    metrics._active.add(name)
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started
+        metrics._active.discard(name)
+        attr = f"{name}_seconds"
+        setattr(metrics, attr, getattr(metrics, attr) + elapsed)
+
+
+def timed_stream(chunks, label):
+    """
+    Генератор поверх chunks, который учитывает время и SQL отдачи
+    потокового ответа в гистограммах под именем label. Тело
+    StreamingHttpResponse отдаётся после выхода из middleware, и его
+    работа в замер запроса не попадает.
+
+    ContextVar ставится только на время получения очередного фрагмента,
+    чтобы замер не распространялся на код сервера между фрагментами.
+    Под ASGI синхронный генератор Django читает целиком одним вызовом
+    sync_to_async(list); там используйте atimed_stream.
+    """
+    metrics = RequestMetrics()
+    started = time.perf_counter()
+    chunks = iter(chunks)
+    try:
+        while True:
+            token = _current.set(metrics)
+            try:
+                chunk = next(chunks, None)
+            finally:
+                _current.reset(token)
+            if chunk is None:
+                return
+            yield chunk
+    finally:
+        registry.observe(label, time.perf_counter() - started, metrics)
+
+
+async def atimed_stream(chunks, label):
+    """
+    Асинхронный вариант timed_stream для StreamingHttpResponse под ASGI.
+    Запросы ORM из sync_to_async видят ContextVar: asgiref копирует
+    контекст в рабочий поток.
+    """
+    metrics = RequestMetrics()
+    started = time.perf_counter()
+    chunks = aiter(chunks)
+    try:
+        while True:
+            token = _current.set(metrics)
+            try:
+                chunk = await anext(chunks, None)
+            finally:
+                _current.reset(token)
+            if chunk is None:
+                return
+            yield chunk
+    finally:
+        registry.observe(label, time.perf_counter() - started, metrics)
+
+
+def sql_timer(execute, sql, params, many, context):
+    """
+    Обёртка выполнения SQL (connection.execute_wrappers).
+    """
+    metrics = _current.get()
+    if metrics is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        elapsed = time.perf_counter() - started
+        metrics.queries += 1
+        metrics.sql_seconds += elapsed
+        if len(metrics.sql) < MAX_RECORDED_QUERIES:
+            metrics.sql.append((sql[:MAX_SQL_LENGTH], elapsed))
+
+
+def install_sql_timer(sender, connection, **kwargs):
+    """
+    Обработчик connection_created: подключает sql_timer к соединению.
+    """
+    if sql_timer not in connection.execute_wrappers:
+        connection.execute_wrappers.append(sql_timer)
+
+
+class InstrumentedTemplate:
+    """
+    Шаблон, время отрисовки которого учитывается в метриках запроса.
+    """
+
+    def __init__(self, template):
+        self.template = template
+
+    def __getattr__(self, name):
+        return getattr(self.template, name)
+
+    def render(self, context=None, request=None):
+        with timer("template"):
+            return self.template.render(context, request)
+
+
+class InstrumentedDjangoTemplates(DjangoTemplates):
+    """
+    Бэкенд шаблонов Django с учётом времени отрисовки (settings.TEMPLATES).
+    """
+
+    def from_string(self, template_code):
+        return InstrumentedTemplate(super().from_string(template_code))
+
+    def get_template(self, template_name):
+        return InstrumentedTemplate(super().get_template(template_name))
+
+
+class Histogram:
+    def __init__(self, name, documentation, buckets):
+        self.name = name
+        self.documentation = documentation
+        self.buckets = buckets
+        # {url_name: ([счётчики по корзинам], сумма, количество)}
+        self.series = {}
+
+    def observe(self, label, value):
+        counts, total, count = self.series.get(
+            label, ([0] * (len(self.buckets) + 1), 0.0, 0)
+        )
+        counts[bisect_left(self.buckets, value)] += 1
+        self.series[label] = (counts, total + value, count + 1)
+
+    def expose(self):
+        lines = [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} histogram",
+        ]
+        for label, (counts, total, count) in sorted(self.series.items()):
+            cumulative = 0
+            for bound, bucket_count in zip((*self.buckets, "+Inf"), counts):
+                cumulative += bucket_count
+                lines.append(
+                    f'{self.name}_bucket{{url_name="{label}",le="{bound}"}} {cumulative}'
+                )
+            lines.append(f'{self.name}_sum{{url_name="{label}"}} {total}')
+            lines.append(f'{self.name}_count{{url_name="{label}"}} {count}')
+        return lines
+
+
+class MetricsRegistry:
+    """
+    Гистограммы метрик запросов по имени URL.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.histograms = {
+            "duration": Histogram(
+                "dds_request_duration_seconds",
+                "Время обработки запроса.",
+                SECONDS_BUCKETS,
+            ),
+            "queries": Histogram(
+                "dds_request_queries", "Количество SQL-запросов.", QUERIES_BUCKETS
+            ),
+            "sql": Histogram(
+                "dds_request_sql_seconds",
+                "Суммарное время SQL-запросов.",
+                SECONDS_BUCKETS,
+            ),
+            "template": Histogram(
+                "dds_request_template_seconds",
+                "Время отрисовки шаблонов.",
+                SECONDS_BUCKETS,
+            ),
+            "serializer": Histogram(
+                "dds_request_serializer_seconds",
+                "Время работы сериализаторов (включая их SQL).",
+                SECONDS_BUCKETS,
+            ),
+        }
+
+    def observe(self, url_name, duration, metrics):
+        with self.lock:
+            self.histograms["duration"].observe(url_name, duration)
+            self.histograms["queries"].observe(url_name, metrics.queries)
+            self.histograms["sql"].observe(url_name, metrics.sql_seconds)
+            self.histograms["template"].observe(url_name, metrics.template_seconds)
+            self.histograms["serializer"].observe(url_name, metrics.serializer_seconds)
+
+    def expose(self):
+        with self.lock:
+            lines = []
+            for histogram in self.histograms.values():
+                lines += histogram.expose()
+        return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry()
@@ -0,0 +1,218 @@
+import hmac
+import logging
+import random
+import sys
+import threading
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+
+from .metrics import collect_metrics, registry
+from .profiling import StackSampler, save_profile
+from .routers import choose_replica, read_from
+
+slow_request_logger = logging.getLogger("djangoDDS.slow_requests")
+
+PRIMARY_PIN_COOKIE = "dds_primary_until"
+SAFE_METHODS = ("GET", "HEAD", "OPTIONS")
+PROFILE_HEADER = "X-Profile"
+
+
+class ReplicaRoutingMiddleware:
+    """
+    Выбирает БД для чтений запроса (см. PrimaryReplicaRouter).
+
+    Чтения безопасных запросов (GET, HEAD, OPTIONS) идут в одну реплику,
+    выбранную по весам на весь запрос, чтобы данные ответа были согласованы
+    между собой. Остальные запросы читают из основной БД.
+
+    Чтение своих записей: после успешного изменяющего запроса клиенту
+    ставится cookie, и на REPLICA_PIN_SECONDS его чтения остаются на
+    основной БД, пока реплики догоняют запись.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.pin_seconds = getattr(settings, "REPLICA_PIN_SECONDS", 5)
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        with read_from(self.read_alias(request)):
+            response = self.get_response(request)
+        return self.process_response(request, response)
+
+    async def __acall__(self, request):
+        with read_from(self.read_alias(request)):
+            response = await self.get_response(request)
+        return self.process_response(request, response)
+
+    def read_alias(self, request):
+        if request.method not in SAFE_METHODS:
+            return None
+        try:
+            pinned_until = float(request.COOKIES.get(PRIMARY_PIN_COOKIE, 0))
+        except ValueError:
+            pinned_until = 0
+        if pinned_until > time.time():
+            return None
+        return choose_replica()
+
+    def process_response(self, request, response):
+        if (
+            request.method not in SAFE_METHODS
+            and response.status_code < 400
+            and getattr(settings, "DATABASE_REPLICAS", {})
+        ):
+            response.set_cookie(
+                PRIMARY_PIN_COOKIE,
+                str(time.time() + self.pin_seconds),
+                max_age=self.pin_seconds,
+                httponly=True,
+                samesite="Lax",
+            )
+        return response
+
+
+class RequestMetricsMiddleware:
+    """
+    Учёт SQL-запросов, времени SQL, шаблонов и сериализаторов по запросу.
+
+    Значения отдаются в заголовке Server-Timing, копятся в гистограммах по
+    имени URL (см. MetricsView) и, если запрос дольше SLOW_REQUEST_MS,
+    пишутся в журнал djangoDDS.slow_requests вместе с SQL запроса.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.slow_request_ms = getattr(settings, "SLOW_REQUEST_MS", 500)
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        started = time.perf_counter()
+        with collect_metrics() as metrics:
+            response = self.get_response(request)
+        return self.process_response(request, response, metrics, started)
+
+    async def __acall__(self, request):
+        started = time.perf_counter()
+        with collect_metrics() as metrics:
+            response = await self.get_response(request)
+        return self.process_response(request, response, metrics, started)
+
+    def process_response(self, request, response, metrics, started):
+        duration = time.perf_counter() - started
+        response["Server-Timing"] = ", ".join(
+            [
+                f"db;dur={metrics.sql_seconds * 1000:.1f}"
+                f';desc="{metrics.queries} queries"',
+                f"tpl;dur={metrics.template_seconds * 1000:.1f}",
+                f"ser;dur={metrics.serializer_seconds * 1000:.1f}",
+                f"total;dur={duration * 1000:.1f}",
+            ]
+        )
+        match = request.resolver_match
+        url_name = match.url_name if match and match.url_name else "unmatched"
+        registry.observe(url_name, duration, metrics)
+
+        if duration * 1000 >= self.slow_request_ms:
+            slow_request_logger.warning(
+                "Медленный запрос %s %s (%s): %.0f мс, SQL: %d запросов, %.0f мс\n%s",
+                request.method,
+                request.get_full_path(),
+                url_name,
+                duration * 1000,
+                metrics.queries,
+                metrics.sql_seconds * 1000,
+                "\n".join(
+                    f"[{elapsed * 1000:.1f} мс] {sql}" for sql, elapsed in metrics.sql
+                ),
+            )
+        return response
+
+
+class ProfilingMiddleware:
+    """
+    Профилирование отдельных запросов без перезапуска (см. profiling.py).
+
+    Запрос профилируется, если у него есть заголовок X-Profile и он от
+    сотрудника (is_staff) или значение заголовка совпадает с PROFILER_TOKEN,
+    а также случайно с вероятностью PROFILER_SAMPLE_RATE. Профиль пишется в
+    PROFILER_DIR, его имя возвращается в заголовке X-Profile-Id.
+
+    Стоит последним в MIDDLEWARE, чтобы профиль содержал представление, а
+    request.user уже был определён.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.sample_rate = getattr(settings, "PROFILER_SAMPLE_RATE", 0)
+        self.token = getattr(settings, "PROFILER_TOKEN", "")
+        self.interval = getattr(settings, "PROFILER_INTERVAL_MS", 5) / 1000
+        self.directory = getattr(settings, "PROFILER_DIR", "profiles")
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        header = request.headers.get(PROFILE_HEADER)
+        if not (
+            self.sampled()
+            or header is not None
+            and (self.token_matches(header) or request.user.is_staff)
+        ):
+            return self.get_response(request)
+        sampler = self.start(sys._getframe())
+        try:
+            response = self.get_response(request)
+        finally:
+            sampler.stop()
+        return self.process_response(request, response, sampler)
+
+    async def __acall__(self, request):
+        header = request.headers.get(PROFILE_HEADER)
+        if not (
+            self.sampled()
+            or header is not None
+            and (self.token_matches(header) or (await request.auser()).is_staff)
+        ):
+            return await self.get_response(request)
+        sampler = self.start(sys._getframe())
+        try:
+            response = await self.get_response(request)
+        finally:
+            sampler.stop()
+        return self.process_response(request, response, sampler)
+
+    def sampled(self):
+        return self.sample_rate > 0 and random.random() < self.sample_rate
+
+    def token_matches(self, value):
+        return bool(self.token) and hmac.compare_digest(value, self.token)
+
+    def start(self, root):
+        sampler = StackSampler(threading.get_ident(), root, self.interval)
+        sampler.start()
+        return sampler
+
+    def process_response(self, request, response, sampler):
+        response["X-Profile-Id"] = save_profile(
+            self.directory, sampler, request, response
+        )
+        return response
@@ -0,0 +1,52 @@
+# Generated by Django 5.2.4 on 2026-10-18 09:36
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("djangoDDS", "0003_cashflowrecord_is_deleted"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="cashflowrecord",
+            index=models.Index(
+                fields=["-created_at", "-id"], name="cashflow_created_id_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="cashflowrecord",
+            index=models.Index(
+                fields=["type", "-created_at"], name="cashflow_type_created_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="cashflowrecord",
+            index=models.Index(
+                fields=["category", "-created_at"], name="cashflow_cat_created_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="cashflowrecord",
+            index=models.Index(
+                fields=["subcategory", "-created_at"],
+                name="cashflow_subcat_created_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="cashflowrecord",
+            index=models.Index(
+                fields=["status", "-created_at"], name="cashflow_status_created_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="cashflowrecord",
+            index=models.Index(
+                condition=models.Q(("is_deleted", False)),
+                fields=["-created_at", "-id"],
+                name="cashflow_live_created_idx",
+            ),
+        ),
+    ]
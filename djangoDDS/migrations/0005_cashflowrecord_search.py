@@ -0,0 +1,50 @@
+# Generated by Django 5.2.4 on 2026-10-18 09:38
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.db import migrations, models
+
+# pg_trgm входит в contrib и может отсутствовать на сервере, поэтому расширение
+# и триграммный индекс создаются только при его наличии.
+CREATE_TRIGRAM_INDEX = """
+DO $$
+BEGIN
+    IF EXISTS (SELECT 1 FROM pg_available_extensions WHERE name = 'pg_trgm') THEN
+        CREATE EXTENSION IF NOT EXISTS pg_trgm;
+        CREATE INDEX IF NOT EXISTS cashflow_comment_trgm_idx
+            ON "djangoDDS_cashflowrecord" USING gin (comment gin_trgm_ops);
+    END IF;
+END
+$$;
+"""
+
+DROP_TRIGRAM_INDEX = "DROP INDEX IF EXISTS cashflow_comment_trgm_idx;"
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("djangoDDS", "0004_cashflowrecord_list_indexes"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="cashflowrecord",
+            name="search_vector",
+            field=models.GeneratedField(
+                db_persist=True,
+                expression=django.contrib.postgres.search.SearchVector(
+                    "comment", config="russian"
+                ),
+                output_field=django.contrib.postgres.search.SearchVectorField(),
+                verbose_name="Поисковый вектор комментария",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="cashflowrecord",
+            index=django.contrib.postgres.indexes.GinIndex(
+                fields=["search_vector"], name="cashflow_search_vector_idx"
+            ),
+        ),
+        migrations.RunSQL(CREATE_TRIGRAM_INDEX, DROP_TRIGRAM_INDEX),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.4 on 2026-10-18 09:39
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("djangoDDS", "0005_cashflowrecord_search"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="cashflowrecord",
+            index=models.Index(fields=["amount"], name="cashflow_amount_idx"),
+        ),
+    ]
@@ -0,0 +1,116 @@
+# Generated by Django 5.2.4 on 2026-10-18 09:40
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, Sum
+
+
+def backfill_rollups(apps, schema_editor):
+    CashFlowRecord = apps.get_model("djangoDDS", "CashFlowRecord")
+    CashFlowDailyRollup = apps.get_model("djangoDDS", "CashFlowDailyRollup")
+    db_alias = schema_editor.connection.alias
+
+    rows = (
+        CashFlowRecord.objects.using(db_alias)
+        .order_by()
+        .values("created_at", "type_id", "category_id", "subcategory_id", "status_id")
+        .annotate(total=Sum("amount"), count=Count("id"))
+    )
+    CashFlowDailyRollup.objects.using(db_alias).bulk_create(
+        (
+            CashFlowDailyRollup(
+                date=row["created_at"],
+                type_id=row["type_id"],
+                category_id=row["category_id"],
+                subcategory_id=row["subcategory_id"],
+                status_id=row["status_id"],
+                total=row["total"],
+                count=row["count"],
+            )
+            for row in rows.iterator()
+        ),
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("djangoDDS", "0006_cashflowrecord_amount_idx"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="CashFlowDailyRollup",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("date", models.DateField(verbose_name="Дата")),
+                (
+                    "total",
+                    models.DecimalField(
+                        decimal_places=2, default=0, max_digits=16, verbose_name="Сумма"
+                    ),
+                ),
+                (
+                    "count",
+                    models.IntegerField(default=0, verbose_name="Количество записей"),
+                ),
+                (
+                    "category",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="+",
+                        to="djangoDDS.category",
+                        verbose_name="Категория",
+                    ),
+                ),
+                (
+                    "status",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="+",
+                        to="djangoDDS.status",
+                        verbose_name="Статус",
+                    ),
+                ),
+                (
+                    "subcategory",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="+",
+                        to="djangoDDS.subcategory",
+                        verbose_name="Подкатегория",
+                    ),
+                ),
+                (
+                    "type",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="+",
+                        to="djangoDDS.type",
+                        verbose_name="Тип операции",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Дневной итог",
+                "verbose_name_plural": "Дневные итоги",
+                "ordering": ["-date"],
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("date", "type", "category", "subcategory", "status"),
+                        name="cashflow_rollup_key",
+                    )
+                ],
+            },
+        ),
+        migrations.RunPython(backfill_rollups, migrations.RunPython.noop),
+    ]
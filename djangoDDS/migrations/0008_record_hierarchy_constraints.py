@@ -0,0 +1,98 @@
+# Generated by Django 5.2.4 on 2026-10-18 09:46
+
+from django.core.management.base import CommandError
+from django.db import migrations, models
+
+# Записи, нарушающие иерархию тип -> категория -> подкатегория. Миграция
+# их не исправляет (это изменило бы данные без ведома владельца), а
+# останавливается со списком: исправить их можно командой
+# repair_cashflow_hierarchy --fix и затем повторить migrate.
+MISMATCHED_RECORDS = """
+SELECT r.id, r.type_id, r.category_id, r.subcategory_id
+  FROM "djangoDDS_cashflowrecord" AS r
+  JOIN "djangoDDS_category" AS c ON c.id = r.category_id
+  JOIN "djangoDDS_subcategory" AS s ON s.id = r.subcategory_id
+ WHERE r.category_id <> s.category_id OR r.type_id <> c.type_id
+ ORDER BY r.id
+ LIMIT %s
+"""
+MISMATCHES_SHOWN = 20
+
+
+def check_hierarchy(apps, schema_editor):
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(MISMATCHED_RECORDS, [MISMATCHES_SHOWN + 1])
+        rows = cursor.fetchall()
+    if not rows:
+        return
+    lines = [
+        f"id={pk}: type={type_id}, category={category_id}, "
+        f"subcategory={subcategory_id}"
+        for pk, type_id, category_id, subcategory_id in rows[:MISMATCHES_SHOWN]
+    ]
+    if len(rows) > MISMATCHES_SHOWN:
+        lines.append("...")
+    raise CommandError(
+        "Записи не соответствуют иерархии тип -> категория -> подкатегория:\n"
+        + "\n".join(lines)
+        + "\nПроверьте их командой repair_cashflow_hierarchy, исправьте "
+        "(--fix) и повторите migrate."
+    )
+
+
+# Составные внешние ключи проверяют иерархию при любой записи, включая
+# bulk_create и прямой SQL. Миграция не атомарная (atomic = False), и
+# каждая команда фиксируется сразу: ADD ... NOT VALID держит блокировку
+# таблицы недолго, а VALIDATE проверяет существующие строки под
+# SHARE UPDATE EXCLUSIVE, не блокируя запись в таблицу.
+ADD_HIERARCHY_FKS = """
+ALTER TABLE "djangoDDS_cashflowrecord"
+    ADD CONSTRAINT cashflow_category_type_fk
+    FOREIGN KEY (category_id, type_id)
+    REFERENCES "djangoDDS_category" (id, type_id)
+    DEFERRABLE INITIALLY DEFERRED NOT VALID;
+
+ALTER TABLE "djangoDDS_cashflowrecord"
+    ADD CONSTRAINT cashflow_subcategory_category_fk
+    FOREIGN KEY (subcategory_id, category_id)
+    REFERENCES "djangoDDS_subcategory" (id, category_id)
+    DEFERRABLE INITIALLY DEFERRED NOT VALID;
+
+ALTER TABLE "djangoDDS_cashflowrecord" VALIDATE CONSTRAINT cashflow_category_type_fk;
+ALTER TABLE "djangoDDS_cashflowrecord"
+    VALIDATE CONSTRAINT cashflow_subcategory_category_fk;
+"""
+
+DROP_HIERARCHY_FKS = """
+ALTER TABLE "djangoDDS_cashflowrecord" DROP CONSTRAINT cashflow_category_type_fk;
+ALTER TABLE "djangoDDS_cashflowrecord"
+    DROP CONSTRAINT cashflow_subcategory_category_fk;
+"""
+
+
+class Migration(migrations.Migration):
+
+    atomic = False
+
+    dependencies = [
+        ("djangoDDS", "0007_cashflowdailyrollup"),
+    ]
+
+    operations = [
+        # Проверка первой: без транзакции уже выполненные операции
+        # не откатились бы при остановке
+        migrations.RunPython(check_hierarchy, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name="category",
+            constraint=models.UniqueConstraint(
+                fields=("id", "type"), name="category_id_type_key"
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="subcategory",
+            constraint=models.UniqueConstraint(
+                fields=("id", "category"), name="subcategory_id_category_key"
+            ),
+        ),
+        migrations.RunSQL(ADD_HIERARCHY_FKS, DROP_HIERARCHY_FKS),
+    ]
@@ -0,0 +1,128 @@
+# Generated by Django 5.2.4 on 2026-10-18 09:50
+
+import django.db.models.manager
+from django.db import migrations, models
+
+# Уже помеченным записям проставляем дату удаления и убираем их
+# из дневных итогов: итоги считаются только по действующим записям.
+MARK_DELETED_RECORDS = """
+UPDATE "djangoDDS_cashflowrecord"
+   SET deleted_at = now()
+ WHERE is_deleted AND deleted_at IS NULL;
+
+DELETE FROM "djangoDDS_cashflowdailyrollup";
+
+INSERT INTO "djangoDDS_cashflowdailyrollup"
+       (date, type_id, category_id, subcategory_id, status_id, total, count)
+SELECT created_at, type_id, category_id, subcategory_id, status_id,
+       SUM(amount), COUNT(*)
+  FROM "djangoDDS_cashflowrecord"
+ WHERE NOT is_deleted
+ GROUP BY created_at, type_id, category_id, subcategory_id, status_id;
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("djangoDDS", "0008_record_hierarchy_constraints"),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name="cashflowrecord",
+            options={
+                "base_manager_name": "all_objects",
+                "ordering": ["-created_at"],
+                "verbose_name": "Движение денежных средств",
+                "verbose_name_plural": "Движения денежных средств",
+            },
+        ),
+        migrations.AlterModelManagers(
+            name="cashflowrecord",
+            managers=[
+                ("objects", django.db.models.manager.Manager()),
+                ("all_objects", django.db.models.manager.Manager()),
+            ],
+        ),
+        migrations.RemoveIndex(
+            model_name="cashflowrecord",
+            name="cashflow_created_id_idx",
+        ),
+        migrations.RemoveIndex(
+            model_name="cashflowrecord",
+            name="cashflow_type_created_idx",
+        ),
+        migrations.RemoveIndex(
+            model_name="cashflowrecord",
+            name="cashflow_cat_created_idx",
+        ),
+        migrations.RemoveIndex(
+            model_name="cashflowrecord",
+            name="cashflow_subcat_created_idx",
+        ),
+        migrations.RemoveIndex(
+            model_name="cashflowrecord",
+            name="cashflow_status_created_idx",
+        ),
+        migrations.RemoveIndex(
+            model_name="cashflowrecord",
+            name="cashflow_amount_idx",
+        ),
+        migrations.AddField(
+            model_name="cashflowrecord",
+            name="deleted_at",
+            field=models.DateTimeField(
+                blank=True, null=True, verbose_name="Дата удаления"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="cashflowrecord",
+            index=models.Index(
+                condition=models.Q(("is_deleted", False)),
+                fields=["type", "-created_at"],
+                name="cashflow_live_type_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="cashflowrecord",
+            index=models.Index(
+                condition=models.Q(("is_deleted", False)),
+                fields=["category", "-created_at"],
+                name="cashflow_live_cat_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="cashflowrecord",
+            index=models.Index(
+                condition=models.Q(("is_deleted", False)),
+                fields=["subcategory", "-created_at"],
+                name="cashflow_live_subcat_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="cashflowrecord",
+            index=models.Index(
+                condition=models.Q(("is_deleted", False)),
+                fields=["status", "-created_at"],
+                name="cashflow_live_status_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="cashflowrecord",
+            index=models.Index(
+                condition=models.Q(("is_deleted", False)),
+                fields=["amount"],
+                name="cashflow_live_amount_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="cashflowrecord",
+            index=models.Index(
+                condition=models.Q(("is_deleted", True)),
+                fields=["deleted_at"],
+                name="cashflow_deleted_at_idx",
+            ),
+        ),
+        migrations.RunSQL(MARK_DELETED_RECORDS, migrations.RunSQL.noop),
+    ]
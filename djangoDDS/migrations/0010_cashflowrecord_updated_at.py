@@ -0,0 +1,22 @@
+# Generated by Django 5.2.4 on 2026-10-18 09:52
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("djangoDDS", "0009_cashflowrecord_soft_delete"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="cashflowrecord",
+            name="updated_at",
+            field=models.DateTimeField(auto_now=True, verbose_name="Дата изменения"),
+        ),
+        migrations.AddIndex(
+            model_name="cashflowrecord",
+            index=models.Index(fields=["updated_at"], name="cashflow_updated_at_idx"),
+        ),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 5.2.4 on 2026-10-18 10:15
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("djangoDDS", "0010_cashflowrecord_updated_at"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="CashFlowBalanceSnapshot",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("date", models.DateField(unique=True, verbose_name="Дата")),
+                (
+                    "balance",
+                    models.DecimalField(
+                        decimal_places=2, max_digits=18, verbose_name="Остаток"
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Снимок остатка",
+                "verbose_name_plural": "Снимки остатка",
+                "ordering": ["-date"],
+            },
+        ),
+    ]
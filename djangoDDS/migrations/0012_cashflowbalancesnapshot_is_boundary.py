@@ -0,0 +1,20 @@
+# Generated by Django 5.2.4 on 2026-10-18 16:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("djangoDDS", "0011_cashflowbalancesnapshot"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="cashflowbalancesnapshot",
+            name="is_boundary",
+            field=models.BooleanField(
+                default=False, verbose_name="Граница отключённых секций"
+            ),
+        ),
+    ]
@@ -1,6 +1,10 @@
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVector, SearchVectorField
 from django.db import models
 from django.utils import timezone
 
+from .search import SEARCH_CONFIG, comment_search_filter, comment_search_rank
+
 
 class Status(models.Model):
     """
@@ -53,6 +57,10 @@ class Category(models.Model):
         unique_together = ("name", "type")
         verbose_name = "Категория"
         verbose_name_plural = "Категории"
+        constraints = [
+            # Цель составного внешнего ключа (category_id, type_id) записей
+            models.UniqueConstraint(fields=["id", "type"], name="category_id_type_key")
+        ]
 
     def __str__(self):
         return f"{self.name} ({self.type.name})"
@@ -77,11 +85,89 @@ class SubCategory(models.Model):
         unique_together = ("name", "category")
         verbose_name = "Подкатегория"
         verbose_name_plural = "Подкатегории"
+        constraints = [
+            # Цель составного внешнего ключа (subcategory_id, category_id) записей
+            models.UniqueConstraint(
+                fields=["id", "category"], name="subcategory_id_category_key"
+            )
+        ]
 
     def __str__(self):
         return f"{self.name} ({self.category.name})"
 
 
+class CashFlowRecordQuerySet(models.QuerySet):
+    """
+    Набор запросов для модели CashFlowRecord.
+    """
+
+    # Колонки, которые выводятся в списке и карточке записи
+    REF_FIELDS = (
+        "id",
+        "created_at",
+        "updated_at",
+        "amount",
+        "comment",
+        "status__id",
+        "status__name",
+        "type__id",
+        "type__name",
+        "category__id",
+        "category__name",
+        "subcategory__id",
+        "subcategory__name",
+    )
+
+    def with_refs(self):
+        """
+        Подтягивает статус, тип, категорию и подкатегорию одним JOIN-запросом
+        и выбирает только отображаемые колонки.
+        """
+        return self.select_related("status", "type", "category", "subcategory").only(
+            *self.REF_FIELDS
+        )
+
+    def search(self, text):
+        """
+        Фильтрует записи по комментарию с использованием индексов поиска.
+        """
+        return self.filter(comment_search_filter(text, self.db))
+
+    def ranked_search(self, text):
+        """
+        Результаты поиска, отсортированные по релевантности.
+        """
+        return (
+            self.search(text)
+            .annotate(rank=comment_search_rank(text, self.db))
+            .order_by("-rank", "-created_at", "-id")
+        )
+
+    def last_modified(self):
+        """
+        Время последнего изменения записей выборки (None, если записей нет).
+        """
+        return self.aggregate(last_modified=models.Max("updated_at"))["last_modified"]
+
+    def live(self):
+        return self.filter(is_deleted=False)
+
+    def deleted(self):
+        return self.filter(is_deleted=True)
+
+
+CashFlowRecordManager = models.Manager.from_queryset(CashFlowRecordQuerySet)
+
+
+class LiveCashFlowRecordManager(CashFlowRecordManager):
+    """
+    Менеджер по умолчанию: только не удалённые записи.
+    """
+
+    def get_queryset(self):
+        return super().get_queryset().live()
+
+
 class CashFlowRecord(models.Model):
     """
     Основная модель для записи движения денежных средств.
@@ -109,16 +195,74 @@ class CashFlowRecord(models.Model):
         blank=True, null=True, verbose_name="Комментарий к операции"
     )
 
+    updated_at = models.DateTimeField(auto_now=True, verbose_name="Дата изменения")
+
     is_deleted = models.BooleanField(default=False, verbose_name="Удалена")
+    deleted_at = models.DateTimeField(
+        blank=True, null=True, verbose_name="Дата удаления"
+    )
+
+    # Поддерживается базой данных при каждом изменении comment
+    search_vector = models.GeneratedField(
+        expression=SearchVector("comment", config=SEARCH_CONFIG),
+        output_field=SearchVectorField(),
+        db_persist=True,
+        verbose_name="Поисковый вектор комментария",
+    )
+
+    # objects — только действующие записи, all_objects — включая удалённые
+    objects = LiveCashFlowRecordManager()
+    all_objects = CashFlowRecordManager()
 
     def save(self, *args, **kwargs):
-        # Логика проверки: категория должна принадлежать типу, подкатегория - категории
-        if self.category.type != self.type:
+        # Логика проверки: категория должна принадлежать типу, подкатегория - категории.
+        # Проверяем идентификаторы по снимку справочников, без запросов к БД;
+        # в самой БД иерархию гарантируют составные внешние ключи (миграция 0008).
+        from .references import get_references
+
+        references = get_references()
+        if not references.category_belongs_to_type(self.category_id, self.type_id):
             raise ValueError("Категория должна относиться к выбранному типу")
-        if self.subcategory.category != self.category:
+        if not references.subcategory_belongs_to_category(
+            self.subcategory_id, self.category_id
+        ):
             raise ValueError("Подкатегория должна относиться к выбранной категории")
         super().save(*args, **kwargs)
 
+    def soft_delete(self):
+        """
+        Помечает запись удалённой. Строка остаётся в таблице, пока её
+        не удалит команда purge_cashflow.
+
+        Возвращает False, если запись уже была удалена (например,
+        параллельным запросом), — тогда итоги менять не нужно.
+        """
+        deleted_at = timezone.now()
+        updated = CashFlowRecord.objects.filter(pk=self.pk).update(
+            is_deleted=True, deleted_at=deleted_at, updated_at=deleted_at
+        )
+        if updated:
+            self.is_deleted = True
+            self.deleted_at = deleted_at
+            self.updated_at = deleted_at
+        return bool(updated)
+
+    def restore(self):
+        """
+        Восстанавливает удалённую запись; False, если она не была удалена.
+        """
+        updated_at = timezone.now()
+        updated = (
+            CashFlowRecord.all_objects.deleted()
+            .filter(pk=self.pk)
+            .update(is_deleted=False, deleted_at=None, updated_at=updated_at)
+        )
+        if updated:
+            self.is_deleted = False
+            self.deleted_at = None
+            self.updated_at = updated_at
+        return bool(updated)
+
     def __str__(self):
         return f"{self.created_at} | {self.status} | {self.type} | {self.category} | {self.subcategory} | {self.amount}"
 
@@ -126,3 +270,126 @@ class CashFlowRecord(models.Model):
         verbose_name = "Движение денежных средств"
         verbose_name_plural = "Движения денежных средств"
         ordering = ["-created_at"]
+        base_manager_name = "all_objects"
+        # Индексы повторяют фильтры списка записей и его сортировку (-created_at, -id)
+        # Список работает только с действующими записями, поэтому индексы
+        # частичные и не содержат удалённых строк.
+        indexes = [
+            models.Index(
+                fields=["-created_at", "-id"],
+                condition=models.Q(is_deleted=False),
+                name="cashflow_live_created_idx",
+            ),
+            models.Index(
+                fields=["type", "-created_at"],
+                condition=models.Q(is_deleted=False),
+                name="cashflow_live_type_idx",
+            ),
+            models.Index(
+                fields=["category", "-created_at"],
+                condition=models.Q(is_deleted=False),
+                name="cashflow_live_cat_idx",
+            ),
+            models.Index(
+                fields=["subcategory", "-created_at"],
+                condition=models.Q(is_deleted=False),
+                name="cashflow_live_subcat_idx",
+            ),
+            models.Index(
+                fields=["status", "-created_at"],
+                condition=models.Q(is_deleted=False),
+                name="cashflow_live_status_idx",
+            ),
+            models.Index(
+                fields=["amount"],
+                condition=models.Q(is_deleted=False),
+                name="cashflow_live_amount_idx",
+            ),
+            GinIndex(fields=["search_vector"], name="cashflow_search_vector_idx"),
+            # Время последнего изменения для ETag и Last-Modified
+            models.Index(fields=["updated_at"], name="cashflow_updated_at_idx"),
+            # Удалённые записи для очистки (purge_cashflow)
+            models.Index(
+                fields=["deleted_at"],
+                condition=models.Q(is_deleted=True),
+                name="cashflow_deleted_at_idx",
+            ),
+        ]
+
+
+class CashFlowDailyRollup(models.Model):
+    """
+    Дневные итоги движения денежных средств.
+
+    Одна строка на сочетание (дата, тип, категория, подкатегория, статус).
+    Обновляется инкрементально при записи CashFlowRecord (см. rollups.py)
+    и пересчитывается командой rebuild_rollups.
+    """
+
+    date = models.DateField(verbose_name="Дата")
+    status = models.ForeignKey(
+        Status, on_delete=models.CASCADE, related_name="+", verbose_name="Статус"
+    )
+    type = models.ForeignKey(
+        Type, on_delete=models.CASCADE, related_name="+", verbose_name="Тип операции"
+    )
+    category = models.ForeignKey(
+        Category, on_delete=models.CASCADE, related_name="+", verbose_name="Категория"
+    )
+    subcategory = models.ForeignKey(
+        SubCategory,
+        on_delete=models.CASCADE,
+        related_name="+",
+        verbose_name="Подкатегория",
+    )
+    total = models.DecimalField(
+        max_digits=16, decimal_places=2, default=0, verbose_name="Сумма"
+    )
+    count = models.IntegerField(default=0, verbose_name="Количество записей")
+
+    def __str__(self):
+        return f"{self.date} | {self.type_id} | {self.category_id} | {self.total}"
+
+    class Meta:
+        verbose_name = "Дневной итог"
+        verbose_name_plural = "Дневные итоги"
+        ordering = ["-date"]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["date", "type", "category", "subcategory", "status"],
+                name="cashflow_rollup_key",
+            )
+        ]
+
+
+class CashFlowBalanceSnapshot(models.Model):
+    """
+    Остаток денежных средств на конец дня date.
+
+    Пополнения входят в остаток со знаком плюс, списания — со знаком минус
+    (см. balances.py). Снимки создаёт команда build_balance_snapshots на
+    концы периодов; остаток на любую дату считается от ближайшего
+    предыдущего снимка, а не от начала журнала. Изменения записей задним
+    числом сдвигают более поздние снимки (см. RollupDelta).
+
+    Снимок на границе отключённых секций (is_boundary) пишет
+    detach_partitions: записей и итогов до него больше нет, поэтому он не
+    пересчитывается и не удаляется, а остаток без более раннего снимка
+    считается от него.
+    """
+
+    date = models.DateField(unique=True, verbose_name="Дата")
+    balance = models.DecimalField(
+        max_digits=18, decimal_places=2, verbose_name="Остаток"
+    )
+    is_boundary = models.BooleanField(
+        default=False, verbose_name="Граница отключённых секций"
+    )
+
+    def __str__(self):
+        return f"{self.date} | {self.balance}"
+
+    class Meta:
+        verbose_name = "Снимок остатка"
+        verbose_name_plural = "Снимки остатка"
+        ordering = ["-date"]
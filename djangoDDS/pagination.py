@@ -0,0 +1,135 @@
+import base64
+import json
+from dataclasses import dataclass
+from datetime import date
+
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+
+
+@dataclass
+class KeysetPage:
+    """
+    Страница записей с непрозрачными курсорами на соседние страницы.
+    """
+
+    objects: list
+    next_cursor: str | None
+    prev_cursor: str | None
+
+
+class CashFlowKeysetPaginator:
+    """
+    Курсорная (keyset) пагинация по ключу (created_at, id).
+
+    Порядок совпадает с ordering модели CashFlowRecord (-created_at) и
+    дополнен id для однозначности, поэтому стоимость любой страницы
+    одинакова: вместо OFFSET используется условие по ключу последней записи.
+    """
+
+    page_size = 50
+    max_page_size = 500
+    cursor_query_param = "cursor"
+    page_size_query_param = "page_size"
+    invalid_cursor_message = "Некорректный курсор."
+
+    def get_query_params(self, request):
+        # Запрос DRF или обычный HttpRequest (асинхронные представления)
+        return getattr(request, "query_params", request.GET)
+
+    def get_page_size(self, request):
+        raw = self.get_query_params(request).get(self.page_size_query_param)
+        try:
+            size = int(raw)
+        except (TypeError, ValueError):
+            return self.page_size
+        if size <= 0:
+            return self.page_size
+        return min(size, self.max_page_size)
+
+    def encode_cursor(self, record, reverse=False):
+        payload = {"d": record.created_at.isoformat(), "i": record.pk}
+        if reverse:
+            payload["r"] = 1
+        raw = json.dumps(payload, separators=(",", ":")).encode()
+        return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+    def decode_cursor(self, cursor):
+        try:
+            padded = cursor + "=" * (-len(cursor) % 4)
+            payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+            return (
+                date.fromisoformat(payload["d"]),
+                int(payload["i"]),
+                bool(payload.get("r")),
+            )
+        except (ValueError, TypeError, KeyError, AttributeError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def get_page_queryset(self, queryset, request):
+        """
+        Запрос строк страницы (с одной лишней строкой — признаком
+        следующей страницы) и направление: None для первой страницы,
+        "next" или "prev" для страниц по курсору.
+        """
+        page_size = self.get_page_size(request)
+        cursor = self.get_query_params(request).get(self.cursor_query_param)
+
+        if not cursor:
+            queryset = queryset.order_by("-created_at", "-id")
+            return queryset[: page_size + 1], None
+
+        created_at, pk, reverse = self.decode_cursor(cursor)
+
+        # Дополнительная граница по created_at даёт условие индексу и
+        # отсекает секции таблицы за другие периоды
+        if reverse:
+            queryset = queryset.filter(
+                Q(created_at__gt=created_at) | Q(created_at=created_at, id__gt=pk),
+                created_at__gte=created_at,
+            ).order_by("created_at", "id")
+        else:
+            queryset = queryset.filter(
+                Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=pk),
+                created_at__lte=created_at,
+            ).order_by("-created_at", "-id")
+        return queryset[: page_size + 1], "prev" if reverse else "next"
+
+    def build_page(self, rows, request, direction):
+        page_size = self.get_page_size(request)
+        has_more = len(rows) > page_size
+        rows = rows[:page_size]
+
+        if direction is None:
+            return KeysetPage(
+                objects=rows,
+                next_cursor=self.encode_cursor(rows[-1]) if has_more else None,
+                prev_cursor=None,
+            )
+
+        if direction == "prev":
+            rows.reverse()
+            has_next, has_prev = True, has_more
+        else:
+            has_next, has_prev = has_more, True
+
+        if not rows:
+            return KeysetPage(objects=[], next_cursor=None, prev_cursor=None)
+
+        return KeysetPage(
+            objects=rows,
+            next_cursor=self.encode_cursor(rows[-1]) if has_next else None,
+            prev_cursor=self.encode_cursor(rows[0], reverse=True) if has_prev else None,
+        )
+
+    def paginate_queryset(self, queryset, request):
+        page_queryset, direction = self.get_page_queryset(queryset, request)
+        return self.build_page(list(page_queryset), request, direction)
+
+    async def apaginate_queryset(self, queryset, request):
+        """
+        Асинхронный вариант paginate_queryset для асинхронных представлений.
+        """
+        page_queryset, direction = self.get_page_queryset(queryset, request)
+        rows = [row async for row in page_queryset]
+        return self.build_page(rows, request, direction)
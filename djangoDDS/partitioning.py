@@ -0,0 +1,314 @@
+import re
+from dataclasses import dataclass
+from datetime import date, timedelta
+from functools import partial
+
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+from django.utils import timezone
+
+from .fragments import all_scopes, invalidate_scopes, mark_records_changed
+from .models import CashFlowDailyRollup, CashFlowRecord
+from .references import get_references
+
+# Секционирование таблицы записей по created_at (PARTITION BY RANGE).
+#
+# Включается один раз командой partition_cashflow: таблица пересоздаётся как
+# секционированная, данные копируются. Дальше секции на будущие периоды
+# создаёт create_cashflow_partitions (по расписанию), а старые периоды
+# отключает detach_cashflow_partitions — это изменение только метаданных,
+# строки не перезаписываются. Запросы с условием на created_at (фильтры
+# даты списка, курсор пагинации) читают только нужные секции.
+
+TABLE = CashFlowRecord._meta.db_table
+DEFAULT_PARTITION = f"{TABLE}_default"
+INTERVALS = ("month", "year")
+PARTITION_BOUND_RE = re.compile(r"FROM \('([\d-]+)'\) TO \('([\d-]+)'\)")
+
+
+class PartitioningError(Exception):
+    pass
+
+
+@dataclass(frozen=True)
+class Partition:
+    name: str
+    start: date
+    end: date
+
+
+def period_start(day, interval):
+    if interval == "year":
+        return day.replace(month=1, day=1)
+    return day.replace(day=1)
+
+
+def next_period(start, interval):
+    if interval == "year":
+        return start.replace(year=start.year + 1)
+    if start.month == 12:
+        return start.replace(year=start.year + 1, month=1)
+    return start.replace(month=start.month + 1)
+
+
+def partition_name(start, interval):
+    suffix = f"{start:%Y}" if interval == "year" else f"{start:%Y_%m}"
+    return f"{TABLE}_p{suffix}"
+
+
+def _quote(connection, name):
+    return connection.ops.quote_name(name)
+
+
+def is_partitioned(using=DEFAULT_DB_ALIAS):
+    connection = connections[using]
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT EXISTS (SELECT 1 FROM pg_partitioned_table"
+            " WHERE partrelid = %s::regclass)",
+            [_quote(connection, TABLE)],
+        )
+        return cursor.fetchone()[0]
+
+
+def list_partitions(using=DEFAULT_DB_ALIAS):
+    """
+    Секции по периодам в порядке дат (секция по умолчанию не входит).
+    """
+    connection = connections[using]
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT c.relname, pg_get_expr(c.relpartbound, c.oid)"
+            "  FROM pg_inherits AS i JOIN pg_class AS c ON c.oid = i.inhrelid"
+            " WHERE i.inhparent = %s::regclass",
+            [_quote(connection, TABLE)],
+        )
+        rows = cursor.fetchall()
+    partitions = []
+    for name, bound in rows:
+        match = PARTITION_BOUND_RE.search(bound)
+        if match:
+            start, end = map(date.fromisoformat, match.groups())
+            partitions.append(Partition(name, start, end))
+    return sorted(partitions, key=lambda partition: partition.start)
+
+
+def partition_interval(partitions):
+    """
+    Период секционирования по последней секции.
+    """
+    last = partitions[-1]
+    return "year" if (last.end - last.start).days > 31 else "month"
+
+
+def _record_columns(connection):
+    # Генерируемые столбцы (search_vector) база вычисляет сама
+    return ", ".join(
+        _quote(connection, field.column)
+        for field in CashFlowRecord._meta.concrete_fields
+        if not field.generated
+    )
+
+
+def _create_partition(cursor, connection, start, end, interval):
+    table = _quote(connection, TABLE)
+    name = _quote(connection, partition_name(start, interval))
+    default = _quote(connection, DEFAULT_PARTITION)
+    cursor.execute(
+        f"SELECT EXISTS (SELECT 1 FROM {default}"
+        " WHERE created_at >= %s AND created_at < %s)",
+        [start, end],
+    )
+    if not cursor.fetchone()[0]:
+        cursor.execute(
+            f"CREATE TABLE {name} PARTITION OF {table} FOR VALUES FROM (%s) TO (%s)",
+            [start, end],
+        )
+        return
+    # Строки периода уже попали в секцию по умолчанию: переносим их в новую
+    # таблицу и подключаем её секцией, иначе PostgreSQL не создаст секцию
+    columns = _record_columns(connection)
+    cursor.execute(
+        f"CREATE TABLE {name} (LIKE {table}"
+        " INCLUDING DEFAULTS INCLUDING GENERATED INCLUDING CONSTRAINTS)"
+    )
+    cursor.execute(
+        f"WITH moved AS (DELETE FROM {default}"
+        " WHERE created_at >= %s AND created_at < %s"
+        f" RETURNING {columns})"
+        f" INSERT INTO {name} ({columns}) SELECT {columns} FROM moved",
+        [start, end],
+    )
+    cursor.execute(
+        f"ALTER TABLE {table} ATTACH PARTITION {name} FOR VALUES FROM (%s) TO (%s)",
+        [start, end],
+    )
+
+
+def ensure_partitions(until, using=DEFAULT_DB_ALIAS):
+    """
+    Создаёт недостающие секции от последней существующей до периода,
+    содержащего дату until. Возвращает имена созданных секций.
+    """
+    connection = connections[using]
+    created = []
+    with transaction.atomic(using=using), connection.cursor() as cursor:
+        partitions = list_partitions(using)
+        if not partitions:
+            raise PartitioningError("Таблица записей не секционирована.")
+        interval = partition_interval(partitions)
+        start = partitions[-1].end
+        while start <= until:
+            end = next_period(start, interval)
+            _create_partition(cursor, connection, start, end, interval)
+            created.append(partition_name(start, interval))
+            start = end
+    return created
+
+
+def convert_to_partitioned(interval, ahead=3, using=DEFAULT_DB_ALIAS):
+    """
+    Пересоздаёт таблицу записей как секционированную по created_at.
+
+    Секции создаются от периода самой ранней записи до ahead периодов
+    вперёд, плюс секция по умолчанию для дат вне диапазона. Индексы и
+    ограничения переносятся с прежними именами; первичный ключ становится
+    (id, created_at) — PostgreSQL требует ключ секционирования в уникальных
+    индексах, для Django ключом остаётся id.
+
+    Выполняется в одной транзакции с блокировкой таблицы на время
+    копирования данных, поэтому требует технологического окна.
+    """
+    if interval not in INTERVALS:
+        raise PartitioningError(f"Неизвестный период: {interval}")
+    connection = connections[using]
+    table = _quote(connection, TABLE)
+    new_table = _quote(connection, f"{TABLE}_new")
+    columns = _record_columns(connection)
+
+    with transaction.atomic(using=using), connection.cursor() as cursor:
+        if is_partitioned(using):
+            raise PartitioningError("Таблица записей уже секционирована.")
+        # Отложенные проверки внешних ключей мешают изменять таблицу
+        cursor.execute("SET CONSTRAINTS ALL IMMEDIATE")
+        cursor.execute(f"LOCK TABLE {table} IN ACCESS EXCLUSIVE MODE")
+
+        # Индексы и ограничения, которые нужно пересоздать (кроме первичного
+        # ключа). Определения индексов уже содержат имя таблицы.
+        cursor.execute(
+            "SELECT pg_get_indexdef(i.indexrelid) FROM pg_index AS i"
+            " WHERE i.indrelid = %s::regclass AND NOT i.indisprimary",
+            [table],
+        )
+        index_defs = [row[0] for row in cursor.fetchall()]
+        cursor.execute(
+            "SELECT conname, pg_get_constraintdef(oid) FROM pg_constraint"
+            " WHERE conrelid = %s::regclass AND contype IN ('f', 'c')",
+            [table],
+        )
+        constraints = cursor.fetchall()
+        cursor.execute(f"SELECT MIN(created_at) FROM {table}")
+        first = cursor.fetchone()[0] or timezone.localdate()
+
+        cursor.execute(
+            f"CREATE TABLE {new_table} (LIKE {table}"
+            " INCLUDING DEFAULTS INCLUDING GENERATED INCLUDING IDENTITY)"
+            " PARTITION BY RANGE (created_at)"
+        )
+        start = period_start(first, interval)
+        last = period_start(timezone.localdate(), interval)
+        for _ in range(ahead):
+            last = next_period(last, interval)
+        while start <= last:
+            end = next_period(start, interval)
+            cursor.execute(
+                f"CREATE TABLE {_quote(connection, partition_name(start, interval))}"
+                f" PARTITION OF {new_table} FOR VALUES FROM (%s) TO (%s)",
+                [start, end],
+            )
+            start = end
+        cursor.execute(
+            f"CREATE TABLE {_quote(connection, DEFAULT_PARTITION)}"
+            f" PARTITION OF {new_table} DEFAULT"
+        )
+
+        cursor.execute(
+            f"INSERT INTO {new_table} ({columns}) SELECT {columns} FROM {table}"
+        )
+        cursor.execute(f"DROP TABLE {table}")
+        cursor.execute(f"ALTER TABLE {new_table} RENAME TO {table}")
+        cursor.execute("SELECT pg_get_serial_sequence(%s, 'id')", [table])
+        sequence = cursor.fetchone()[0]
+        cursor.execute(
+            f"ALTER SEQUENCE {sequence} RENAME TO"
+            f" {_quote(connection, f'{TABLE}_id_seq')}"
+        )
+        cursor.execute(
+            f"SELECT setval(pg_get_serial_sequence(%s, 'id'),"
+            f" COALESCE(MAX(id), 1), MAX(id) IS NOT NULL) FROM {table}",
+            [table],
+        )
+
+        # Индексы строятся после копирования — так быстрее, чем
+        # поддерживать их при вставке
+        cursor.execute(
+            f"ALTER TABLE {table} ADD CONSTRAINT"
+            f" {_quote(connection, f'{TABLE}_pkey')} PRIMARY KEY (id, created_at)"
+        )
+        for index_def in index_defs:
+            cursor.execute(index_def)
+        for name, definition in constraints:
+            cursor.execute(
+                f"ALTER TABLE {table} ADD CONSTRAINT"
+                f" {_quote(connection, name)} {definition}"
+            )
+
+
+def detach_partitions(before, archive_schema=None, drop=False, using=DEFAULT_DB_ALIAS):
+    """
+    Отключает секции, все даты которых раньше before. Отключённая секция
+    переносится в схему archive_schema (или удаляется при drop=True) вместе
+    со своими индексами; данные не копируются.
+
+    Дневные итоги этих периодов удаляются, чтобы они по-прежнему
+    совпадали с записями; перед этим остаток на конец последнего из них
+    сохраняется снимком-границей (is_boundary), от которого дальше
+    считаются остатки. Кешированные таблицы списка сбрасываются, а его
+    Last-Modified и ETag меняются. Возвращает отключённые секции.
+    """
+    from .balances import write_boundary_snapshot
+
+    connection = connections[using]
+    table = _quote(connection, TABLE)
+    detached = []
+    with transaction.atomic(using=using), connection.cursor() as cursor:
+        if archive_schema:
+            cursor.execute(
+                f"CREATE SCHEMA IF NOT EXISTS {_quote(connection, archive_schema)}"
+            )
+        for partition in list_partitions(using):
+            if partition.end > before:
+                break
+            name = _quote(connection, partition.name)
+            cursor.execute(f"ALTER TABLE {table} DETACH PARTITION {name}")
+            if drop:
+                cursor.execute(f"DROP TABLE {name}")
+            elif archive_schema:
+                cursor.execute(
+                    f"ALTER TABLE {name} SET SCHEMA {_quote(connection, archive_schema)}"
+                )
+            detached.append(partition)
+        if detached:
+            # DETACH держит таблицу записей, итоги больше не меняются
+            write_boundary_snapshot(detached[-1].end - timedelta(days=1), using=using)
+        for partition in detached:
+            CashFlowDailyRollup.objects.using(using).filter(
+                date__gte=partition.start, date__lt=partition.end
+            ).delete()
+        if detached:
+            # Как в rebuild_rollups: сейчас и ещё раз после фиксации
+            scopes = all_scopes(get_references())
+            invalidate_scopes(scopes)
+            mark_records_changed()
+            transaction.on_commit(partial(invalidate_scopes, scopes), using=using)
+            transaction.on_commit(mark_records_changed, using=using)
+    return detached
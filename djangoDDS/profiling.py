@@ -0,0 +1,101 @@
+import json
+import os
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+
+from django.utils import timezone
+
+# Выборочный профилировщик запросов.
+#
+# Поток StackSampler каждые interval секунд снимает стек потока запроса
+# (sys._current_frames) и считает одинаковые стеки. Результат сохраняется в
+# формате collapsed stacks ("a;b;c 12"), который понимают flamegraph.pl,
+# speedscope и inferno; рядом пишется JSON с URL и фильтрами запроса.
+# Пока профилирование не включено, код запроса не замедляется: поток не
+# запускается, трассировка интерпретатора не ставится.
+
+
+def frame_name(frame):
+    code = frame.f_code
+    return f"{frame.f_globals.get('__name__', '?')}.{code.co_qualname}"
+
+
+class StackSampler:
+    """
+    Снимает стек потока thread_id от вызова root (не включая его).
+
+    Для асинхронных запросов поток — цикл событий: учитываются только
+    срезы, в которых выполняется корутина запроса, а код в пуле потоков
+    (sync_to_async) в профиль не попадает.
+    """
+
+    def __init__(self, thread_id, root, interval):
+        self.thread_id = thread_id
+        self.root = root
+        self.interval = interval
+        self.stacks = Counter()
+        self.samples = 0
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(
+            target=self.run, name="djangoDDS-profiler", daemon=True
+        )
+
+    def start(self):
+        self.started = time.perf_counter()
+        self.thread.start()
+
+    def stop(self):
+        self.stopped.set()
+        self.thread.join()
+        self.duration = time.perf_counter() - self.started
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            self.sample()
+
+    def sample(self):
+        frame = sys._current_frames().get(self.thread_id)
+        names = []
+        while frame is not None and frame is not self.root:
+            names.append(frame_name(frame))
+            frame = frame.f_back
+        # Без корневого кадра поток занят чем-то другим
+        if frame is None or not names:
+            return
+        self.samples += 1
+        self.stacks[";".join(reversed(names))] += 1
+
+    def collapsed(self):
+        return "".join(
+            f"{stack} {count}\n" for stack, count in self.stacks.most_common()
+        )
+
+
+def save_profile(directory, sampler, request, response):
+    """
+    Сохраняет профиль запроса в directory и возвращает его имя: файл
+    <имя>.collapsed со стеками и <имя>.json со сведениями о запросе.
+    """
+    match = request.resolver_match
+    url_name = match.url_name if match and match.url_name else "unmatched"
+    name = f"{timezone.now():%Y%m%d-%H%M%S}-{url_name}-{uuid.uuid4().hex[:8]}"
+    os.makedirs(directory, exist_ok=True)
+    with open(os.path.join(directory, f"{name}.collapsed"), "w") as output:
+        output.write(sampler.collapsed())
+    meta = {
+        "method": request.method,
+        "path": request.path,
+        "url_name": url_name,
+        "filters": {key: request.GET.getlist(key) for key in request.GET},
+        "status": response.status_code,
+        "duration_ms": round(sampler.duration * 1000, 3),
+        "interval_ms": sampler.interval * 1000,
+        "samples": sampler.samples,
+        "created_at": timezone.now().isoformat(),
+    }
+    with open(os.path.join(directory, f"{name}.json"), "w") as output:
+        json.dump(meta, output, ensure_ascii=False, indent=2)
+    return name
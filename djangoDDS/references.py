@@ -0,0 +1,283 @@
+import uuid
+from dataclasses import dataclass
+from functools import cached_property
+
+from django.core.cache import cache
+from django.db import transaction
+
+from .models import Category, Status, SubCategory, Type
+from .routers import use_primary
+
+REFERENCES_VERSION_KEY = "djangoDDS:references:version"
+REFERENCES_DATA_KEY = "djangoDDS:references:data:{version}"
+REFERENCES_CACHE_TIMEOUT = 60 * 60 * 24
+
+
+@dataclass(frozen=True)
+class ReferenceSnapshot:
+    """
+    Снимок справочников в памяти: идентификаторы и связи между ними.
+
+    Позволяет проверять ссылки записи и иерархию
+    тип -> категория -> подкатегория без запросов к БД на каждую запись.
+    """
+
+    status_names: dict
+    type_names: dict
+    category_types: dict
+    category_names: dict
+    subcategory_categories: dict
+    subcategory_names: dict
+
+    @classmethod
+    def load(cls):
+        categories = list(Category.objects.values_list("id", "type_id", "name"))
+        subcategories = list(
+            SubCategory.objects.values_list("id", "category_id", "name")
+        )
+        return cls(
+            status_names=dict(Status.objects.values_list("id", "name")),
+            type_names=dict(Type.objects.values_list("id", "name")),
+            category_types={pk: type_id for pk, type_id, _ in categories},
+            category_names={pk: name for pk, _, name in categories},
+            subcategory_categories={
+                pk: category_id for pk, category_id, _ in subcategories
+            },
+            subcategory_names={pk: name for pk, _, name in subcategories},
+        )
+
+    @property
+    def status_ids(self):
+        return self.status_names.keys()
+
+    @property
+    def type_ids(self):
+        return self.type_names.keys()
+
+    def names(self, model):
+        return {
+            Status: self.status_names,
+            Type: self.type_names,
+            Category: self.category_names,
+            SubCategory: self.subcategory_names,
+        }[model]
+
+    def options(self, model):
+        """
+        Варианты для выпадающих списков: [{"id": ..., "name": ...}, ...].
+        """
+        return [
+            {"id": pk, "name": name} for pk, name in sorted(self.names(model).items())
+        ]
+
+    def label(self, model, pk):
+        """
+        Подпись элемента справочника, как в __str__ модели.
+        """
+        name = self.names(model)[pk]
+        if model is Category:
+            return f"{name} ({self.type_names[self.category_types[pk]]})"
+        if model is SubCategory:
+            parent = self.category_names[self.subcategory_categories[pk]]
+            return f"{name} ({parent})"
+        return name
+
+    def get(self, model, pk):
+        """
+        Экземпляр справочника из снимка, без запроса к БД. Если в снимке
+        его нет (снимок другого процесса мог устареть), ищется в БД;
+        None, если нет и там.
+        """
+        name = self.names(model).get(pk)
+        if name is None:
+            if (model, pk) in self._missing:
+                return None
+            with use_primary():
+                instance = model.objects.filter(pk=pk).first()
+            if instance is None:
+                self._missing.add((model, pk))
+            return instance
+        fields = {"pk": pk, "name": name}
+        if model is Category:
+            fields["type_id"] = self.category_types[pk]
+        elif model is SubCategory:
+            fields["category_id"] = self.subcategory_categories[pk]
+        instance = model(**fields)
+        instance._state.adding = False
+        instance._state.db = "default"
+        return instance
+
+    def exists(self, model, pk):
+        """
+        Есть ли запись справочника: по снимку, а при промахе — в БД.
+        """
+        return pk in self.names(model) or self.get(model, pk) is not None
+
+    def children(self, model, parent_id):
+        """
+        Варианты зависимого списка: категории типа (model=Category) или
+        подкатегории категории (model=SubCategory).
+        """
+        tree = self._category_tree if model is Category else self._subcategory_tree
+        return tree.get(parent_id, [])
+
+    # Категории и подкатегории, которых нет в снимке (добавлены после его
+    # загрузки), проверяются в БД. Родителя известной записи снимок знает:
+    # тип категории с записями не меняется
+    def category_belongs_to_type(self, category_id, type_id):
+        if category_id in self.category_types:
+            return self.category_types[category_id] == type_id
+        return self._child_exists(Category, category_id, type_id=type_id)
+
+    def subcategory_belongs_to_category(self, subcategory_id, category_id):
+        if subcategory_id in self.subcategory_categories:
+            return self.subcategory_categories[subcategory_id] == category_id
+        return self._child_exists(SubCategory, subcategory_id, category_id=category_id)
+
+    def _child_exists(self, model, pk, **parent):
+        key = (model, pk, *parent.values())
+        if key in self._missing:
+            return False
+        with use_primary():
+            found = model.objects.filter(pk=pk, **parent).exists()
+        if not found:
+            self._missing.add(key)
+        return found
+
+    # Деревья вариантов по родителю строятся при первом обращении
+    @cached_property
+    def _category_tree(self):
+        return self._tree(self.category_types, self.category_names)
+
+    @cached_property
+    def _subcategory_tree(self):
+        return self._tree(self.subcategory_categories, self.subcategory_names)
+
+    @staticmethod
+    def _tree(parents, names):
+        tree = {}
+        for pk, name in sorted(names.items()):
+            tree.setdefault(parents[pk], []).append({"id": pk, "name": name})
+        return tree
+
+    # Индексы по названию (без учёта регистра) строятся при первом обращении
+    @cached_property
+    def _status_index(self):
+        return {name.casefold(): pk for pk, name in self.status_names.items()}
+
+    @cached_property
+    def _type_index(self):
+        return {name.casefold(): pk for pk, name in self.type_names.items()}
+
+    @cached_property
+    def _category_index(self):
+        return {
+            (self.category_types[pk], name.casefold()): pk
+            for pk, name in self.category_names.items()
+        }
+
+    @cached_property
+    def _subcategory_index(self):
+        return {
+            (self.subcategory_categories[pk], name.casefold()): pk
+            for pk, name in self.subcategory_names.items()
+        }
+
+    def find_status(self, name):
+        return self._status_index.get(name.strip().casefold()) or self._find(
+            Status, name
+        )
+
+    def find_type(self, name):
+        return self._type_index.get(name.strip().casefold()) or self._find(Type, name)
+
+    def find_category(self, name, type_id):
+        return self._category_index.get(
+            (type_id, name.strip().casefold())
+        ) or self._find(Category, name, type_id=type_id)
+
+    def find_subcategory(self, name, category_id):
+        return self._subcategory_index.get(
+            (category_id, name.strip().casefold())
+        ) or self._find(SubCategory, name, category_id=category_id)
+
+    # Названия и идентификаторы, которых нет в снимке, ищутся в БД (снимок
+    # мог устареть). Ненайденные запоминаются, чтобы файл импорта или пакет
+    # с опечаткой в каждой строке не превращался в запрос на строку
+    @cached_property
+    def _missing(self):
+        return set()
+
+    def _find(self, model, name, **filters):
+        key = (model, name.strip().casefold(), *filters.values())
+        if key in self._missing:
+            return None
+        with use_primary():
+            pk = (
+                model.objects.filter(name__iexact=name.strip(), **filters)
+                .values_list("pk", flat=True)
+                .first()
+            )
+        if pk is None:
+            self._missing.add(key)
+        return pk
+
+
+# (версия, снимок) — копия снимка в памяти процесса
+_local_snapshot = None
+
+
+def references_version():
+    """
+    Текущая версия справочников; меняется при любом их изменении.
+    """
+    version = cache.get(REFERENCES_VERSION_KEY)
+    if version is None:
+        version = uuid.uuid4().hex
+        if not cache.add(REFERENCES_VERSION_KEY, version, REFERENCES_CACHE_TIMEOUT):
+            version = cache.get(REFERENCES_VERSION_KEY, version)
+    return version
+
+
+def get_references():
+    """
+    Текущий снимок справочников.
+
+    Снимок хранится в кеше Django под номером версии и дополнительно в
+    памяти процесса: пока версия в кеше не изменилась, справочники не
+    загружаются из БД. Версию меняет invalidate_references() при любом
+    изменении справочников.
+    """
+    global _local_snapshot
+
+    version = references_version()
+    local = _local_snapshot
+    if local is not None and local[0] == version:
+        return local[1]
+
+    data_key = REFERENCES_DATA_KEY.format(version=version)
+    snapshot = cache.get(data_key)
+    if snapshot is None:
+        # Снимок кешируется под новой версией: читаем из основной БД, а не
+        # из реплики, которая может ещё не получить изменение
+        with use_primary():
+            snapshot = ReferenceSnapshot.load()
+        cache.set(data_key, snapshot, REFERENCES_CACHE_TIMEOUT)
+    _local_snapshot = (version, snapshot)
+    return snapshot
+
+
+def _bump_references_version():
+    cache.set(REFERENCES_VERSION_KEY, uuid.uuid4().hex, REFERENCES_CACHE_TIMEOUT)
+
+
+def invalidate_references():
+    """
+    Сбрасывает снимок справочников.
+
+    Версия меняется сразу (для текущей транзакции) и ещё раз после
+    фиксации, чтобы другие процессы не закешировали снимок, прочитанный
+    до коммита.
+    """
+    _bump_references_version()
+    transaction.on_commit(_bump_references_version)
@@ -0,0 +1,91 @@
+from django.db.models import Count, Sum
+from django.db.models.functions import (TruncDay, TruncMonth, TruncWeek,
+                                        TruncYear)
+from rest_framework.exceptions import ValidationError
+
+from .models import CashFlowDailyRollup
+
+# Периоды группировки отчёта
+REPORT_PERIODS = {
+    "day": TruncDay,
+    "week": TruncWeek,
+    "month": TruncMonth,
+    "year": TruncYear,
+}
+
+# Измерения группировки: поле идентификатора и название справочника
+REPORT_GROUPS = {
+    "type": ("type_id", "type__name"),
+    "category": ("category_id", "category__name"),
+    "subcategory": ("subcategory_id", "subcategory__name"),
+    "status": ("status_id", "status__name"),
+}
+
+
+def parse_report_params(query_params):
+    """
+    Читает период и измерения группировки из параметров запроса.
+    """
+    period = query_params.get("period") or None
+    if period is not None and period not in REPORT_PERIODS:
+        raise ValidationError(
+            {"period": f"Допустимые значения: {', '.join(REPORT_PERIODS)}."}
+        )
+
+    raw_groups = query_params.get("group_by") or ""
+    group_by = [name.strip() for name in raw_groups.split(",") if name.strip()]
+    unknown = [name for name in group_by if name not in REPORT_GROUPS]
+    if unknown:
+        raise ValidationError(
+            {"group_by": f"Допустимые значения: {', '.join(REPORT_GROUPS)}."}
+        )
+    return period, list(dict.fromkeys(group_by))
+
+
+def build_report(queryset, period=None, group_by=()):
+    """
+    Считает суммы и количество записей средствами БД (GROUP BY).
+
+    queryset может состоять из записей (CashFlowRecord) или дневных итогов
+    (CashFlowDailyRollup); во втором случае суммируются готовые итоги и
+    объём работы зависит от числа дней, а не записей.
+
+    Возвращает список строк вида
+    {"period": ..., "type": id, "type_name": ..., "total": ..., "count": ...}.
+    """
+    if queryset.model is CashFlowDailyRollup:
+        date_field = "date"
+        totals = {"total": Sum("total"), "count": Sum("count")}
+    else:
+        date_field = "created_at"
+        totals = {"total": Sum("amount"), "count": Count("id")}
+
+    annotations = {}
+    group_fields = []
+    if period:
+        annotations["period"] = REPORT_PERIODS[period](date_field)
+        group_fields.append("period")
+    for name in group_by:
+        group_fields.extend(REPORT_GROUPS[name])
+
+    if not group_fields:
+        result = queryset.aggregate(**totals)
+        return [result] if result["count"] else []
+
+    # Сортировка модели по -created_at попала бы в GROUP BY, поэтому сбрасываем её
+    rows = (
+        queryset.order_by()
+        .annotate(**annotations)
+        .values(*group_fields)
+        .annotate(**totals)
+        .order_by(*group_fields)
+    )
+    return [_rename_group_fields(row, group_by) for row in rows]
+
+
+def _rename_group_fields(row, group_by):
+    for name in group_by:
+        id_field, name_field = REPORT_GROUPS[name]
+        row[name] = row.pop(id_field)
+        row[f"{name}_name"] = row.pop(name_field)
+    return row
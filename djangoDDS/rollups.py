@@ -0,0 +1,137 @@
+from collections import defaultdict
+from decimal import Decimal
+from functools import partial
+
+from django.db import connections, router, transaction
+from django.db.models import Count, Q, Sum
+
+from .balances import shift_snapshots
+from .fragments import invalidate_scopes, record_scopes
+from .models import CashFlowDailyRollup, CashFlowRecord
+
+# Ключ дневного итога в порядке колонок таблицы
+ROLLUP_KEY_COLUMNS = ("date", "type_id", "category_id", "subcategory_id", "status_id")
+
+# Количество строк в одном INSERT ... ON CONFLICT
+UPSERT_BATCH_SIZE = 1000
+
+
+def record_key(record):
+    """
+    Ключ дневного итога, в который попадает запись.
+    """
+    created_at = CashFlowRecord._meta.get_field("created_at").to_python(
+        record.created_at
+    )
+    return (
+        created_at,
+        record.type_id,
+        record.category_id,
+        record.subcategory_id,
+        record.status_id,
+    )
+
+
+class RollupDelta:
+    """
+    Накопленные изменения дневных итогов.
+
+    Записи добавляются и вычитаются в памяти, затем apply() применяет
+    изменения одним пакетным UPSERT-запросом:
+    total = total + EXCLUDED.total, count = count + EXCLUDED.count,
+    и сдвигает снимки остатка с более поздними датами (balances.py).
+
+    Через RollupDelta проходит каждое изменение записей, поэтому apply()
+    заодно сбрасывает кешированные таблицы списка в затронутых областях
+    (fragments.py) — даже если итоги не изменились, например при правке
+    комментария.
+    """
+
+    def __init__(self):
+        self.changes = defaultdict(lambda: [Decimal("0.00"), 0])
+        self.scopes = set()
+
+    def add(self, record, sign=1):
+        key = record_key(record)
+        change = self.changes[key]
+        change[0] += sign * Decimal(record.amount)
+        change[1] += sign
+        self.scopes.update(record_scopes(*key[1:]))
+
+    def remove(self, record):
+        self.add(record, sign=-1)
+
+    def apply(self, using=None):
+        changes = sorted(
+            (key, total, count)
+            for key, (total, count) in self.changes.items()
+            if total or count
+        )
+        self.changes.clear()
+        using = using or router.db_for_write(CashFlowDailyRollup)
+        if self.scopes:
+            # Сразу (для текущей транзакции) и ещё раз после фиксации, чтобы
+            # не осталась таблица, отрисованная до коммита
+            scopes = set(self.scopes)
+            self.scopes.clear()
+            invalidate_scopes(scopes)
+            transaction.on_commit(partial(invalidate_scopes, scopes), using=using)
+        if not changes:
+            return
+
+        connection = connections[using]
+        qn = connection.ops.quote_name
+        table = qn(CashFlowDailyRollup._meta.db_table)
+        key_columns = ", ".join(qn(column) for column in ROLLUP_KEY_COLUMNS)
+
+        with transaction.atomic(using=using), connection.cursor() as cursor:
+            for start in range(0, len(changes), UPSERT_BATCH_SIZE):
+                batch = changes[start : start + UPSERT_BATCH_SIZE]
+                values = ", ".join(["(%s, %s, %s, %s, %s, %s, %s)"] * len(batch))
+                params = [
+                    value
+                    for key, total, count in batch
+                    for value in (*key, total, count)
+                ]
+                cursor.execute(
+                    f"INSERT INTO {table} ({key_columns}, total, count) "
+                    f"VALUES {values} "
+                    f"ON CONFLICT ({key_columns}) DO UPDATE SET "
+                    f"total = {table}.total + EXCLUDED.total, "
+                    f"count = {table}.count + EXCLUDED.count",
+                    params,
+                )
+
+            # Итоги, в которых не осталось записей, удаляем
+            emptied = Q()
+            for key, total, count in changes:
+                if count < 0:
+                    emptied |= Q(**dict(zip(ROLLUP_KEY_COLUMNS, key)))
+            if emptied:
+                CashFlowDailyRollup.objects.using(using).filter(
+                    emptied, count__lte=0
+                ).delete()
+
+            # В той же транзакции, что и итоги: build_snapshots ждёт её
+            shift_snapshots(changes, using=using)
+
+
+def rollup_rows(queryset):
+    """
+    Дневные итоги, посчитанные по записям средствами БД (GROUP BY).
+    """
+    rows = (
+        queryset.order_by()
+        .values("created_at", "type_id", "category_id", "subcategory_id", "status_id")
+        .annotate(total=Sum("amount"), count=Count("id"))
+    )
+    for row in rows.iterator(chunk_size=UPSERT_BATCH_SIZE):
+        yield CashFlowDailyRollup(
+            date=row["created_at"],
+            type_id=row["type_id"],
+            category_id=row["category_id"],
+            subcategory_id=row["subcategory_id"],
+            status_id=row["status_id"],
+            total=row["total"],
+            count=row["count"],
+        )
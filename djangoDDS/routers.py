@@ -0,0 +1,70 @@
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+# Откуда читать в текущем запросе: псевдоним реплики или None (основная БД)
+_read_alias = ContextVar("djangoDDS_read_alias", default=None)
+
+
+def choose_replica():
+    """
+    Реплика для чтения с учётом весов из DATABASE_REPLICAS
+    ({псевдоним: вес}); None, если реплики не настроены.
+    """
+    replicas = getattr(settings, "DATABASE_REPLICAS", {})
+    if not replicas:
+        return None
+    aliases = list(replicas)
+    return random.choices(aliases, weights=[replicas[a] for a in aliases])[0]
+
+
+@contextmanager
+def read_from(alias):
+    """
+    Направляет чтения внутри блока в указанную БД (None — в основную).
+    """
+    token = _read_alias.set(alias)
+    try:
+        yield
+    finally:
+        _read_alias.reset(token)
+
+
+def use_primary():
+    """
+    Чтения внутри блока идут в основную БД — например, когда прочитанные
+    данные попадают в общий кеш и не должны отставать от записи.
+    """
+    return read_from(None)
+
+
+class PrimaryReplicaRouter:
+    """
+    Запись — всегда в основную БД, чтение — в реплику, выбранную для
+    запроса (ReplicaRoutingMiddleware), иначе тоже в основную.
+
+    Реплики — копии основной БД, поэтому связи между объектами из разных
+    псевдонимов разрешены, а миграции применяются только к основной.
+    """
+
+    def db_for_read(self, model, **hints):
+        instance = hints.get("instance")
+        if instance is not None and instance._state.db:
+            return instance._state.db
+        alias = _read_alias.get()
+        # Внутри транзакции читаем то, что сами записали
+        if alias is None or connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        return alias
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == DEFAULT_DB_ALIAS
@@ -0,0 +1,211 @@
+import re
+from dataclasses import dataclass, field
+from datetime import datetime
+from decimal import Decimal, InvalidOperation
+
+from asgiref.sync import sync_to_async
+from django.contrib.postgres.search import (SearchQuery, SearchRank,
+                                            TrigramWordSimilarity)
+from django.db import connections
+from django.db.models import F, Lookup, Q
+
+# Конфигурация полнотекстового поиска PostgreSQL для комментариев
+SEARCH_CONFIG = "russian"
+
+# Сумма операции: DecimalField(max_digits=12, decimal_places=2)
+AMOUNT_RE = re.compile(r"^\d{1,10}(?:[.,]\d{1,2})?$")
+DATE_FORMATS = ("%d.%m.%Y", "%Y-%m-%d")
+COMPARISON_RE = re.compile(r"^(>=|<=|>|<|=)(.+)$")
+COMPARISON_LOOKUPS = {">=": "gte", "<=": "lte", ">": "gt", "<": "lt", "=": "exact"}
+RANGE_SEPARATOR = ".."
+
+_trigram_available = {}
+
+
+def trigram_available(using="default"):
+    """
+    Проверяет, установлено ли расширение pg_trgm в базе данных.
+
+    Результат кешируется на время жизни процесса: миграция создаёт
+    расширение только там, где оно доступно.
+    """
+    if using not in _trigram_available:
+        connection = connections[using]
+        if connection.vendor != "postgresql":
+            _trigram_available[using] = False
+        else:
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'")
+                _trigram_available[using] = cursor.fetchone() is not None
+    return _trigram_available[using]
+
+
+async def atrigram_available(using="default"):
+    """
+    Асинхронный вариант trigram_available: в поток уходит только первая
+    проверка, дальше результат берётся из памяти процесса.
+    """
+    if using not in _trigram_available:
+        await sync_to_async(trigram_available)(using)
+    return _trigram_available[using]
+
+
+class ILikeContains(Lookup):
+    """
+    Регистронезависимый поиск подстроки: column ILIKE '%text%'.
+
+    В отличие от icontains (UPPER(column) LIKE UPPER(...)) условие на самом
+    столбце обслуживает триграммный индекс cashflow_comment_trgm_idx.
+    """
+
+    lookup_name = "ilike_contains"
+    prepare_rhs = False
+
+    def get_db_prep_lookup(self, value, connection):
+        return "%s", [f"%{connection.ops.prep_for_like_query(value)}%"]
+
+    def as_sql(self, compiler, connection):
+        lhs, lhs_params = self.process_lhs(compiler, connection)
+        rhs, rhs_params = self.process_rhs(compiler, connection)
+        return f"{lhs} ILIKE {rhs}", (*lhs_params, *rhs_params)
+
+
+def build_search_query(text):
+    return SearchQuery(text, config=SEARCH_CONFIG, search_type="websearch")
+
+
+def comment_search_filter(text, using="default"):
+    """
+    Условие поиска по комментарию.
+
+    Полнотекстовое совпадение по search_vector (GIN-индекс) объединяется с
+    поиском подстроки и нечётким поиском, если установлен pg_trgm: оба
+    обслуживает триграммный GIN-индекс. Без него поиск подстроки читал бы
+    всю таблицу, поэтому остаётся только полнотекстовое совпадение.
+    """
+    condition = Q(search_vector=build_search_query(text))
+    if trigram_available(using):
+        condition |= Q(ILikeContains(F("comment"), text))
+        condition |= Q(comment__trigram_word_similar=text)
+    return condition
+
+
+def comment_search_rank(text, using="default"):
+    """
+    Выражение релевантности записи для поискового запроса.
+    """
+    rank = SearchRank(F("search_vector"), build_search_query(text))
+    if trigram_available(using):
+        rank = rank + TrigramWordSimilarity(text, "comment")
+    return rank
+
+
+def parse_amount(value):
+    if not AMOUNT_RE.match(value):
+        return None
+    try:
+        return Decimal(value.replace(",", "."))
+    except InvalidOperation:
+        return None
+
+
+def parse_date(value):
+    for date_format in DATE_FORMATS:
+        try:
+            return datetime.strptime(value, date_format).date()
+        except ValueError:
+            continue
+    return None
+
+
+def parse_value(value):
+    """
+    Определяет, является ли значение датой или суммой.
+
+    Возвращает пару (поле, значение) или None, если это обычный текст.
+    """
+    parsed_date = parse_date(value)
+    if parsed_date is not None:
+        return "created_at", parsed_date
+    amount = parse_amount(value)
+    if amount is not None:
+        return "amount", amount
+    return None
+
+
+@dataclass
+class ParsedSearchQuery:
+    """
+    Разобранная поисковая строка: условия на сумму и дату и свободный текст.
+    """
+
+    lookups: dict = field(default_factory=dict)
+    text: str = ""
+
+    def to_q(self, using="default"):
+        condition = Q(**self.lookups)
+        if self.text:
+            condition &= comment_search_filter(self.text, using)
+        return condition
+
+
+def parse_range(token):
+    start, _, end = token.partition(RANGE_SEPARATOR)
+    bounds = {}
+    for raw, lookup in ((start, "gte"), (end, "lte")):
+        if not raw:
+            continue
+        parsed = parse_value(raw)
+        if parsed is None:
+            return None
+        bounds[lookup] = parsed
+    fields = {name for name, _ in bounds.values()}
+    if len(fields) != 1:
+        return None
+    return {f"{name}__{lookup}": value for lookup, (name, value) in bounds.items()}
+
+
+def parse_token(token):
+    """
+    Превращает слово поисковой строки в условия фильтрации.
+
+    Поддерживаются суммы и даты (1000, 1000,50, 31.01.2025, 2025-01-31),
+    диапазоны (1000..5000, 01.01.2025..31.01.2025, открытые 1000..) и
+    сравнения (>=2500, <01.02.2025). Для текста возвращается None.
+    """
+    if RANGE_SEPARATOR in token:
+        return parse_range(token)
+
+    lookup = "exact"
+    match = COMPARISON_RE.match(token)
+    if match:
+        lookup = COMPARISON_LOOKUPS[match.group(1)]
+        token = match.group(2)
+
+    parsed = parse_value(token)
+    if parsed is None:
+        return None
+    name, value = parsed
+    return {f"{name}__{lookup}": value}
+
+
+def parse_search_query(raw):
+    """
+    Разбирает поисковую строку на условия по сумме, дате и тексту.
+
+    Каждое условие применяется отдельно, поэтому для суммы и даты
+    используются индексы по этим колонкам, а к комментарию уходит только
+    текстовая часть запроса. Некорректные числа считаются текстом.
+    """
+    # Оператор сравнения может быть отделён от значения пробелом: ">= 2500"
+    normalized = re.sub(r"(>=|<=|>|<|=)\s+", r"\1", raw.strip())
+    parsed = ParsedSearchQuery()
+    words = []
+    for token in normalized.split():
+        lookups = parse_token(token)
+        if lookups is None:
+            words.append(token)
+        else:
+            parsed.lookups.update(lookups)
+    parsed.text = " ".join(words)
+    return parsed
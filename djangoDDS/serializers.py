@@ -1,10 +1,91 @@
+from django.db import transaction
 from django.utils import timezone
 from rest_framework import serializers
+from rest_framework.exceptions import NotFound
+from rest_framework.fields import empty
 
+from .metrics import timer
 from .models import CashFlowRecord, Category, Status, SubCategory, Type
+from .references import get_references
+from .rollups import RollupDelta
 
 
-class CashFlowRecordSerializer(serializers.ModelSerializer):
+class TimedSerializerMixin:
+    """
+    Учитывает время сериализации и проверки данных в метриках запроса
+    (см. metrics.py).
+    """
+
+    def to_representation(self, instance):
+        with timer("serializer"):
+            return super().to_representation(instance)
+
+    def run_validation(self, data=empty):
+        with timer("serializer"):
+            return super().run_validation(data)
+
+
+class ReferenceField(serializers.PrimaryKeyRelatedField):
+    """
+    Ссылка на справочник, которая разрешается по кешированному снимку
+    справочников (get_references) без запросов к БД: и при проверке
+    входных данных, и при построении вариантов выбора в форме.
+
+    Для зависимых полей (parent_field) в форму попадают только варианты
+    выбранного родителя; остальные подгружает dependent-selects.js.
+    """
+
+    def __init__(self, model, parent_field=None, **kwargs):
+        self.model = model
+        self.parent_field = parent_field
+        kwargs.setdefault("queryset", model.objects.all())
+        super().__init__(**kwargs)
+
+    def selected_id(self):
+        """
+        Идентификатор, выбранный в форме: из переданных данных, из
+        редактируемой записи или, как в браузере, первый из вариантов.
+        """
+        serializer = self.parent
+        data = getattr(serializer, "initial_data", None)
+        if data is not None and self.field_name in data:
+            try:
+                return int(data[self.field_name])
+            except (TypeError, ValueError):
+                return None
+        if serializer.instance is not None:
+            return getattr(serializer.instance, f"{self.field_name}_id", None)
+        return next(iter(self.get_choices()), None)
+
+    def to_internal_value(self, data):
+        if isinstance(data, bool):
+            self.fail("incorrect_type", data_type=type(data).__name__)
+        try:
+            pk = int(data)
+        except (TypeError, ValueError):
+            self.fail("incorrect_type", data_type=type(data).__name__)
+        instance = get_references().get(self.model, pk)
+        if instance is None:
+            self.fail("does_not_exist", pk_value=data)
+        return instance
+
+    def get_choices(self, cutoff=None):
+        references = get_references()
+        if self.parent_field is None:
+            options = references.options(self.model)
+        else:
+            parent_id = self.parent.fields[self.parent_field].selected_id()
+            options = references.children(self.model, parent_id)
+        choices = {
+            option["id"]: references.label(self.model, option["id"])
+            for option in options
+        }
+        if cutoff is not None:
+            choices = dict(list(choices.items())[:cutoff])
+        return choices
+
+
+class CashFlowRecordSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     """
     Сериализатор для модели CashFlowRecord.
 
@@ -14,17 +95,15 @@ class CashFlowRecordSerializer(serializers.ModelSerializer):
     - Проверяет, что подкатегория соответствует выбранной категории.
     - Проверяет корректность суммы (неотрицательная).
     - Проверяет дату создания (не больше текущей).
+
+    При сохранении обновляет дневные итоги (CashFlowDailyRollup).
     """
 
-    status = serializers.PrimaryKeyRelatedField(
-        queryset=Status.objects.all(), label="Статус"
-    )
-    type = serializers.PrimaryKeyRelatedField(queryset=Type.objects.all(), label="Тип")
-    category = serializers.PrimaryKeyRelatedField(
-        queryset=Category.objects.all(), label="Категория"
-    )
-    subcategory = serializers.PrimaryKeyRelatedField(
-        queryset=SubCategory.objects.all(), label="Подкатегория"
+    status = ReferenceField(Status, label="Статус")
+    type = ReferenceField(Type, label="Тип")
+    category = ReferenceField(Category, parent_field="type", label="Категория")
+    subcategory = ReferenceField(
+        SubCategory, parent_field="category", label="Подкатегория"
     )
 
     class Meta:
@@ -38,6 +117,7 @@ class CashFlowRecordSerializer(serializers.ModelSerializer):
             "subcategory",
             "amount",
             "comment",
+            "updated_at",
         ]
 
     def validate(self, data):
@@ -56,12 +136,15 @@ class CashFlowRecordSerializer(serializers.ModelSerializer):
                 "Поля category и type обязательны для проверки."
             )
 
-        if category.type != type_:
+        references = get_references()
+        if not references.category_belongs_to_type(category.pk, type_.pk):
             raise serializers.ValidationError(
                 {"category": "Категория должна принадлежать выбранному типу."}
             )
 
-        if subcategory is None or subcategory.category != category:
+        if subcategory is None or not references.subcategory_belongs_to_category(
+            subcategory.pk, category.pk
+        ):
             raise serializers.ValidationError(
                 {"subcategory": "Подкатегория должна принадлежать выбранной категории."}
             )
@@ -84,8 +167,84 @@ class CashFlowRecordSerializer(serializers.ModelSerializer):
 
         return data
 
+    def create(self, validated_data):
+        with transaction.atomic():
+            instance = super().create(validated_data)
+            delta = RollupDelta()
+            delta.add(instance)
+            delta.apply()
+        return instance
+
+    def update(self, instance, validated_data):
+        with transaction.atomic():
+            # Из итогов вычитается заблокированная строка, а не прочитанная
+            # до транзакции: параллельное изменение той же записи иначе
+            # вычлось бы дважды или не вычлось вовсе
+            instance = (
+                CashFlowRecord.objects.select_for_update()
+                .filter(pk=instance.pk)
+                .first()
+            )
+            if instance is None:
+                raise NotFound("Запись не найдена.")
+            delta = RollupDelta()
+            delta.remove(instance)
+            instance = super().update(instance, validated_data)
+            delta.add(instance)
+            delta.apply()
+        return instance
+
 
-class CategorySerializer(serializers.ModelSerializer):
+class CashFlowRecordBulkItemSerializer(TimedSerializerMixin, serializers.Serializer):
+    """
+    Сериализатор одной строки пакетной загрузки записей.
+
+    Ссылки на справочники принимаются идентификаторами и проверяются по
+    снимку справочников из context["references"] (ReferenceSnapshot); в БД
+    идут только ссылки, которых нет в снимке. Строка с id обновляет
+    существующую запись.
+    """
+
+    id = serializers.IntegerField(required=False)
+    created_at = serializers.DateField(label="Дата создания")
+    status = serializers.IntegerField(label="Статус")
+    type = serializers.IntegerField(label="Тип")
+    category = serializers.IntegerField(label="Категория")
+    subcategory = serializers.IntegerField(label="Подкатегория")
+    amount = serializers.DecimalField(
+        max_digits=12, decimal_places=2, label="Сумма операции"
+    )
+    comment = serializers.CharField(
+        required=False, allow_blank=True, allow_null=True, label="Комментарий"
+    )
+
+    def validate(self, data):
+        references = self.context["references"]
+        errors = {}
+
+        if not references.exists(Status, data["status"]):
+            errors["status"] = "Статус не найден."
+        if not references.exists(Type, data["type"]):
+            errors["type"] = "Тип не найден."
+        if not references.category_belongs_to_type(data["category"], data["type"]):
+            errors["category"] = "Категория должна принадлежать выбранному типу."
+        if not references.subcategory_belongs_to_category(
+            data["subcategory"], data["category"]
+        ):
+            errors["subcategory"] = (
+                "Подкатегория должна принадлежать выбранной категории."
+            )
+        if data["amount"] < 0:
+            errors["amount"] = "Сумма не может быть отрицательной."
+        if data["created_at"] > timezone.now().date():
+            errors["created_at"] = "Дата не может быть больше текущей."
+
+        if errors:
+            raise serializers.ValidationError(errors)
+        return data
+
+
+class CategorySerializer(TimedSerializerMixin, serializers.ModelSerializer):
     """
     Сериализатор для модели Category.
     """
@@ -94,8 +253,20 @@ class CategorySerializer(serializers.ModelSerializer):
         model = Category
         fields = "__all__"
 
+    def validate_type(self, value):
+        # Тип записей закреплён составным внешним ключом (category_id, type_id)
+        if (
+            self.instance is not None
+            and self.instance.type_id != value.pk
+            and CashFlowRecord.all_objects.filter(category=self.instance).exists()
+        ):
+            raise serializers.ValidationError(
+                "Нельзя сменить тип категории, по которой есть записи."
+            )
+        return value
+
 
-class SubCategorySerializer(serializers.ModelSerializer):
+class SubCategorySerializer(TimedSerializerMixin, serializers.ModelSerializer):
     """
     Сериализатор для модели SubCategory.
     """
@@ -104,8 +275,20 @@ class SubCategorySerializer(serializers.ModelSerializer):
         model = SubCategory
         fields = "__all__"
 
+    def validate_category(self, value):
+        # Категория записей закреплена составным внешним ключом
+        if (
+            self.instance is not None
+            and self.instance.category_id != value.pk
+            and CashFlowRecord.all_objects.filter(subcategory=self.instance).exists()
+        ):
+            raise serializers.ValidationError(
+                "Нельзя сменить категорию подкатегории, по которой есть записи."
+            )
+        return value
+
 
-class TypeSerializer(serializers.ModelSerializer):
+class TypeSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     """
     Сериализатор для модели Type.
     """
@@ -115,7 +298,7 @@ class TypeSerializer(serializers.ModelSerializer):
         fields = "__all__"
 
 
-class StatusSerializer(serializers.ModelSerializer):
+class StatusSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     """
     Сериализатор для модели Status.
     """
@@ -0,0 +1,36 @@
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from .balances import BALANCE_SIGNS
+from .models import (CashFlowBalanceSnapshot, Category, Status, SubCategory,
+                     Type)
+from .references import invalidate_references
+
+
+@receiver(post_save, sender=Status)
+@receiver(post_save, sender=Type)
+@receiver(post_save, sender=Category)
+@receiver(post_save, sender=SubCategory)
+@receiver(post_delete, sender=Status)
+@receiver(post_delete, sender=Type)
+@receiver(post_delete, sender=Category)
+@receiver(post_delete, sender=SubCategory)
+def reference_changed(sender, **kwargs):
+    """
+    Любое изменение справочников сбрасывает их кешированный снимок.
+    """
+    invalidate_references()
+
+
+@receiver(pre_save, sender=Type)
+def type_renamed(sender, instance, **kwargs):
+    """
+    Переименование типа может поменять его знак в остатке: снимки остатка
+    тогда удаляются, их заново создаёт build_balance_snapshots. Границы
+    отключённых секций остаются — их остаток пересчитать не из чего.
+    """
+    if instance.pk is None:
+        return
+    name = Type.objects.filter(pk=instance.pk).values_list("name", flat=True).first()
+    if BALANCE_SIGNS.get(name, 0) != BALANCE_SIGNS.get(instance.name, 0):
+        CashFlowBalanceSnapshot.objects.filter(is_boundary=False).delete()
@@ -1,3 +1,2159 @@
-from django.test import TestCase
+import csv
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from importlib import import_module
+from io import BytesIO, StringIO
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import CommandError, call_command
+from django.db import (IntegrityError, connection, connections, reset_queries,
+                       transaction)
+from django.db.backends.postgresql.base import DatabaseWrapper
+from django.db.models import Count, F
+from django.http import HttpResponse
+from django.test import (RequestFactory, SimpleTestCase, TestCase,
+                         override_settings)
+from django.test.utils import CaptureQueriesContext
+from django.urls import get_resolver, reverse
+from django.utils import timezone
+from openpyxl import Workbook
+
+from .balances import build_snapshots
+from .dbpool import check_database, pool_stats
+from .filters import CashFlowRecordFilter
+from .fragments import fragment_cache_stats
+from .metrics import registry
+from .middleware import PRIMARY_PIN_COOKIE, ReplicaRoutingMiddleware
+from .models import (CashFlowBalanceSnapshot, CashFlowDailyRollup,
+                     CashFlowRecord, Category, Status, SubCategory, Type)
+from .pagination import CashFlowKeysetPaginator
+from .partitioning import (PartitioningError, convert_to_partitioned,
+                           detach_partitions, ensure_partitions,
+                           is_partitioned, list_partitions)
+from .profiling import StackSampler
+from .references import get_references
+from .rollups import RollupDelta
+from .routers import (PrimaryReplicaRouter, choose_replica, read_from,
+                      use_primary)
+from .search import parse_search_query, trigram_available
+from .serializers import CashFlowRecordSerializer, CategorySerializer
+from .views import CashFlowExportView
+
+
+class CashFlowTestMixin:
+    """
+    Общие справочники и фабрика записей для тестов.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.status = Status.objects.create(name="Бизнес")
+        cls.type = Type.objects.create(name="Пополнение")
+        cls.category = Category.objects.create(name="Инфраструктура", type=cls.type)
+        cls.subcategory = SubCategory.objects.create(name="VPS", category=cls.category)
+
+    def setUp(self):
+        # Кеш не откатывается вместе с транзакцией теста
+        cache.clear()
+
+    def create_records(self, count, **kwargs):
+        records = []
+        for i in range(count):
+            record = CashFlowRecord(
+                created_at=kwargs.get("created_at", date(2025, 1, 1)),
+                status=self.status,
+                type=self.type,
+                category=self.category,
+                subcategory=self.subcategory,
+                amount=kwargs.get("amount", Decimal("100.00") + i),
+                comment=kwargs.get("comment", f"Запись {i}"),
+            )
+            record.save()
+            records.append(record)
+        delta = RollupDelta()
+        for record in records:
+            delta.add(record)
+        delta.apply()
+        return records
+
+
+class CashFlowQueryCountTests(CashFlowTestMixin, TestCase):
+    """
+    Количество запросов к БД не должно зависеть от числа записей.
+    """
+
+    def count_queries(self, url):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(ctx.captured_queries)
+
+    def test_list_query_count_is_constant(self):
+        url = reverse("cashflow_list")
+        self.create_records(1)
+        # Первый запрос загружает справочники в кеш
+        self.client.get(url)
+        # Новые записи сбрасывают кеш таблицы: оба замера — промахи
+        self.create_records(1)
+        small = self.count_queries(url)
+        self.create_records(20)
+        large = self.count_queries(url)
+        self.assertEqual(small, large)
+
+    def test_detail_uses_single_query(self):
+        record = self.create_records(1)[0]
+        with self.assertNumQueries(1):
+            self.client.get(
+                reverse("cashflow_detail", args=[record.pk]), HTTP_ACCEPT="text/html"
+            )
+
+
+# Бюджет каждого URL из djangoDDS/urls.py: (запросов к БД, байт ответа).
+# Проверяется при двух объёмах данных; число запросов не должно расти с
+# числом записей. Выгрузка растёт с числом записей по определению, поэтому
+# для неё задан только бюджет запросов; размер метрик ограничен числом
+# имён URL.
+QUERY_BUDGETS = {
+    "cashflow_list": (2, 45_000),
+    "cashflow_create": (3, 1_000),
+    "cashflow_bulk": (3, 1_000),
+    "cashflow_import": (3, 1_000),
+    "cashflow_export": (1, None),
+    "cashflow_search": (1, 5_000),
+    "cashflow_report": (1, 1_000),
+    "cashflow_balance": (2, 1_000),
+    "cashflow_detail": (1, 2_500),
+    "cashflow_delete": (5, 1_000),
+    "cashflow_restore": (4, 1_000),
+    "cashflow_update": (5, 1_000),
+    "category_list": (3, 2_500),
+    "category_create": (3, 1_000),
+    "category_detail": (2, 1_500),
+    "category_delete": (5, 1_000),
+    "category_subcategories": (0, 1_000),
+    "subcategory_list": (3, 2_500),
+    "subcategory_create": (3, 1_000),
+    "subcategory_detail": (2, 1_500),
+    "subcategory_delete": (4, 1_000),
+    "type_list": (1, 2_500),
+    "type_create": (2, 1_000),
+    "type_detail": (1, 1_500),
+    "type_delete": (5, 1_000),
+    "type_categories": (0, 1_000),
+    "status_list": (1, 2_500),
+    "status_create": (2, 1_000),
+    "status_detail": (1, 1_500),
+    "status_delete": (4, 1_000),
+    "api_cashflow_list": (1, 15_000),
+    "api_cashflow_detail": (1, 1_000),
+    "api_status_list": (1, 1_000),
+    "api_status_detail": (1, 1_000),
+    "api_type_list": (1, 1_000),
+    "api_type_detail": (1, 1_000),
+    "api_category_list": (1, 1_000),
+    "api_category_detail": (1, 1_000),
+    "api_subcategory_list": (1, 1_000),
+    "api_subcategory_detail": (1, 1_000),
+    "health_db": (1, 1_000),
+    "metrics": (0, 300_000),
+}
+# Объёмы данных: меньше и больше одной страницы списка
+BUDGET_SIZES = (5, CashFlowKeysetPaginator.page_size + 30)
+
+
+class QueryBudgetTests(CashFlowTestMixin, TestCase):
+    """
+    Бюджеты запросов к БД и размера ответа для всех URL приложения.
+
+    Каждый запрос выполняется с холодным кешем таблицы (справочники уже
+    загружены) и откатывается, чтобы изменяющие запросы не влияли на
+    следующие замеры.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        # Справочники без записей — для удаления
+        cls.spare_status = Status.objects.create(name="Запасной")
+        cls.spare_type = Type.objects.create(name="Запасной")
+        cls.spare_category = Category.objects.create(name="Запасная", type=cls.type)
+        cls.spare_subcategory = SubCategory.objects.create(
+            name="Запасная", category=cls.category
+        )
+
+    def endpoint_request(self, name):
+        """
+        Запрос к URL: (метод, адрес, параметры клиента).
+        """
+        record = CashFlowRecord.objects.order_by("pk").first()
+        deleted = CashFlowRecord.all_objects.deleted().first()
+        form = {
+            "created_at": "2025-01-01",
+            "status": self.status.pk,
+            "type": self.type.pk,
+            "category": self.category.pk,
+            "subcategory": self.subcategory.pk,
+            "amount": "10.00",
+            "comment": "Бюджет",
+        }
+        statement = SimpleUploadedFile(
+            "statement.csv",
+            "Дата;Статус;Тип;Категория;Подкатегория;Сумма;Комментарий\n"
+            "10.01.2025;Бизнес;Пополнение;Инфраструктура;VPS;10;Импорт\n".encode(),
+        )
+        json_accept = {"HTTP_ACCEPT": "application/json"}
+        requests = {
+            "cashflow_list": ("get", reverse("cashflow_list"), {}),
+            "cashflow_create": ("post", reverse("cashflow_create"), {"data": form}),
+            "cashflow_bulk": (
+                "post",
+                reverse("cashflow_bulk"),
+                {"data": [form, form], "content_type": "application/json"},
+            ),
+            "cashflow_import": (
+                "post",
+                reverse("cashflow_import"),
+                {"data": {"file": statement}},
+            ),
+            "cashflow_export": ("get", reverse("cashflow_export", args=["csv"]), {}),
+            "cashflow_search": (
+                "get",
+                reverse("cashflow_search"),
+                {"data": {"q": "Запись"}},
+            ),
+            "cashflow_report": ("get", reverse("cashflow_report"), json_accept),
+            "cashflow_balance": (
+                "get",
+                reverse("cashflow_balance"),
+                {"data": {"date_from": "2024-12-01"}},
+            ),
+            "cashflow_detail": (
+                "get",
+                reverse("cashflow_detail", args=[record.pk]),
+                {},
+            ),
+            "cashflow_delete": (
+                "post",
+                reverse("cashflow_delete", args=[record.pk]),
+                {},
+            ),
+            "cashflow_restore": (
+                "post",
+                reverse("cashflow_restore", args=[deleted.pk]),
+                {},
+            ),
+            "cashflow_update": (
+                "post",
+                reverse("cashflow_update", args=[record.pk]),
+                {"data": form},
+            ),
+            "category_list": ("get", reverse("category_list"), {}),
+            "category_create": (
+                "post",
+                reverse("category_create"),
+                {"data": {"name": "Новая", "type": self.type.pk}},
+            ),
+            "category_detail": (
+                "get",
+                reverse("category_detail", args=[self.category.pk]),
+                {},
+            ),
+            "category_delete": (
+                "post",
+                reverse("category_delete", args=[self.spare_category.pk]),
+                {},
+            ),
+            "category_subcategories": (
+                "get",
+                reverse("category_subcategories", args=[self.category.pk]),
+                {},
+            ),
+            "subcategory_list": ("get", reverse("subcategory_list"), {}),
+            "subcategory_create": (
+                "post",
+                reverse("subcategory_create"),
+                {"data": {"name": "Новая", "category": self.category.pk}},
+            ),
+            "subcategory_detail": (
+                "get",
+                reverse("subcategory_detail", args=[self.subcategory.pk]),
+                {},
+            ),
+            "subcategory_delete": (
+                "post",
+                reverse("subcategory_delete", args=[self.spare_subcategory.pk]),
+                {},
+            ),
+            "type_list": ("get", reverse("type_list"), {}),
+            "type_create": (
+                "post",
+                reverse("type_create"),
+                {"data": {"name": "Новый"}},
+            ),
+            "type_detail": ("get", reverse("type_detail", args=[self.type.pk]), {}),
+            "type_delete": (
+                "post",
+                reverse("type_delete", args=[self.spare_type.pk]),
+                {},
+            ),
+            "type_categories": (
+                "get",
+                reverse("type_categories", args=[self.type.pk]),
+                {},
+            ),
+            "status_list": ("get", reverse("status_list"), {}),
+            "status_create": (
+                "post",
+                reverse("status_create"),
+                {"data": {"name": "Новый"}},
+            ),
+            "status_detail": (
+                "get",
+                reverse("status_detail", args=[self.status.pk]),
+                {},
+            ),
+            "status_delete": (
+                "post",
+                reverse("status_delete", args=[self.spare_status.pk]),
+                {},
+            ),
+            "api_cashflow_list": ("get", reverse("api_cashflow_list"), {}),
+            "api_cashflow_detail": (
+                "get",
+                reverse("api_cashflow_detail", args=[record.pk]),
+                {},
+            ),
+            "health_db": ("get", reverse("health_db"), {}),
+            "metrics": ("get", reverse("metrics"), {}),
+        }
+        for model, obj in (
+            ("status", self.status),
+            ("type", self.type),
+            ("category", self.category),
+            ("subcategory", self.subcategory),
+        ):
+            requests[f"api_{model}_list"] = ("get", reverse(f"api_{model}_list"), {})
+            requests[f"api_{model}_detail"] = (
+                "get",
+                reverse(f"api_{model}_detail", args=[obj.pk]),
+                {},
+            )
+        return requests[name]
+
+    def request(self, name, method, url, kwargs):
+        with transaction.atomic():
+            response = getattr(self.client, method)(url, **kwargs)
+            if response.streaming:
+                content = b"".join(response.streaming_content)
+            else:
+                content = response.content
+            transaction.set_rollback(True)
+        self.assertLess(response.status_code, 400, f"{name}: {response.status_code}")
+        return content
+
+    def measure(self, name):
+        # Первый запрос прогревает кеши процесса (например, проверку pg_trgm).
+        # Запрос строится заново: загруженный файл читается один раз
+        self.request(name, *self.endpoint_request(name))
+        request = self.endpoint_request(name)
+        cache.clear()
+        get_references()
+        # Журнал запросов ограничен 9000 записями; переполненный журнал
+        # сдвигает срез CaptureQueriesContext
+        reset_queries()
+        with CaptureQueriesContext(connection) as ctx:
+            content = self.request(name, *request)
+        # Точки сохранения отката — не запросы представления
+        queries = [
+            query for query in ctx.captured_queries if "SAVEPOINT" not in query["sql"]
+        ]
+        return len(queries), len(content)
+
+    def test_every_url_has_budget(self):
+        names = {
+            pattern.name
+            for pattern in get_resolver("djangoDDS.urls").url_patterns
+            if getattr(pattern, "name", None)
+        }
+        self.assertEqual(names, set(QUERY_BUDGETS))
+
+    def test_budgets(self):
+        query_counts = {}
+        for size in BUDGET_SIZES:
+            self.create_records(size - CashFlowRecord.all_objects.count())
+            CashFlowRecord.objects.order_by("-pk").first().soft_delete()
+            for name, (max_queries, max_bytes) in QUERY_BUDGETS.items():
+                with self.subTest(url_name=name, records=size):
+                    queries, length = self.measure(name)
+                    query_counts.setdefault(name, []).append(queries)
+                    self.assertLessEqual(queries, max_queries)
+                    if max_bytes is not None:
+                        self.assertLessEqual(length, max_bytes)
+
+        for name, counts in query_counts.items():
+            with self.subTest(url_name=name):
+                self.assertEqual(
+                    len(set(counts)),
+                    1,
+                    f"{name}: число запросов растёт с числом записей {counts}",
+                )
+
+
+class CashFlowKeysetPaginationTests(CashFlowTestMixin, TestCase):
+    """
+    Курсорная пагинация списка записей.
+    """
+
+    def get_page(self, **params):
+        response = self.client.get(
+            reverse("cashflow_list"), params, HTTP_ACCEPT="application/json"
+        )
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_walks_forward_and_back(self):
+        for day in (1, 1, 2, 2, 3):
+            self.create_records(1, created_at=date(2025, 1, day))
+        expected = list(
+            CashFlowRecord.objects.order_by("-created_at", "-id").values_list(
+                "id", flat=True
+            )
+        )
+
+        first = self.get_page(page_size=2)
+        self.assertIsNone(first["prev"])
+        second = self.get_page(page_size=2, cursor=first["next"])
+        third = self.get_page(page_size=2, cursor=second["next"])
+        self.assertIsNone(third["next"])
+
+        seen = [row["id"] for page in (first, second, third) for row in page["results"]]
+        self.assertEqual(seen, expected)
+
+        back = self.get_page(page_size=2, cursor=third["prev"])
+        self.assertEqual(back["results"], second["results"])
+        back = self.get_page(page_size=2, cursor=back["prev"])
+        self.assertEqual(back["results"], first["results"])
+        self.assertIsNone(back["prev"])
+
+    def test_invalid_cursor_returns_404(self):
+        response = self.client.get(
+            reverse("cashflow_list"),
+            {"cursor": "garbage"},
+            HTTP_ACCEPT="application/json",
+        )
+        self.assertEqual(response.status_code, 404)
+
+    def test_html_page_links(self):
+        self.create_records(3)
+        response = self.client.get(reverse("cashflow_list"), {"page_size": 2})
+        self.assertIsNotNone(response.context["next_url"])
+        self.assertIsNone(response.context["prev_url"])
+
+
+class CashFlowFilterTests(CashFlowTestMixin, TestCase):
+    """
+    Фильтры списка записей и команда explain_cashflow.
+    """
+
+    def test_invalid_filter_values_are_ignored(self):
+        self.create_records(2)
+        response = self.client.get(
+            reverse("cashflow_list"),
+            {"type": "abc", "date_from": "не дата"},
+            HTTP_ACCEPT="application/json",
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()["results"]), 2)
+
+    def test_explain_command_prints_plan_per_combination(self):
+        self.create_records(1)
+        out = StringIO()
+        call_command("explain_cashflow", stdout=out)
+        self.assertIn("без фильтров", out.getvalue())
+        self.assertIn("status=", out.getvalue())
+
+
+class CashFlowSearchTests(CashFlowTestMixin, TestCase):
+    """
+    Полнотекстовый поиск по комментариям.
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.create_records(1, comment="Оплата серверов за январь")
+        self.create_records(1, comment="Пополнение счёта")
+        self.create_records(1, comment="Серверы и сервер резервный")
+
+    def test_matches_word_forms(self):
+        comments = set(
+            CashFlowRecord.objects.search("сервер").values_list("comment", flat=True)
+        )
+        self.assertEqual(
+            comments, {"Оплата серверов за январь", "Серверы и сервер резервный"}
+        )
+
+    def test_matches_substring(self):
+        if not trigram_available():
+            self.skipTest("Поиск подстроки включается вместе с pg_trgm")
+        self.assertEqual(CashFlowRecord.objects.search("полнени").count(), 1)
+
+    def test_search_uses_indexes(self):
+        # Без других условий и сортировки индекс может дать только поиск
+        queryset = CashFlowRecord.all_objects.search("аренда").order_by()
+        with connection.cursor() as cursor:
+            # На трёх записях планировщик всегда выбрал бы полный просмотр
+            cursor.execute("SET LOCAL enable_seqscan = off")
+            plan = queryset.explain()
+        self.assertNotIn("Seq Scan", plan)
+        self.assertIn("cashflow_search_vector_idx", plan)
+        if trigram_available():
+            self.assertIn("cashflow_comment_trgm_idx", plan)
+
+    def test_substring_is_case_insensitive_and_literal(self):
+        if not trigram_available():
+            self.skipTest("Поиск подстроки включается вместе с pg_trgm")
+        self.assertEqual(CashFlowRecord.objects.search("ПОЛНЕНИ").count(), 1)
+        self.assertEqual(CashFlowRecord.objects.search("%").count(), 0)
+
+    def test_ranked_search_orders_by_relevance(self):
+        first = CashFlowRecord.objects.ranked_search("сервер").first()
+        self.assertEqual(first.comment, "Серверы и сервер резервный")
+
+    def test_list_search_by_amount_and_text(self):
+        self.create_records(1, amount=Decimal("5000.00"), comment="Аренда офиса")
+        response = self.client.get(
+            reverse("cashflow_list"),
+            {"search": "аренда 4000..6000"},
+            HTTP_ACCEPT="application/json",
+        )
+        self.assertEqual(response.status_code, 200)
+        results = response.json()["results"]
+        self.assertEqual([r["comment"] for r in results], ["Аренда офиса"])
+
+    def test_list_search_malformed_number(self):
+        response = self.client.get(
+            reverse("cashflow_list"),
+            {"search": "12,3,4"},
+            HTTP_ACCEPT="application/json",
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["results"], [])
+
+    def test_search_view(self):
+        response = self.client.get(reverse("cashflow_search"), {"q": "январь"})
+        self.assertEqual(response.status_code, 200)
+        results = response.json()["results"]
+        self.assertEqual([r["comment"] for r in results], ["Оплата серверов за январь"])
+
+
+class SearchQueryParserTests(SimpleTestCase):
+    """
+    Разбор поисковой строки на сумму, дату и текст.
+    """
+
+    def test_plain_amount(self):
+        parsed = parse_search_query("1000,50")
+        self.assertEqual(parsed.lookups, {"amount__exact": Decimal("1000.50")})
+        self.assertEqual(parsed.text, "")
+
+    def test_amount_range_and_comparison(self):
+        self.assertEqual(
+            parse_search_query("1000..5000").lookups,
+            {"amount__gte": Decimal("1000"), "amount__lte": Decimal("5000")},
+        )
+        self.assertEqual(
+            parse_search_query(">= 2500").lookups, {"amount__gte": Decimal("2500")}
+        )
+        self.assertEqual(
+            parse_search_query("..300").lookups, {"amount__lte": Decimal("300")}
+        )
+
+    def test_dates(self):
+        self.assertEqual(
+            parse_search_query("31.01.2025").lookups,
+            {"created_at__exact": date(2025, 1, 31)},
+        )
+        self.assertEqual(
+            parse_search_query("2025-01-01..2025-01-31").lookups,
+            {
+                "created_at__gte": date(2025, 1, 1),
+                "created_at__lte": date(2025, 1, 31),
+            },
+        )
+
+    def test_mixed_query(self):
+        parsed = parse_search_query("аренда >1000 <01.02.2025 офис")
+        self.assertEqual(
+            parsed.lookups,
+            {"amount__gt": Decimal("1000"), "created_at__lt": date(2025, 2, 1)},
+        )
+        self.assertEqual(parsed.text, "аренда офис")
+
+    def test_malformed_values_are_text(self):
+        for raw in ("12,3,4", "31.02.2025", "1000..01.01.2025", "99999999999"):
+            parsed = parse_search_query(raw)
+            self.assertEqual(parsed.lookups, {}, raw)
+            self.assertEqual(parsed.text, raw)
+
+
+class CashFlowReportTests(CashFlowTestMixin, TestCase):
+    """
+    Отчёт с агрегацией на стороне БД.
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.create_records(2, created_at=date(2025, 1, 10), amount=Decimal("100.00"))
+        self.create_records(1, created_at=date(2025, 2, 5), amount=Decimal("50.00"))
+
+    def get_report(self, **params):
+        return self.client.get(reverse("cashflow_report"), params)
+
+    def test_totals_by_month(self):
+        response = self.get_report(period="month", group_by="type")
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual(data["total"], "250.00")
+        self.assertEqual(data["count"], 3)
+        self.assertEqual(
+            [(r["period"], r["type_name"], r["total"]) for r in data["results"]],
+            [
+                ("2025-01-01", "Пополнение", "200.00"),
+                ("2025-02-01", "Пополнение", "50.00"),
+            ],
+        )
+
+    def test_applies_list_filters(self):
+        data = self.get_report(date_from="2025-02-01").json()
+        self.assertEqual(data["results"], [{"total": "50.00", "count": 1}])
+
+    def test_rejects_unknown_group(self):
+        self.assertEqual(self.get_report(group_by="amount").status_code, 400)
+        self.assertEqual(self.get_report(period="decade").status_code, 400)
+
+
+class CashFlowBalanceTests(CashFlowTestMixin, TestCase):
+    """
+    Остаток по дням: нарастающий итог в БД и снимки остатка.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.expense = Type.objects.create(name="Списание")
+        cls.expense_category = Category.objects.create(
+            name="Маркетинг", type=cls.expense
+        )
+        cls.expense_subcategory = SubCategory.objects.create(
+            name="Avito", category=cls.expense_category
+        )
+
+    def setUp(self):
+        super().setUp()
+        self.create_records(1, created_at=date(2025, 1, 10), amount=Decimal("100.00"))
+        self.spend(date(2025, 1, 20), "30.00")
+        self.create_records(1, created_at=date(2025, 2, 5), amount=Decimal("50.00"))
+        self.spend(date(2025, 2, 5), "5.00")
+
+    def spend(self, day, amount):
+        return self.client.post(
+            reverse("cashflow_create"),
+            {
+                "created_at": day.isoformat(),
+                "status": self.status.pk,
+                "type": self.expense.pk,
+                "category": self.expense_category.pk,
+                "subcategory": self.expense_subcategory.pk,
+                "amount": amount,
+            },
+        )
+
+    def get_balance(self, **params):
+        response = self.client.get(reverse("cashflow_balance"), params)
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def snapshots(self):
+        return list(
+            CashFlowBalanceSnapshot.objects.order_by("date").values_list(
+                "date", "balance"
+            )
+        )
+
+    def test_running_balance(self):
+        data = self.get_balance()
+        self.assertEqual(data["opening_balance"], "0.00")
+        self.assertEqual(
+            [(r["date"], r["change"], r["balance"]) for r in data["results"]],
+            [
+                ("2025-01-10", "100.00", "100.00"),
+                ("2025-01-20", "-30.00", "70.00"),
+                ("2025-02-05", "45.00", "115.00"),
+            ],
+        )
+        self.assertEqual(data["closing_balance"], "115.00")
+
+    def test_range_starts_from_snapshot(self):
+        created = build_snapshots(until=date(2025, 2, 28))
+        self.assertEqual(
+            self.snapshots(),
+            [
+                (date(2025, 1, 31), Decimal("70.00")),
+                (date(2025, 2, 28), created[-1].balance),
+            ],
+        )
+        self.assertEqual(created[-1].balance, Decimal("115.00"))
+
+        data = self.get_balance(date_from="2025-02-01")
+        self.assertEqual(data["opening_balance"], "70.00")
+        self.assertEqual(data["closing_balance"], "115.00")
+
+        # Дни до снимка не пересчитываются: остаток берётся из снимка
+        CashFlowBalanceSnapshot.objects.filter(date=date(2025, 1, 31)).update(
+            balance=Decimal("1070.00")
+        )
+        data = self.get_balance(date_from="2025-02-01", date_to="2025-02-10")
+        self.assertEqual(data["opening_balance"], "1070.00")
+        self.assertEqual(data["results"][0]["balance"], "1115.00")
+
+    def test_opening_balance_between_snapshot_and_range(self):
+        build_snapshots(until=date(2025, 1, 31))
+        data = self.get_balance(date_from="2025-02-06")
+        self.assertEqual(data["opening_balance"], "115.00")
+        self.assertEqual(data["results"], [])
+        self.assertEqual(data["closing_balance"], "115.00")
+
+    def test_backdated_changes_shift_snapshots(self):
+        build_snapshots(until=date(2025, 2, 28))
+        self.spend(date(2025, 1, 15), "20.00")
+        record = CashFlowRecord.objects.get(amount=Decimal("100.00"))
+        self.client.post(reverse("cashflow_delete", args=[record.pk]))
+
+        shifted = self.snapshots()
+        self.assertEqual(
+            shifted,
+            [
+                (date(2025, 1, 31), Decimal("-50.00")),
+                (date(2025, 2, 28), Decimal("-5.00")),
+            ],
+        )
+        build_snapshots(until=date(2025, 2, 28), rebuild=True)
+        self.assertEqual(self.snapshots(), shifted)
+
+    def test_rebuild_rollups_refreshes_snapshots(self):
+        build_snapshots(until=date(2025, 2, 28))
+        # Запись, загруженная в обход приложения (как loaddata)
+        CashFlowRecord.objects.bulk_create(
+            [
+                CashFlowRecord(
+                    created_at=date(2025, 1, 5),
+                    status=self.status,
+                    type=self.type,
+                    category=self.category,
+                    subcategory=self.subcategory,
+                    amount=Decimal("10.00"),
+                )
+            ]
+        )
+        call_command("rebuild_rollups", "--date-from", "2025-01-01", stdout=StringIO())
+        self.assertEqual(
+            self.snapshots(),
+            [
+                (date(2025, 1, 31), Decimal("80.00")),
+                (date(2025, 2, 28), Decimal("125.00")),
+            ],
+        )
+
+    def test_type_rename_drops_snapshots(self):
+        build_snapshots(until=date(2025, 2, 28))
+        self.type.name = "Продажи"
+        self.type.save()
+        self.assertEqual(self.snapshots(), [])
+
+    def test_command(self):
+        out = StringIO()
+        call_command(
+            "build_balance_snapshots",
+            "--interval",
+            "year",
+            "--until",
+            "2025-12-31",
+            stdout=out,
+        )
+        self.assertEqual(self.snapshots(), [(date(2025, 12, 31), Decimal("115.00"))])
+        call_command("build_balance_snapshots", "--until", "2025-12-31", stdout=out)
+        self.assertEqual(len(self.snapshots()), 1)
+        self.assertIn("Новых снимков нет", out.getvalue())
+
+    def test_rejects_invalid_dates(self):
+        url = reverse("cashflow_balance")
+        self.assertEqual(
+            self.client.get(url, {"date_from": "2025-13-01"}).status_code, 400
+        )
+        self.assertEqual(
+            self.client.get(
+                url, {"date_from": "2025-02-01", "date_to": "2025-01-01"}
+            ).status_code,
+            400,
+        )
+
+
+class CashFlowDailyRollupTests(CashFlowTestMixin, TestCase):
+    """
+    Инкрементальное обновление дневных итогов.
+    """
+
+    def post_record(self, url, **overrides):
+        data = {
+            "created_at": "2025-01-10",
+            "status": self.status.pk,
+            "type": self.type.pk,
+            "category": self.category.pk,
+            "subcategory": self.subcategory.pk,
+            "amount": "100.00",
+            "comment": "",
+        }
+        data.update(overrides)
+        return self.client.post(url, data)
+
+    def rollups(self):
+        return list(
+            CashFlowDailyRollup.objects.order_by("date").values_list(
+                "date", "total", "count"
+            )
+        )
+
+    def assert_consistent(self):
+        call_command("rebuild_rollups", "--check", stdout=StringIO())
+
+    def test_create_update_delete(self):
+        self.post_record(reverse("cashflow_create"))
+        self.post_record(reverse("cashflow_create"), amount="50.00")
+        self.assertEqual(self.rollups(), [(date(2025, 1, 10), Decimal("150.00"), 2)])
+
+        record = CashFlowRecord.objects.order_by("id").first()
+        self.post_record(
+            reverse("cashflow_update", args=[record.pk]), created_at="2025-01-11"
+        )
+        self.assertEqual(
+            self.rollups(),
+            [
+                (date(2025, 1, 10), Decimal("50.00"), 1),
+                (date(2025, 1, 11), Decimal("100.00"), 1),
+            ],
+        )
+        self.assert_consistent()
+
+        self.client.post(reverse("cashflow_delete", args=[record.pk]))
+        self.assertEqual(self.rollups(), [(date(2025, 1, 10), Decimal("50.00"), 1)])
+        self.assert_consistent()
+
+    def test_rebuild_restores_rollups(self):
+        self.create_records(3)
+        CashFlowDailyRollup.objects.update(total=0)
+        with self.assertRaises(CommandError):
+            self.assert_consistent()
+        call_command("rebuild_rollups", stdout=StringIO())
+        self.assert_consistent()
+
+
+class CashFlowSoftDeleteTests(CashFlowTestMixin, TestCase):
+    """
+    Мягкое удаление, восстановление и очистка записей.
+    """
+
+    def rollup_count(self):
+        return CashFlowDailyRollup.objects.get().count
+
+    def test_delete_hides_record_and_restore_returns_it(self):
+        live, deleted = self.create_records(2)
+        self.client.post(reverse("cashflow_delete", args=[deleted.pk]))
+
+        deleted = CashFlowRecord.all_objects.get(pk=deleted.pk)
+        self.assertTrue(deleted.is_deleted)
+        self.assertIsNotNone(deleted.deleted_at)
+        self.assertEqual(list(CashFlowRecord.objects.all()), [live])
+        self.assertEqual(self.rollup_count(), 1)
+        response = self.client.get(reverse("cashflow_detail", args=[deleted.pk]))
+        self.assertEqual(response.status_code, 404)
+        response = self.client.get(
+            reverse("cashflow_list"), HTTP_ACCEPT="application/json"
+        )
+        self.assertEqual([row["id"] for row in response.json()["results"]], [live.pk])
+        call_command("rebuild_rollups", "--check", stdout=StringIO())
+
+        # Повторное удаление не вычитает запись из итогов второй раз
+        self.assertFalse(deleted.soft_delete())
+
+        response = self.client.post(reverse("cashflow_restore", args=[deleted.pk]))
+        self.assertRedirects(response, reverse("cashflow_detail", args=[deleted.pk]))
+        self.assertEqual(CashFlowRecord.objects.count(), 2)
+        self.assertEqual(self.rollup_count(), 2)
+
+        response = self.client.post(reverse("cashflow_restore", args=[live.pk]))
+        self.assertEqual(response.status_code, 404)
+
+    def test_purge_removes_old_tombstones_in_batches(self):
+        records = self.create_records(5)
+        for record in records[:4]:
+            record.soft_delete()
+        CashFlowRecord.all_objects.filter(pk__in=[r.pk for r in records[:3]]).update(
+            deleted_at=timezone.now() - timedelta(days=40)
+        )
+
+        out = StringIO()
+        call_command("purge_cashflow", "--days", "30", "--batch-size", "2", stdout=out)
+        self.assertIn("Очистка завершена: 3", out.getvalue())
+        self.assertEqual(
+            set(CashFlowRecord.all_objects.values_list("pk", flat=True)),
+            {records[3].pk, records[4].pk},
+        )
+
+    def test_list_uses_partial_index(self):
+        self.create_records(3)
+        with connection.cursor() as cursor:
+            cursor.execute("SET enable_seqscan = off")
+            plan = CashFlowRecord.objects.order_by("-created_at", "-id")[:10].explain()
+        self.assertIn("cashflow_live_created_idx", plan)
+
+
+class ConditionalGetTests(CashFlowTestMixin, TestCase):
+    """
+    ETag, Last-Modified и ответы 304 для списков и карточек.
+    """
+
+    def get(self, url, **headers):
+        return self.client.get(url, HTTP_ACCEPT="application/json", **headers)
+
+    def test_list_not_modified_until_records_change(self):
+        url = reverse("cashflow_list")
+        record = self.create_records(1)[0]
+        response = self.get(url)
+        self.assertEqual(response.status_code, 200)
+        etag = response["ETag"]
+        self.assertIn("Last-Modified", response)
+        self.assertIn("no-cache", response["Cache-Control"])
+
+        # Без изменений ответ не строится: только запрос времени изменения
+        with self.assertNumQueries(1):
+            response = self.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response["ETag"], etag)
+
+        record.soft_delete()
+        response = self.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], etag)
+
+    def test_html_and_json_have_different_etags(self):
+        self.create_records(1)
+        url = reverse("cashflow_list")
+        html = self.client.get(url, HTTP_ACCEPT="text/html")
+        self.assertNotEqual(html["ETag"], self.get(url)["ETag"])
+        self.assertIn("Accept", html["Vary"])
+
+    def test_detail_last_modified(self):
+        record = self.create_records(1)[0]
+        url = reverse("cashflow_detail", args=[record.pk])
+        response = self.get(url)
+        self.assertEqual(response.json()["id"], record.pk)
+        last_modified = response["Last-Modified"]
+
+        response = self.get(url, HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEqual(response.status_code, 304)
+
+        CashFlowRecord.objects.filter(pk=record.pk).update(
+            updated_at=record.updated_at + timedelta(minutes=1)
+        )
+        response = self.get(url, HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEqual(response.status_code, 200)
+
+    def test_reference_pages_follow_references_version(self):
+        url = reverse("category_detail", args=[self.category.pk])
+        get_references()
+        etag = self.client.get(url)["ETag"]
+        with self.assertNumQueries(0):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+        self.category.name = "Сервера"
+        self.category.save()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, "Сервера")
+
+
+class CashFlowTableFragmentTests(CashFlowTestMixin, TestCase):
+    """
+    Кеш отрисованной таблицы записей.
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.other_type = Type.objects.create(name="Списание")
+        self.other_category = Category.objects.create(
+            name="Маркетинг", type=self.other_type
+        )
+        self.other_subcategory = SubCategory.objects.create(
+            name="Реклама", category=self.other_category
+        )
+        self.record = self.create_records(1)[0]
+
+    def get(self, **params):
+        return self.client.get(
+            reverse("cashflow_list"), params, HTTP_ACCEPT="text/html"
+        )
+
+    def test_hit_for_equivalent_query(self):
+        response = self.get(type=self.type.pk, search="")
+        self.assertEqual(response["X-Fragment-Cache"], "miss")
+        with self.assertNumQueries(1):
+            response = self.get(type=f" {self.type.pk} ", page_size="", foo="bar")
+        self.assertEqual(response["X-Fragment-Cache"], "hit")
+        self.assertContains(response, "Запись 0")
+
+        out = StringIO()
+        call_command("cashflow_cache_stats", "--reset", stdout=out)
+        self.assertIn("Попаданий: 1, промахов: 1", out.getvalue())
+        self.assertEqual(fragment_cache_stats()["hits"], 0)
+
+    def test_rebuild_rollups_invalidates_all_scopes(self):
+        self.get(type=self.type.pk)
+        self.get(status=self.status.pk)
+        CashFlowRecord.objects.filter(pk=self.record.pk).update(comment="Изменено")
+        call_command("rebuild_rollups", stdout=StringIO())
+        response = self.get(type=self.type.pk)
+        self.assertEqual(response["X-Fragment-Cache"], "miss")
+        self.assertContains(response, "Изменено")
+        self.assertEqual(self.get(status=self.status.pk)["X-Fragment-Cache"], "miss")
+
+    def test_page_links_use_normalized_params(self):
+        self.create_records(2)
+        response = self.get(type=self.type.pk, page_size="1", utm_source="mail")
+        self.assertEqual(response["X-Fragment-Cache"], "miss")
+        self.assertContains(
+            response, f'href="?page_size=1&amp;type={self.type.pk}&amp;cursor='
+        )
+        self.assertNotContains(response, "utm_source")
+
+    def test_invalidated_only_in_affected_scope(self):
+        self.get(type=self.type.pk)
+        self.get(type=self.other_type.pk)
+        self.get()
+
+        delta = RollupDelta()
+        record = CashFlowRecord(
+            created_at=date(2025, 1, 2),
+            status=self.status,
+            type=self.other_type,
+            category=self.other_category,
+            subcategory=self.other_subcategory,
+            amount=Decimal("5.00"),
+        )
+        record.save()
+        delta.add(record)
+        delta.apply()
+
+        self.assertEqual(self.get(type=self.type.pk)["X-Fragment-Cache"], "hit")
+        self.assertEqual(self.get(type=self.other_type.pk)["X-Fragment-Cache"], "miss")
+        self.assertEqual(self.get()["X-Fragment-Cache"], "miss")
+
+    def test_comment_edit_invalidates(self):
+        self.get(type=self.type.pk)
+        response = self.client.post(
+            reverse("cashflow_update", args=[self.record.pk]),
+            {
+                "created_at": "2025-01-01",
+                "status": self.status.pk,
+                "type": self.type.pk,
+                "category": self.category.pk,
+                "subcategory": self.subcategory.pk,
+                "amount": "100.00",
+                "comment": "Новый комментарий",
+            },
+        )
+        self.assertEqual(response.status_code, 302)
+        response = self.get(type=self.type.pk)
+        self.assertEqual(response["X-Fragment-Cache"], "miss")
+        self.assertContains(response, "Новый комментарий")
+
+
+class AsyncApiTests(CashFlowTestMixin, TestCase):
+    """
+    Асинхронные JSON-представления.
+    """
+
+    async def test_list_pages_and_count(self):
+        await sync_to_async(self.create_records)(3)
+        url = reverse("api_cashflow_list")
+        response = await self.async_client.get(url, {"page_size": 2, "count": 1})
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual(len(data["results"]), 2)
+        self.assertEqual(data["count"], 3)
+
+        response = await self.async_client.get(
+            url, {"page_size": 2, "cursor": data["next"]}
+        )
+        self.assertEqual(len(response.json()["results"]), 1)
+
+        response = await self.async_client.get(url, {"cursor": "###"})
+        self.assertEqual(response.status_code, 404)
+
+    async def test_list_search(self):
+        await sync_to_async(self.create_records)(1, comment="Оплата серверов")
+        await sync_to_async(self.create_records)(1, comment="Аренда")
+        response = await self.async_client.get(
+            reverse("api_cashflow_list"), {"search": "серверы"}
+        )
+        self.assertEqual(
+            [row["comment"] for row in response.json()["results"]], ["Оплата серверов"]
+        )
+
+    async def test_detail(self):
+        record = (await sync_to_async(self.create_records)(1))[0]
+        response = await self.async_client.get(
+            reverse("api_cashflow_detail", args=[record.pk])
+        )
+        self.assertEqual(response.json()["category"], self.category.pk)
+        response = await self.async_client.get(
+            reverse("api_cashflow_detail", args=[10**9])
+        )
+        self.assertEqual(response.status_code, 404)
+
+    async def test_references(self):
+        response = await self.async_client.get(reverse("api_category_list"))
+        self.assertEqual(
+            response.json()["results"],
+            [{"id": self.category.pk, "name": "Инфраструктура", "type": self.type.pk}],
+        )
+        response = await self.async_client.get(
+            reverse("api_status_detail", args=[self.status.pk])
+        )
+        self.assertEqual(response.json()["name"], "Бизнес")
+
+
+class DatabasePoolTests(TestCase):
+    """
+    Проверка БД и метрики пула соединений.
+    """
+
+    def test_health_without_pool(self):
+        response = self.client.get(reverse("health_db"))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {"database": "ok", "pool": None})
+
+    def test_health_hides_connection_errors(self):
+        connections["broken_replica"] = DatabaseWrapper(
+            {**connection.settings_dict, "PORT": "1", "CONN_MAX_AGE": 0},
+            alias="broken_replica",
+        )
+        try:
+            with override_settings(DATABASE_REPLICAS={"broken_replica": 1}):
+                with self.assertLogs("djangoDDS.health", "ERROR") as logs:
+                    response = self.client.get(reverse("health_db"))
+        finally:
+            del connections["broken_replica"]
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            response.json(),
+            {"database": "ok", "pool": None, "replicas": {"broken_replica": "error"}},
+        )
+        self.assertIn("broken_replica", logs.output[0])
+
+    def test_pool_stats(self):
+        wrapper = DatabaseWrapper(
+            {
+                **connection.settings_dict,
+                "CONN_MAX_AGE": 0,
+                "CONN_HEALTH_CHECKS": True,
+                "OPTIONS": {"pool": {"min_size": 1, "max_size": 2}},
+            },
+            alias="pool_test",
+        )
+        connections["pool_test"] = wrapper
+        try:
+            self.assertEqual(check_database("pool_test"), (True, None))
+            stats = pool_stats("pool_test")
+        finally:
+            wrapper.close()
+            wrapper.close_pool()
+            del connections["pool_test"]
+        self.assertEqual(stats["max_size"], 2)
+        self.assertGreaterEqual(stats["requests_num"], 1)
+        self.assertTrue(0 <= stats["saturation"] <= 1)
+
+
+class ReplicaRoutingTests(SimpleTestCase):
+    """
+    Маршрутизация чтений между основной БД и репликами.
+    """
+
+    def setUp(self):
+        self.router = PrimaryReplicaRouter()
+        self.factory = RequestFactory()
+
+    def seen_alias(self, request):
+        seen = []
+
+        def view(request):
+            seen.append(self.router.db_for_read(CashFlowRecord))
+            return HttpResponse()
+
+        response = ReplicaRoutingMiddleware(view)(request)
+        return seen[0], response
+
+    def test_reads_from_primary_by_default(self):
+        self.assertEqual(self.router.db_for_read(CashFlowRecord), "default")
+        with read_from("replica_1"):
+            self.assertEqual(self.router.db_for_read(CashFlowRecord), "replica_1")
+            self.assertEqual(self.router.db_for_write(CashFlowRecord), "default")
+            with use_primary():
+                self.assertEqual(self.router.db_for_read(CashFlowRecord), "default")
+        self.assertFalse(self.router.allow_migrate("replica_1", "djangoDDS"))
+
+    @override_settings(DATABASE_REPLICAS={"replica_1": 1, "replica_2": 0})
+    def test_weighted_choice(self):
+        self.assertEqual({choose_replica() for _ in range(20)}, {"replica_1"})
+
+    @override_settings(DATABASE_REPLICAS={"replica_1": 1})
+    def test_middleware_routes_safe_requests(self):
+        alias, response = self.seen_alias(self.factory.get("/"))
+        self.assertEqual(alias, "replica_1")
+        self.assertNotIn(PRIMARY_PIN_COOKIE, response.cookies)
+
+        alias, response = self.seen_alias(self.factory.post("/"))
+        self.assertEqual(alias, "default")
+        self.assertIn(PRIMARY_PIN_COOKIE, response.cookies)
+
+    @override_settings(DATABASE_REPLICAS={"replica_1": 1})
+    def test_reads_own_writes(self):
+        request = self.factory.get("/")
+        request.COOKIES[PRIMARY_PIN_COOKIE] = str(time.time() + 5)
+        self.assertEqual(self.seen_alias(request)[0], "default")
+
+        request.COOKIES[PRIMARY_PIN_COOKIE] = str(time.time() - 1)
+        self.assertEqual(self.seen_alias(request)[0], "replica_1")
+
+    @override_settings(DATABASE_REPLICAS={"replica_1": 1})
+    async def test_async_middleware(self):
+        async def view(request):
+            return HttpResponse(self.router.db_for_read(CashFlowRecord))
+
+        response = await ReplicaRoutingMiddleware(view)(self.factory.get("/"))
+        self.assertEqual(response.content, b"replica_1")
+
+    @override_settings(DATABASE_REPLICAS={"replica_test": 1})
+    def test_export_streams_from_chosen_replica(self):
+        replica = DatabaseWrapper(
+            {**connection.settings_dict, "CONN_MAX_AGE": 0}, alias="replica_test"
+        )
+        connections["replica_test"] = replica
+        try:
+            url = reverse("cashflow_export", args=["csv"])
+            request = self.factory.get(url)
+            request.resolver_match = get_resolver().resolve(url)
+            view = CashFlowExportView.as_view()
+            response = ReplicaRoutingMiddleware(
+                lambda request: view(request, export_format="csv")
+            )(request)
+            # Тело читается уже после выхода из middleware
+            with CaptureQueriesContext(replica) as queries:
+                b"".join(response.streaming_content)
+        finally:
+            replica.close()
+            del connections["replica_test"]
+        self.assertEqual(len(queries.captured_queries), 1)
+
+    def test_no_cookie_without_replicas(self):
+        response = self.seen_alias(self.factory.post("/"))[1]
+        self.assertNotIn(PRIMARY_PIN_COOKIE, response.cookies)
+
+
+class CashFlowPartitioningTests(CashFlowTestMixin, TestCase):
+    """
+    Секционирование таблицы записей по дате операции.
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.january = self.create_records(2, created_at=date(2025, 1, 15))
+        self.march = self.create_records(1, created_at=date(2025, 3, 10))
+        convert_to_partitioned("month", ahead=1)
+
+    def partition_of(self, record):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'SELECT tableoid::regclass::text FROM "djangoDDS_cashflowrecord"'
+                " WHERE id = %s",
+                [record.pk],
+            )
+            return cursor.fetchone()[0].strip('"')
+
+    def test_convert_keeps_records(self):
+        self.assertTrue(is_partitioned())
+        partitions = list_partitions()
+        self.assertEqual(partitions[0].name, "djangoDDS_cashflowrecord_p2025_01")
+        self.assertGreater(partitions[-1].end, timezone.localdate())
+        self.assertEqual(
+            self.partition_of(self.march[0]), "djangoDDS_cashflowrecord_p2025_03"
+        )
+        self.assertEqual(CashFlowRecord.objects.count(), 3)
+        with self.assertRaises(PartitioningError):
+            convert_to_partitioned("month")
+
+        # Последовательность id продолжается, индексы перенесены
+        record = self.create_records(1, created_at=date(2025, 3, 11))[0]
+        self.assertGreater(record.pk, self.march[0].pk)
+        self.assertIn(
+            "cashflow_search_vector_idx",
+            connection.introspection.get_constraints(
+                connection.cursor(), "djangoDDS_cashflowrecord"
+            ),
+        )
+        response = self.client.get(
+            reverse("cashflow_list"),
+            {"search": "Запись"},
+            HTTP_ACCEPT="application/json",
+        )
+        self.assertEqual(len(response.json()["results"]), 4)
+
+    def test_date_range_prunes_partitions(self):
+        queryset = CashFlowRecordFilter(
+            {"date_from": "2025-03-01", "date_to": "2025-03-31"},
+            queryset=CashFlowRecord.objects.all(),
+        ).qs
+        plan = queryset.explain()
+        self.assertIn("djangoDDS_cashflowrecord_p2025_03", plan)
+        self.assertNotIn("djangoDDS_cashflowrecord_p2025_01", plan)
+        self.assertNotIn("djangoDDS_cashflowrecord_default", plan)
+
+    def test_future_partitions_take_default_rows(self):
+        until = list_partitions()[-1].end + timedelta(days=40)
+        record = self.create_records(1, created_at=until)[0]
+        self.assertEqual(self.partition_of(record), "djangoDDS_cashflowrecord_default")
+
+        created = ensure_partitions(until)
+        self.assertEqual(len(created), 2)
+        self.assertEqual(self.partition_of(record), created[-1])
+        self.assertEqual(ensure_partitions(until), [])
+
+    def test_detach_archives_old_periods(self):
+        detached = detach_partitions(date(2025, 2, 1), archive_schema="archive")
+        self.assertEqual(
+            [partition.name for partition in detached],
+            ["djangoDDS_cashflowrecord_p2025_01"],
+        )
+        self.assertEqual(CashFlowRecord.objects.count(), 1)
+        self.assertFalse(
+            CashFlowDailyRollup.objects.filter(date__lt=date(2025, 2, 1)).exists()
+        )
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'SELECT COUNT(*) FROM archive."djangoDDS_cashflowrecord_p2025_01"'
+            )
+            self.assertEqual(cursor.fetchone()[0], 2)
+
+    def test_detach_invalidates_list_caches(self):
+        # Last-Modified с точностью до секунды: записи изменены раньше
+        CashFlowRecord.all_objects.update(
+            updated_at=F("updated_at") - timedelta(hours=1)
+        )
+        url = reverse("cashflow_list")
+        self.client.get(url, HTTP_ACCEPT="text/html")
+        response = self.client.get(url, HTTP_ACCEPT="text/html")
+        self.assertEqual(response["X-Fragment-Cache"], "hit")
+        etag, last_modified = response["ETag"], response["Last-Modified"]
+
+        with self.captureOnCommitCallbacks(execute=True):
+            detach_partitions(date(2025, 2, 1), drop=True)
+        response = self.client.get(
+            url, HTTP_ACCEPT="text/html", HTTP_IF_NONE_MATCH=etag
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["X-Fragment-Cache"], "miss")
+        self.assertNotContains(response, "Запись 1")
+        response = self.client.get(
+            url, HTTP_ACCEPT="text/html", HTTP_IF_MODIFIED_SINCE=last_modified
+        )
+        self.assertEqual(response.status_code, 200)
+
+    def test_detach_keeps_balance_history(self):
+        build_snapshots(until=date(2025, 3, 31))
+        detach_partitions(date(2025, 2, 1), drop=True)
+        self.assertEqual(
+            list(
+                CashFlowBalanceSnapshot.objects.order_by("date").values_list(
+                    "date", "balance", "is_boundary"
+                )
+            ),
+            [
+                (date(2025, 1, 31), Decimal("201.00"), True),
+                (date(2025, 2, 28), Decimal("201.00"), False),
+                (date(2025, 3, 31), Decimal("301.00"), False),
+            ],
+        )
+
+        # Пересчёт итогов и снимков не трогает границу и не теряет архив
+        call_command("rebuild_rollups", stdout=StringIO())
+        build_snapshots(until=date(2025, 3, 31), rebuild=True)
+        CashFlowBalanceSnapshot.objects.filter(is_boundary=False).delete()
+        for params in ({}, {"date_from": "2025-03-01"}):
+            data = self.client.get(reverse("cashflow_balance"), params).json()
+            self.assertEqual(data["opening_balance"], "201.00")
+            self.assertEqual(data["closing_balance"], "301.00")
+            self.assertEqual(
+                [(r["date"], r["balance"]) for r in data["results"]],
+                [("2025-03-10", "301.00")],
+            )
+
+
+class BenchmarkTests(TestCase):
+    """
+    Синтетический журнал и нагрузочные замеры.
+    """
+
+    def test_generate_ledger(self):
+        call_command("generate_ledger", rows=500, days=60, stdout=StringIO())
+
+        records = CashFlowRecord.all_objects.select_related("category", "subcategory")
+        self.assertEqual(records.count(), 500)
+        for record in records:
+            self.assertEqual(record.category.type_id, record.type_id)
+            self.assertEqual(record.subcategory.category_id, record.category_id)
+        # Распределение по подкатегориям неравномерное
+        counts = sorted(
+            records.values("subcategory")
+            .annotate(n=Count("id"))
+            .values_list("n", flat=True)
+        )
+        self.assertGreater(counts[-1], 500 / SubCategory.objects.count() * 2)
+
+        out = StringIO()
+        call_command("rebuild_rollups", check=True, stdout=out)
+        self.assertIn("согласованы", out.getvalue())
+
+    def test_benchmark_writes_json(self):
+        call_command("generate_ledger", rows=100, stdout=StringIO())
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "bench.json")
+            call_command(
+                "benchmark_cashflow",
+                iterations=3,
+                warmup=0,
+                output=path,
+                stderr=StringIO(),
+            )
+            with open(path, encoding="utf-8") as report_file:
+                report = json.load(report_file)
+
+        # Без --include-writes замеры не меняют данные
+        self.assertEqual(report["meta"]["rows"], 100)
+        self.assertEqual(CashFlowRecord.all_objects.count(), 100)
+        results = {result["name"]: result for result in report["results"]}
+        self.assertIn("list:all", results)
+        self.assertIn("list:type+date_from+date_to", results)
+        self.assertNotIn("create", results)
+        self.assertEqual(results["detail"]["errors"], 0)
+        self.assertEqual(results["detail"]["requests"], 3)
+        self.assertLessEqual(results["detail"]["p50_ms"], results["detail"]["p99_ms"])
+
+    def test_benchmark_writes_only_when_requested(self):
+        call_command("generate_ledger", rows=100, stdout=StringIO())
+        out, err = StringIO(), StringIO()
+        call_command(
+            "benchmark_cashflow",
+            iterations=3,
+            warmup=0,
+            only=["create", "update"],
+            include_writes=True,
+            stdout=out,
+            stderr=err,
+        )
+        results = {
+            result["name"]: result for result in json.loads(out.getvalue())["results"]
+        }
+        for name in ("create", "update"):
+            self.assertEqual(results[name]["errors"], 0)
+            self.assertEqual(results[name]["requests"], 3)
+        self.assertEqual(CashFlowRecord.all_objects.count(), 103)
+        self.assertIn("изменят записи", err.getvalue())
+
+
+class RequestMetricsTests(CashFlowTestMixin, TestCase):
+    """
+    Метрики запросов: Server-Timing, гистограммы и журнал медленных запросов.
+    """
+
+    def setUp(self):
+        super().setUp()
+        registry.reset()
+        self.create_records(3)
+
+    def timings(self, response):
+        return {
+            part.split(";")[0].strip(): part.strip()
+            for part in response["Server-Timing"].split(",")
+        }
+
+    def test_server_timing(self):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(reverse("cashflow_list"))
+        timings = self.timings(response)
+        self.assertIn(f'desc="{len(ctx.captured_queries)} queries"', timings["db"])
+        self.assertNotEqual(timings["tpl"], "tpl;dur=0.0")
+        self.assertIn("total", timings)
+
+        response = self.client.get(
+            reverse("cashflow_list"), HTTP_ACCEPT="application/json"
+        )
+        self.assertNotEqual(self.timings(response)["ser"], "ser;dur=0.0")
+
+    def test_metrics_endpoint(self):
+        self.client.get(reverse("cashflow_list"))
+        self.client.get(reverse("cashflow_list"))
+
+        response = self.client.get(reverse("metrics"))
+        self.assertEqual(response.status_code, 200)
+        body = response.content.decode()
+        self.assertIn('dds_request_queries_count{url_name="cashflow_list"} 2', body)
+        self.assertIn(
+            'dds_request_duration_seconds_bucket{url_name="cashflow_list",le="+Inf"} 2',
+            body,
+        )
+        self.assertIn("# TYPE dds_request_sql_seconds histogram", body)
+        self.assertIn("dds_fragment_cache_misses_total 1", body)
+        self.assertIn("dds_fragment_cache_hits_total 1", body)
+
+        response = self.client.get(reverse("metrics"), REMOTE_ADDR="10.0.0.1")
+        self.assertEqual(response.status_code, 404)
+
+    @override_settings(SLOW_REQUEST_MS=0)
+    def test_slow_request_log(self):
+        with self.assertLogs("djangoDDS.slow_requests", "WARNING") as logs:
+            self.client.get(reverse("cashflow_list"), HTTP_ACCEPT="application/json")
+        self.assertIn("cashflow_list", logs.output[0])
+        self.assertIn('FROM "djangoDDS_cashflowrecord"', logs.output[0])
+
+
+class ProfilingTests(CashFlowTestMixin, TestCase):
+    """
+    Профилирование запросов по заголовку X-Profile и по доле запросов.
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.create_records(3)
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+
+    def get_list(self, **headers):
+        with self.settings(PROFILER_DIR=self.directory, PROFILER_TOKEN="secret"):
+            return self.client.get(
+                reverse("cashflow_list"), {"status": self.status.pk}, **headers
+            )
+
+    def test_disabled_by_default(self):
+        response = self.get_list()
+        self.assertNotIn("X-Profile-Id", response)
+        response = self.get_list(HTTP_X_PROFILE="wrong")
+        self.assertNotIn("X-Profile-Id", response)
+        self.assertEqual(os.listdir(self.directory), [])
+
+    def test_token_header(self):
+        response = self.get_list(HTTP_X_PROFILE="secret")
+        name = response["X-Profile-Id"]
+        self.assertTrue(
+            os.path.exists(os.path.join(self.directory, f"{name}.collapsed"))
+        )
+        with open(os.path.join(self.directory, f"{name}.json")) as meta_file:
+            meta = json.load(meta_file)
+        self.assertEqual(meta["url_name"], "cashflow_list")
+        self.assertEqual(meta["filters"], {"status": [str(self.status.pk)]})
+        self.assertEqual(meta["status"], 200)
+
+    def test_staff_header(self):
+        self.client.force_login(
+            User.objects.create_user("admin", password="secret", is_staff=True)
+        )
+        self.assertIn("X-Profile-Id", self.get_list(HTTP_X_PROFILE="1"))
+
+    def test_sample_rate(self):
+        with self.settings(PROFILER_SAMPLE_RATE=1):
+            self.assertIn("X-Profile-Id", self.get_list())
+
+    async def test_async_request(self):
+        with self.settings(PROFILER_DIR=self.directory, PROFILER_TOKEN="secret"):
+            response = await self.async_client.get(
+                reverse("api_cashflow_list"), headers={"X-Profile": "secret"}
+            )
+        self.assertEqual(response.status_code, 200)
+        name = response["X-Profile-Id"]
+        with open(os.path.join(self.directory, f"{name}.json")) as meta_file:
+            self.assertEqual(json.load(meta_file)["url_name"], "api_cashflow_list")
+
+    def test_sampler_collapsed_stacks(self):
+        def busy():
+            deadline = time.perf_counter() + 0.1
+            while time.perf_counter() < deadline:
+                pass
+
+        sampler = StackSampler(threading.get_ident(), sys._getframe(), 0.001)
+        sampler.start()
+        busy()
+        sampler.stop()
+        self.assertGreater(sampler.samples, 0)
+        stack, count = sampler.collapsed().splitlines()[0].rsplit(" ", 1)
+        self.assertTrue(stack.endswith("test_sampler_collapsed_stacks.<locals>.busy"))
+        self.assertGreater(int(count), 0)
+
+
+class CashFlowBulkTests(CashFlowTestMixin, TestCase):
+    """
+    Пакетное создание и обновление записей.
+    """
+
+    def row(self, **overrides):
+        row = {
+            "created_at": "2025-01-10",
+            "status": self.status.pk,
+            "type": self.type.pk,
+            "category": self.category.pk,
+            "subcategory": self.subcategory.pk,
+            "amount": "10.00",
+        }
+        row.update(overrides)
+        return row
+
+    def post_rows(self, rows):
+        return self.client.post(
+            reverse("cashflow_bulk"), rows, content_type="application/json"
+        )
+
+    def test_valid_rows_saved_despite_bad_rows(self):
+        other_type = Type.objects.create(name="Списание")
+        existing = self.create_records(1)[0]
+        response = self.post_rows(
+            [
+                self.row(),
+                self.row(type=other_type.pk),
+                self.row(id=existing.pk, amount="999.00"),
+                self.row(id=10**9),
+                self.row(amount="abc"),
+            ]
+        )
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual(len(data["created"]), 1)
+        self.assertEqual(data["updated"], [existing.pk])
+        self.assertEqual([error["index"] for error in data["errors"]], [1, 3, 4])
+        self.assertIn("category", data["errors"][0]["errors"])
+
+        existing.refresh_from_db()
+        self.assertEqual(existing.amount, Decimal("999.00"))
+        call_command("rebuild_rollups", "--check", stdout=StringIO())
+
+    def test_query_count_does_not_grow_with_batch(self):
+        get_references()
+        with CaptureQueriesContext(connection) as small:
+            self.post_rows([self.row()] * 2)
+        with CaptureQueriesContext(connection) as large:
+            self.post_rows([self.row()] * 200)
+        self.assertEqual(len(small.captured_queries), len(large.captured_queries))
+
+    def test_unknown_ids_checked_once_per_batch(self):
+        def bad_rows(count):
+            return [
+                self.row(status=10**9),
+                self.row(category=10**9),
+                self.row(subcategory=10**9),
+            ] * count
+
+        get_references()
+        with CaptureQueriesContext(connection) as small:
+            self.post_rows(bad_rows(1))
+        cache.clear()
+        get_references()
+        with CaptureQueriesContext(connection) as large:
+            response = self.post_rows(bad_rows(50))
+        self.assertEqual(len(response.json()["errors"]), 150)
+        self.assertEqual(len(small.captured_queries), len(large.captured_queries))
+
+    def test_update_without_comment_keeps_comment(self):
+        record = self.create_records(1, comment="Аренда")[0]
+        response = self.post_rows([self.row(id=record.pk, amount="20.00")])
+        self.assertEqual(response.json()["updated"], [record.pk])
+        record.refresh_from_db()
+        self.assertEqual(record.amount, Decimal("20.00"))
+        self.assertEqual(record.comment, "Аренда")
+
+        self.post_rows([self.row(id=record.pk, comment=None)])
+        record.refresh_from_db()
+        self.assertIsNone(record.comment)
+
+    def test_all_rows_invalid(self):
+        response = self.post_rows([self.row(status=10**9)])
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()["errors"][0]["index"], 0)
+
+
+class CashFlowImportTests(CashFlowTestMixin, TestCase):
+    """
+    Импорт выписок из CSV и XLSX.
+    """
+
+    CSV = (
+        "Дата;Статус;Тип;Категория;Подкатегория;Сумма;Комментарий\n"
+        "10.01.2025;бизнес;Пополнение;Инфраструктура;VPS;1 000,50;Первая\n"
+        "2025-01-11;Бизнес;Пополнение;Нет такой;VPS;10;Вторая\n"
+        "12.01.2025;Бизнес;Пополнение;Инфраструктура;VPS;-5;Третья\n"
+        "13.01.2025;Бизнес;Пополнение;Инфраструктура;VPS;20;Четвёртая\n"
+    )
+
+    def write_csv(self, directory):
+        path = os.path.join(directory, "statement.csv")
+        with open(path, "w", encoding="utf-8") as statement:
+            statement.write(self.CSV)
+        return path
+
+    def test_command_imports_and_writes_rejects(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = self.write_csv(directory)
+            call_command(
+                "import_cashflow", path, "--chunk-size", "2", stdout=StringIO()
+            )
+
+            with open(f"{path}.rejects.csv", encoding="utf-8") as rejects_file:
+                rejects = list(csv.reader(rejects_file))
+            self.assertFalse(os.path.exists(f"{path}.checkpoint"))
+
+        self.assertEqual([row[0] for row in rejects[1:]], ["3", "4"])
+        self.assertEqual(
+            sorted(CashFlowRecord.objects.values_list("amount", flat=True)),
+            [Decimal("20.00"), Decimal("1000.50")],
+        )
+        call_command("rebuild_rollups", "--check", stdout=StringIO())
+
+    def test_command_resumes_from_checkpoint(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = self.write_csv(directory)
+            with open(f"{path}.checkpoint", "w", encoding="utf-8") as checkpoint:
+                json.dump({"size": os.path.getsize(path), "line": 4}, checkpoint)
+            call_command("import_cashflow", path, stdout=StringIO())
+
+        self.assertEqual(
+            list(CashFlowRecord.objects.values_list("comment", flat=True)),
+            ["Четвёртая"],
+        )
+
+    def xlsx(self):
+        # Те же строки, что в CSV, но с типизированными ячейками: дата,
+        # число и целое, как их сохраняет Excel
+        workbook = Workbook()
+        sheet = workbook.active
+        sheet.append(
+            [
+                "Дата",
+                "Статус",
+                "Тип",
+                "Категория",
+                "Подкатегория",
+                "Сумма",
+                "Комментарий",
+            ]
+        )
+        sheet.append(
+            [
+                datetime(2025, 1, 10),
+                "бизнес",
+                "Пополнение",
+                "Инфраструктура",
+                "VPS",
+                1000.5,
+                "Первая",
+            ]
+        )
+        sheet.append(
+            [
+                date(2025, 1, 11),
+                "Бизнес",
+                "Пополнение",
+                "Нет такой",
+                "VPS",
+                10,
+                "Вторая",
+            ]
+        )
+        sheet.append(
+            [
+                "12.01.2025",
+                "Бизнес",
+                "Пополнение",
+                "Инфраструктура",
+                "VPS",
+                -5,
+                "Третья",
+            ]
+        )
+        sheet.append([None] * 7)
+        sheet.append(
+            [
+                date(2025, 1, 13),
+                "Бизнес",
+                "Пополнение",
+                "Инфраструктура",
+                "VPS",
+                20,
+                None,
+            ]
+        )
+        content = BytesIO()
+        workbook.save(content)
+        return content.getvalue()
+
+    def imported(self):
+        return list(
+            CashFlowRecord.objects.order_by("created_at").values_list(
+                "created_at", "amount", "comment", "category_id"
+            )
+        )
+
+    def test_xlsx_round_trip(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "statement.xlsx")
+            with open(path, "wb") as statement:
+                statement.write(self.xlsx())
+            call_command("import_cashflow", path, stdout=StringIO())
+            with open(f"{path}.rejects.csv", encoding="utf-8") as rejects_file:
+                rejects = list(csv.reader(rejects_file))
+
+        self.assertEqual([row[0] for row in rejects[1:]], ["3", "4"])
+        self.assertEqual(
+            self.imported(),
+            [
+                (date(2025, 1, 10), Decimal("1000.50"), "Первая", self.category.pk),
+                (date(2025, 1, 13), Decimal("20.00"), None, self.category.pk),
+            ],
+        )
+        call_command("rebuild_rollups", "--check", stdout=StringIO())
+
+    def test_xlsx_upload_matches_csv(self):
+        response = self.client.post(
+            reverse("cashflow_import"),
+            {"file": SimpleUploadedFile("statement.xlsx", self.xlsx())},
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            (response.json()["created"], response.json()["rejected"]), (2, 2)
+        )
+        from_xlsx = self.imported()
+        CashFlowRecord.objects.all().delete()
+
+        upload = SimpleUploadedFile("statement.csv", self.CSV.encode())
+        self.client.post(reverse("cashflow_import"), {"file": upload})
+        self.assertEqual(
+            [row[:2] + row[3:] for row in self.imported()],
+            [row[:2] + row[3:] for row in from_xlsx],
+        )
+
+    def test_upload_endpoint(self):
+        upload = SimpleUploadedFile("statement.csv", self.CSV.encode())
+        response = self.client.post(reverse("cashflow_import"), {"file": upload})
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual((data["created"], data["rejected"]), (2, 2))
+        self.assertEqual([reject["line"] for reject in data["rejects"]], [3, 4])
+
+
+class CashFlowExportTests(CashFlowTestMixin, TestCase):
+    """
+    Потоковая выгрузка записей.
+    """
+
+    def export(self, export_format, **params):
+        response = self.client.get(
+            reverse("cashflow_export", args=[export_format]), params
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        return b"".join(response.streaming_content).decode("utf-8-sig")
+
+    def test_csv_with_filters(self):
+        self.create_records(1, created_at=date(2025, 1, 1), comment="Январь")
+        self.create_records(1, created_at=date(2025, 2, 1), comment="Февраль")
+        rows = list(csv.reader(self.export("csv", date_from="2025-02-01").splitlines()))
+        self.assertEqual(rows[0][:3], ["id", "created_at", "status"])
+        self.assertEqual([row[-1] for row in rows[1:]], ["Февраль"])
+
+    def test_ndjson(self):
+        self.create_records(2)
+        lines = self.export("ndjson").splitlines()
+        self.assertEqual(len(lines), 2)
+        record = json.loads(lines[0])
+        self.assertEqual(record["subcategory"], "VPS")
+        self.assertEqual(record["created_at"], "2025-01-01")
+
+    def test_streaming_is_measured(self):
+        registry.reset()
+        self.create_records(2)
+        self.export("ndjson")
+        _, _, count = registry.histograms["duration"].series["cashflow_export:stream"]
+        self.assertEqual(count, 1)
+        _, queries, _ = registry.histograms["queries"].series["cashflow_export:stream"]
+        self.assertGreater(queries, 0)
+
+    async def test_asgi_streams_asynchronously(self):
+        registry.reset()
+        await sync_to_async(self.create_records)(3, comment="Запись")
+        response = await self.async_client.get(reverse("cashflow_export", args=["csv"]))
+        self.assertEqual(response.status_code, 200)
+        # Асинхронный итератор ASGI-обработчик не читает в список
+        self.assertTrue(response.is_async)
+        content = b"".join([chunk async for chunk in response.streaming_content])
+        rows = list(csv.reader(content.decode("utf-8-sig").splitlines()))
+        self.assertEqual(rows[0][0], "id")
+        self.assertEqual([row[-1] for row in rows[1:]], ["Запись"] * 3)
+        _, queries, _ = registry.histograms["queries"].series["cashflow_export:stream"]
+        self.assertGreater(queries, 0)
+
+    def test_unknown_format(self):
+        response = self.client.get(reverse("cashflow_export", args=["xml"]))
+        self.assertEqual(response.status_code, 404)
+
+
+class ReferenceRegistryTests(CashFlowTestMixin, TestCase):
+    """
+    Кешированный снимок справочников.
+    """
+
+    def test_served_without_queries_until_changed(self):
+        get_references()
+        with self.assertNumQueries(0):
+            references = get_references()
+            self.assertEqual(
+                references.options(Status), [{"id": self.status.pk, "name": "Бизнес"}]
+            )
+            self.assertTrue(
+                references.category_belongs_to_type(self.category.pk, self.type.pk)
+            )
+
+        status = Status.objects.create(name="Личное")
+        self.assertIn(status.pk, get_references().status_ids)
+        status.delete()
+        self.assertNotIn(status.pk, get_references().status_ids)
+
+    def test_serializer_resolves_references_from_cache(self):
+        get_references()
+        serializer = CashFlowRecordSerializer(
+            data={
+                "created_at": "2025-01-10",
+                "status": self.status.pk,
+                "type": self.type.pk,
+                "category": self.category.pk,
+                "subcategory": self.subcategory.pk,
+                "amount": "10.00",
+            }
+        )
+        with self.assertNumQueries(0):
+            self.assertTrue(serializer.is_valid(), serializer.errors)
+            self.assertEqual(
+                dict(serializer.fields["category"].get_choices()),
+                {self.category.pk: "Инфраструктура (Пополнение)"},
+            )
+
+    def test_serializer_rejects_unknown_reference(self):
+        serializer = CashFlowRecordSerializer(
+            data={
+                "created_at": "2025-01-10",
+                "status": 10**9,
+                "type": self.type.pk,
+                "category": self.category.pk,
+                "subcategory": self.subcategory.pk,
+                "amount": "10.00",
+            }
+        )
+        self.assertFalse(serializer.is_valid())
+        self.assertIn("status", serializer.errors)
+
+    def test_stale_snapshot_falls_back_to_database(self):
+        # Справочник, добавленный другим процессом: снимок этого не видит
+        references = get_references()
+        (category,) = Category.objects.bulk_create(
+            [Category(name="Реклама", type=self.type)]
+        )
+        (subcategory,) = SubCategory.objects.bulk_create(
+            [SubCategory(name="Баннеры", category=category)]
+        )
+        self.assertIs(get_references(), references)
+        self.assertNotIn(category.pk, references.category_names)
+
+        self.assertEqual(references.get(Category, category.pk), category)
+        self.assertTrue(references.exists(SubCategory, subcategory.pk))
+        self.assertFalse(references.exists(Category, 10**9))
+        self.assertEqual(references.find_category("реклама", self.type.pk), category.pk)
+        self.assertIsNone(references.find_category("Реклама", 10**9))
+
+        serializer = CashFlowRecordSerializer(
+            data={
+                "created_at": "2025-01-10",
+                "status": self.status.pk,
+                "type": self.type.pk,
+                "category": category.pk,
+                "subcategory": subcategory.pk,
+                "amount": "10.00",
+            }
+        )
+        self.assertTrue(serializer.is_valid(), serializer.errors)
+        record = serializer.save()
+        self.assertEqual(record.subcategory_id, subcategory.pk)
+
+    def test_missing_names_are_looked_up_once(self):
+        references = get_references()
+        with self.assertNumQueries(1):
+            for _ in range(3):
+                self.assertIsNone(references.find_status("Нет такого"))
+
+    def test_create_form_renders_choices(self):
+        response = self.client.get(reverse("cashflow_create"))
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, "Инфраструктура (Пополнение)")
+
+
+class ReferenceOptionsTests(CashFlowTestMixin, TestCase):
+    """
+    Варианты зависимых выпадающих списков.
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.other_type = Type.objects.create(name="Списание")
+        self.other_category = Category.objects.create(
+            name="Маркетинг", type=self.other_type
+        )
+
+    def test_categories_of_type_with_etag(self):
+        url = reverse("type_categories", args=[self.type.pk])
+        get_references()
+        with self.assertNumQueries(0):
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            response.json(), [{"id": self.category.pk, "name": "Инфраструктура"}]
+        )
+        self.assertIn("max-age=", response["Cache-Control"])
+        etag = response["ETag"]
+
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b"")
+
+        Category.objects.create(name="Связь", type=self.type)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], etag)
+        self.assertEqual(len(response.json()), 2)
+
+    def test_subcategories_of_category(self):
+        response = self.client.get(
+            reverse("category_subcategories", args=[self.category.pk])
+        )
+        self.assertEqual(response.json(), [{"id": self.subcategory.pk, "name": "VPS"}])
+        response = self.client.get(
+            reverse("category_subcategories", args=[self.other_category.pk])
+        )
+        self.assertEqual(response.json(), [])
+
+    def test_unknown_parent(self):
+        response = self.client.get(reverse("type_categories", args=[10**9]))
+        self.assertEqual(response.status_code, 404)
+
+    def test_pages_render_only_selected_branch(self):
+        response = self.client.get(reverse("cashflow_list"))
+        self.assertNotContains(response, "Маркетинг")
+        self.assertNotContains(response, "VPS")
+
+        response = self.client.get(
+            reverse("cashflow_list"), {"type": self.other_type.pk}
+        )
+        self.assertContains(response, "Маркетинг")
+        self.assertNotContains(response, "Инфраструктура")
+
+        # В форме создания выбран первый тип — только его категории
+        response = self.client.get(reverse("cashflow_create"))
+        self.assertContains(response, "Инфраструктура (Пополнение)")
+        self.assertNotContains(response, "Маркетинг")
+
+
+class CashFlowHierarchyTests(CashFlowTestMixin, TestCase):
+    """
+    Проверка иерархии тип -> категория -> подкатегория.
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.other_type = Type.objects.create(name="Списание")
+        get_references()
+
+    def mismatched_record(self):
+        return CashFlowRecord(
+            created_at=date(2025, 1, 1),
+            status=self.status,
+            type=self.other_type,
+            category=self.category,
+            subcategory=self.subcategory,
+            amount=Decimal("1.00"),
+        )
+
+    def test_save_checks_ids_without_queries(self):
+        record = self.mismatched_record()
+        with self.assertNumQueries(0):
+            with self.assertRaises(ValueError):
+                record.save()
+        record.type = self.type
+        with self.assertNumQueries(1):
+            record.save()
+
+    def test_database_rejects_bulk_create_bypassing_save(self):
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            with connection.cursor() as cursor:
+                cursor.execute("SET CONSTRAINTS ALL IMMEDIATE")
+            CashFlowRecord.objects.bulk_create([self.mismatched_record()])
+
+    def test_mismatched_records_reported_and_repaired_on_request(self):
+        # Ключи отложенные: до конца транзакции теста строка остаётся
+        (record,) = CashFlowRecord.objects.bulk_create([self.mismatched_record()])
+        migration = import_module(
+            "djangoDDS.migrations.0008_record_hierarchy_constraints"
+        )
+        with self.assertRaisesMessage(CommandError, f"id={record.pk}:"):
+            migration.check_hierarchy(None, connection.schema_editor())
+
+        out = StringIO()
+        with self.assertRaises(CommandError):
+            call_command("repair_cashflow_hierarchy", stdout=out)
+        self.assertIn(f"id={record.pk}: type={self.other_type.pk}", out.getvalue())
+        record.refresh_from_db()
+        self.assertEqual(record.type_id, self.other_type.pk)
+
+        call_command("repair_cashflow_hierarchy", "--fix", stdout=out)
+        record.refresh_from_db()
+        self.assertEqual(record.type_id, self.type.pk)
+        migration.check_hierarchy(None, connection.schema_editor())
+
+    def test_category_type_locked_while_records_exist(self):
+        self.create_records(1)
+        serializer = CategorySerializer(
+            self.category, data={"name": "Инфраструктура", "type": self.other_type.pk}
+        )
+        self.assertFalse(serializer.is_valid())
+        self.assertIn("type", serializer.errors)
@@ -1,14 +1,23 @@
 from django.urls import include, path
 from rest_framework.routers import DefaultRouter
 
-from .views import (CashFlowCreateView, CashFlowDeleteView, CashFlowDetailView,
-                    CashFlowListView, CashFlowUpdateView, CategoryCreateView,
-                    CategoryDeleteView, CategoryDetailView, CategoryListView,
+from .async_views import (AsyncCashFlowDetailView, AsyncCashFlowListView,
+                          AsyncCategoryDetailView, AsyncCategoryListView,
+                          AsyncStatusDetailView, AsyncStatusListView,
+                          AsyncSubCategoryDetailView, AsyncSubCategoryListView,
+                          AsyncTypeDetailView, AsyncTypeListView)
+from .views import (CashFlowBalanceView, CashFlowBulkView, CashFlowCreateView,
+                    CashFlowDeleteView, CashFlowDetailView, CashFlowExportView,
+                    CashFlowImportView, CashFlowListView, CashFlowReportView,
+                    CashFlowRestoreView, CashFlowSearchView,
+                    CashFlowUpdateView, CategoryCreateView, CategoryDeleteView,
+                    CategoryDetailView, CategoryListView,
+                    CategorySubcategoriesView, DatabaseHealthView, MetricsView,
                     StatusCreateView, StatusDeleteView, StatusDetailView,
                     StatusListView, SubCategoryCreateView,
                     SubCategoryDeleteView, SubCategoryDetailView,
-                    SubCategoryListView, TypeCreateView, TypeDeleteView,
-                    TypeDetailView, TypeListView)
+                    SubCategoryListView, TypeCategoriesView, TypeCreateView,
+                    TypeDeleteView, TypeDetailView, TypeListView)
 
 router = DefaultRouter()
 
@@ -16,12 +25,27 @@ urlpatterns = [
     # CashFlow URLs
     path("cashflow/", CashFlowListView.as_view(), name="cashflow_list"),
     path("cashflow/create/", CashFlowCreateView.as_view(), name="cashflow_create"),
+    path("cashflow/bulk/", CashFlowBulkView.as_view(), name="cashflow_bulk"),
+    path("cashflow/import/", CashFlowImportView.as_view(), name="cashflow_import"),
+    path(
+        "cashflow/export/<str:export_format>/",
+        CashFlowExportView.as_view(),
+        name="cashflow_export",
+    ),
+    path("cashflow/search/", CashFlowSearchView.as_view(), name="cashflow_search"),
+    path("cashflow/report/", CashFlowReportView.as_view(), name="cashflow_report"),
+    path("cashflow/balance/", CashFlowBalanceView.as_view(), name="cashflow_balance"),
     path("cashflow/<int:pk>/", CashFlowDetailView.as_view(), name="cashflow_detail"),
     path(
         "cashflow/<int:pk>/delete/",
         CashFlowDeleteView.as_view(),
         name="cashflow_delete",
     ),
+    path(
+        "cashflow/<int:pk>/restore/",
+        CashFlowRestoreView.as_view(),
+        name="cashflow_restore",
+    ),
     path(
         "cashflow/<int:pk>/edit/", CashFlowUpdateView.as_view(), name="cashflow_update"
     ),
@@ -34,6 +58,11 @@ urlpatterns = [
         CategoryDeleteView.as_view(),
         name="category_delete",
     ),
+    path(
+        "category/<int:pk>/subcategories/",
+        CategorySubcategoriesView.as_view(),
+        name="category_subcategories",
+    ),
     # SubCategory URLs
     path("subcategory/", SubCategoryListView.as_view(), name="subcategory_list"),
     path(
@@ -56,10 +85,49 @@ urlpatterns = [
     path("type/create/", TypeCreateView.as_view(), name="type_create"),
     path("type/<int:pk>/", TypeDetailView.as_view(), name="type_detail"),
     path("type/<int:pk>/delete/", TypeDeleteView.as_view(), name="type_delete"),
+    path(
+        "type/<int:pk>/categories/",
+        TypeCategoriesView.as_view(),
+        name="type_categories",
+    ),
     # Status URLs
     path("status/", StatusListView.as_view(), name="status_list"),
     path("status/create/", StatusCreateView.as_view(), name="status_create"),
     path("status/<int:pk>/", StatusDetailView.as_view(), name="status_detail"),
     path("status/<int:pk>/delete/", StatusDeleteView.as_view(), name="status_delete"),
+    # Асинхронный JSON API (ASGI)
+    path("api/cashflow/", AsyncCashFlowListView.as_view(), name="api_cashflow_list"),
+    path(
+        "api/cashflow/<int:pk>/",
+        AsyncCashFlowDetailView.as_view(),
+        name="api_cashflow_detail",
+    ),
+    path("api/status/", AsyncStatusListView.as_view(), name="api_status_list"),
+    path(
+        "api/status/<int:pk>/",
+        AsyncStatusDetailView.as_view(),
+        name="api_status_detail",
+    ),
+    path("api/type/", AsyncTypeListView.as_view(), name="api_type_list"),
+    path("api/type/<int:pk>/", AsyncTypeDetailView.as_view(), name="api_type_detail"),
+    path("api/category/", AsyncCategoryListView.as_view(), name="api_category_list"),
+    path(
+        "api/category/<int:pk>/",
+        AsyncCategoryDetailView.as_view(),
+        name="api_category_detail",
+    ),
+    path(
+        "api/subcategory/",
+        AsyncSubCategoryListView.as_view(),
+        name="api_subcategory_list",
+    ),
+    path(
+        "api/subcategory/<int:pk>/",
+        AsyncSubCategoryDetailView.as_view(),
+        name="api_subcategory_detail",
+    ),
+    # Service URLs
+    path("health/db/", DatabaseHealthView.as_view(), name="health_db"),
+    path("metrics/", MetricsView.as_view(), name="metrics"),
     path("", include(router.urls)),
 ]
@@ -1,15 +1,51 @@
-from django.db.models import Q
+import hashlib
+import json
+import logging
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.db import router, transaction
+from django.http import Http404, HttpResponse, StreamingHttpResponse
 from django.shortcuts import get_object_or_404, redirect
+from django.template.loader import render_to_string
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import quote_etag
 from rest_framework.permissions import AllowAny
 from rest_framework.renderers import JSONRenderer, TemplateHTMLRenderer
 from rest_framework.response import Response
 from rest_framework.views import APIView
 
-from .models import CashFlowRecord, Category, Status, SubCategory, Type
+from .balances import daily_balances, parse_balance_params
+from .bulk import bulk_save_records
+from .conditional import ConditionalGet
+from .dbpool import check_database, pool_stats
+from .exporting import EXPORT_CONTENT_TYPES, astream_export, stream_export
+from .filters import CashFlowDailyRollupFilter, CashFlowRecordFilter
+from .fragments import (CashFlowTableFragment, fragment_cache_metrics,
+                        records_changed_at)
+from .importing import ImportFormatError, StatementImporter, iter_rows
+from .metrics import atimed_stream, registry, timed_stream
+from .models import (CashFlowDailyRollup, CashFlowRecord, Category, Status,
+                     SubCategory, Type)
+from .pagination import CashFlowKeysetPaginator
+from .references import get_references, references_version
+from .reports import build_report, parse_report_params
+from .rollups import RollupDelta
+from .routers import use_primary
 from .serializers import (CashFlowRecordSerializer, CategorySerializer,
                           StatusSerializer, SubCategorySerializer,
                           TypeSerializer)
 
+health_logger = logging.getLogger("djangoDDS.health")
+
+
+def _int_or_none(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
 
 # ---------CashFlowViews---------
 class CashFlowCreateView(APIView):
@@ -32,30 +68,165 @@ class CashFlowCreateView(APIView):
         )
 
 
+class CashFlowBulkView(APIView):
+    """
+    Пакетное создание и обновление записей.
+
+    Принимает список записей (строки с id обновляют существующие) и
+    возвращает количество сохранённых записей и ошибки по номерам строк.
+    """
+
+    permission_classes = [AllowAny]
+    renderer_classes = [JSONRenderer]
+    max_batch_size = 5000
+
+    def post(self, request):
+        rows = request.data
+        if not isinstance(rows, list):
+            return Response({"detail": "Ожидается список записей."}, status=400)
+        if len(rows) > self.max_batch_size:
+            return Response(
+                {"detail": f"Не больше {self.max_batch_size} записей за запрос."},
+                status=400,
+            )
+
+        result = bulk_save_records(rows)
+        saved = len(result.created) + len(result.updated)
+        return Response(
+            {
+                "created": [record.pk for record in result.created],
+                "updated": [record.pk for record in result.updated],
+                "errors": result.errors,
+            },
+            status=400 if rows and not saved else 200,
+        )
+
+
+class CashFlowImportView(APIView):
+    """
+    Загрузка выписки (CSV или XLSX) файлом.
+
+    Файл обрабатывается потоково и порциями, как в команде import_cashflow;
+    в ответе возвращаются итоги и отклонённые строки.
+    """
+
+    permission_classes = [AllowAny]
+    renderer_classes = [JSONRenderer]
+    max_rejects = 1000
+
+    def post(self, request):
+        upload = request.FILES.get("file")
+        if upload is None:
+            return Response({"detail": "Не передан файл выписки."}, status=400)
+        file_format = request.data.get("format") or upload.name.rsplit(".", 1)[-1]
+
+        rejects = []
+
+        def reject(line, raw, errors):
+            if len(rejects) < self.max_rejects:
+                rejects.append({"line": line, "errors": errors})
+
+        importer = StatementImporter(on_reject=reject)
+        try:
+            stats = importer.run(iter_rows(upload.file, file_format.lower()))
+        except ImportFormatError as exc:
+            return Response({"detail": str(exc)}, status=400)
+        return Response(
+            {
+                "processed": stats.processed,
+                "created": stats.created,
+                "rejected": stats.rejected,
+                "rejects": rejects,
+            }
+        )
+
+
+class CashFlowExportView(APIView):
+    """
+    Потоковая выгрузка записей в CSV или NDJSON.
+
+    Принимает те же фильтры, что и список записей. Строки читаются
+    серверным курсором и сразу отдаются клиенту, не собираясь в памяти:
+    под WSGI синхронным генератором, под ASGI — асинхронным (aiterator).
+    """
+
+    permission_classes = [AllowAny]
+    renderer_classes = [JSONRenderer]
+
+    def get(self, request, export_format):
+        if export_format not in EXPORT_CONTENT_TYPES:
+            raise Http404
+        # Строки читаются уже после выхода из middleware, где выбрана
+        # реплика, поэтому псевдоним БД закрепляется за выборкой сейчас
+        queryset = CashFlowRecordFilter(
+            request.query_params,
+            queryset=CashFlowRecord.objects.using(
+                router.db_for_read(CashFlowRecord)
+            ),
+        ).qs
+        label = f"{request.resolver_match.url_name}:stream"
+        if isinstance(request._request, ASGIRequest):
+            chunks = atimed_stream(astream_export(queryset, export_format), label)
+        else:
+            chunks = timed_stream(stream_export(queryset, export_format), label)
+        response = StreamingHttpResponse(
+            chunks, content_type=EXPORT_CONTENT_TYPES[export_format]
+        )
+        response["Content-Disposition"] = (
+            f'attachment; filename="cashflow.{export_format}"'
+        )
+        return response
+
+
 class CashFlowDeleteView(APIView):
     permission_classes = [AllowAny]
     renderer_classes = [TemplateHTMLRenderer, JSONRenderer]
     template_name = "dds/cashflow_delete.html"
 
     def get(self, request, pk):
-        obj = get_object_or_404(CashFlowRecord, pk=pk)
+        obj = get_object_or_404(CashFlowRecord.objects.with_refs(), pk=pk)
         serializer = CashFlowRecordSerializer(obj)
         return Response({"serializer": serializer, "obj": obj})
 
     def post(self, request, pk):
-        obj = get_object_or_404(CashFlowRecord, pk=pk)
-        obj.delete()
+        # Запись помечается удалённой и вычитается из дневных итогов;
+        # строку окончательно удаляет команда purge_cashflow
+        with transaction.atomic():
+            # Строка блокируется, чтобы вычесть из итогов её текущие значения
+            obj = get_object_or_404(CashFlowRecord.objects.select_for_update(), pk=pk)
+            if obj.soft_delete():
+                delta = RollupDelta()
+                delta.remove(obj)
+                delta.apply()
         return redirect("cashflow_list")
 
 
+class CashFlowRestoreView(APIView):
+    """
+    Восстановление удалённой записи.
+    """
+
+    permission_classes = [AllowAny]
+    renderer_classes = [TemplateHTMLRenderer, JSONRenderer]
+
+    def post(self, request, pk):
+        with transaction.atomic():
+            obj = get_object_or_404(
+                CashFlowRecord.all_objects.deleted().select_for_update(), pk=pk
+            )
+            if obj.restore():
+                delta = RollupDelta()
+                delta.add(obj)
+                delta.apply()
+        return redirect("cashflow_detail", pk=obj.pk)
+
+
 class CashFlowListView(APIView):
     permission_classes = [AllowAny]
     renderer_classes = [TemplateHTMLRenderer, JSONRenderer]
     template_name = "dds/cashflow_list.html"
 
     def get(self, request, *args, **kwargs):
-        queryset = CashFlowRecord.objects.all()
-
         selected_type = request.query_params.get("type")
         selected_category = request.query_params.get("category")
         selected_subcategory = request.query_params.get("subcategory")
@@ -64,31 +235,65 @@ class CashFlowListView(APIView):
         date_from = request.query_params.get("date_from")
         date_to = request.query_params.get("date_to")
 
-        if selected_type:
-            queryset = queryset.filter(type_id=selected_type)
-        if selected_category:
-            queryset = queryset.filter(category_id=selected_category)
-        if selected_subcategory:
-            queryset = queryset.filter(subcategory_id=selected_subcategory)
-        if selected_status:
-            queryset = queryset.filter(status_id=selected_status)
-
-        if search_query:
-            queryset = queryset.filter(
-                Q(comment__icontains=search_query) | Q(amount__exact=search_query)
+        # Время изменения берётся и по удалённым записям: мягкое удаление
+        # тоже меняет список, как и отключение старых секций
+        last_modified = CashFlowRecord.all_objects.last_modified()
+        changed_at = records_changed_at()
+        if changed_at is not None and (
+            last_modified is None or changed_at > last_modified
+        ):
+            last_modified = changed_at
+        conditional = ConditionalGet(
+            request, last_modified, references_version(), last_modified=last_modified
+        )
+        response = conditional.not_modified()
+        if response is not None:
+            return conditional.finalize(response)
+
+        if request.accepted_renderer.format == "json":
+            page = self.get_page(request)[1]
+            return conditional.finalize(
+                Response(
+                    {
+                        "results": CashFlowRecordSerializer(
+                            page.objects, many=True
+                        ).data,
+                        "next": page.next_cursor,
+                        "prev": page.prev_cursor,
+                    }
+                )
             )
 
-        if date_from:
-            queryset = queryset.filter(created_at__gte=date_from)
-        if date_to:
-            queryset = queryset.filter(created_at__lte=date_to)
+        # Таблица берётся из кеша; записи читаются только при промахе и из
+        # основной БД, чтобы отстающая реплика не попала в кеш
+        fragment = CashFlowTableFragment(request.query_params)
+        table = fragment.get()
+        cache_status = "hit" if table is not None else "miss"
+        if table is None:
+            with use_primary():
+                page = self.get_page(request)[1]
+            table = fragment.set(
+                render_to_string(
+                    "dds/cashflow_table.html",
+                    {
+                        "objects": page.objects,
+                        "next_url": fragment.page_url(page.next_cursor),
+                        "prev_url": fragment.page_url(page.prev_cursor),
+                    },
+                )
+            )
 
+        # Категории и подкатегории — только выбранного родителя,
+        # остальные подгружаются при смене типа или категории
+        references = get_references()
         context = {
-            "objects": queryset,
-            "types": Type.objects.all(),
-            "categories": Category.objects.all(),
-            "subcategories": SubCategory.objects.all(),
-            "statuses": Status.objects.all(),
+            "table": table,
+            "types": references.options(Type),
+            "categories": references.children(Category, _int_or_none(selected_type)),
+            "subcategories": references.children(
+                SubCategory, _int_or_none(selected_category)
+            ),
+            "statuses": references.options(Status),
             "selected_type": selected_type or "",
             "selected_category": selected_category or "",
             "selected_subcategory": selected_subcategory or "",
@@ -97,7 +302,115 @@ class CashFlowListView(APIView):
             "date_from": date_from or "",
             "date_to": date_to or "",
         }
-        return Response(context)
+        response = Response(context)
+        response["X-Fragment-Cache"] = cache_status
+        return conditional.finalize(response)
+
+    def get_page(self, request):
+        queryset = CashFlowRecordFilter(
+            request.query_params, queryset=CashFlowRecord.objects.with_refs()
+        ).qs
+        paginator = CashFlowKeysetPaginator()
+        return paginator, paginator.paginate_queryset(queryset, request)
+
+
+class CashFlowSearchView(APIView):
+    """
+    Поиск записей по комментарию с сортировкой по релевантности.
+    """
+
+    permission_classes = [AllowAny]
+    renderer_classes = [JSONRenderer]
+    default_limit = 20
+    max_limit = 100
+
+    def get(self, request):
+        search_query = request.query_params.get("q", "").strip()
+        if not search_query:
+            return Response({"results": []})
+        try:
+            limit = int(request.query_params.get("limit", self.default_limit))
+        except ValueError:
+            limit = self.default_limit
+        limit = max(1, min(limit, self.max_limit))
+
+        queryset = CashFlowRecord.objects.with_refs().ranked_search(search_query)
+        serializer = CashFlowRecordSerializer(queryset[:limit], many=True)
+        return Response({"results": serializer.data})
+
+
+class CashFlowReportView(APIView):
+    """
+    Итоги по движениям денежных средств: суммы и количество записей
+    с группировкой по периоду и справочникам.
+
+    Принимает те же фильтры, что и список записей, а также
+    period (day/week/month/year) и group_by (type,category,subcategory,status).
+    Без параметра search отчёт строится по дневным итогам.
+    """
+
+    permission_classes = [AllowAny]
+    renderer_classes = [JSONRenderer]
+
+    def get(self, request):
+        period, group_by = parse_report_params(request.query_params)
+        if request.query_params.get("search"):
+            queryset = CashFlowRecordFilter(
+                request.query_params, queryset=CashFlowRecord.objects.all()
+            ).qs
+        else:
+            queryset = CashFlowDailyRollupFilter(
+                request.query_params, queryset=CashFlowDailyRollup.objects.all()
+            ).qs
+        rows = build_report(queryset, period=period, group_by=group_by)
+        total = sum((row["total"] for row in rows), Decimal("0.00"))
+        count = sum(row["count"] for row in rows)
+        # Суммы отдаём строками, как DecimalField в сериализаторах
+        for row in rows:
+            row["total"] = str(row["total"])
+        return Response(
+            {
+                "period": period,
+                "group_by": group_by,
+                "results": rows,
+                "total": str(total),
+                "count": count,
+            }
+        )
+
+
+class CashFlowBalanceView(APIView):
+    """
+    Остаток денежных средств на конец каждого дня с операциями.
+
+    Пополнения увеличивают остаток, списания уменьшают. Параметры
+    date_from и date_to ограничивают период; остаток считается от
+    ближайшего снимка (build_balance_snapshots), а не с начала журнала.
+    """
+
+    permission_classes = [AllowAny]
+    renderer_classes = [JSONRenderer]
+
+    def get(self, request):
+        date_from, date_to = parse_balance_params(request.query_params)
+        opening, days = daily_balances(date_from, date_to)
+        closing = days[-1]["balance"] if days else opening
+        return Response(
+            {
+                "date_from": date_from,
+                "date_to": date_to,
+                "opening_balance": str(opening),
+                "closing_balance": str(closing),
+                "results": [
+                    {
+                        "date": day["date"],
+                        "change": str(day["change"]),
+                        "balance": str(day["balance"]),
+                    }
+                    for day in days
+                ],
+            }
+        )
 
 
 class CashFlowDetailView(APIView):
@@ -106,12 +419,21 @@ class CashFlowDetailView(APIView):
     template_name = "dds/cashflow_detail.html"
 
     def get(self, request, pk):
-        obj = get_object_or_404(CashFlowRecord, pk=pk)
-        serializer = CashFlowRecordSerializer(obj)
-        return Response({"serializer": serializer, "obj": obj})
+        obj = get_object_or_404(CashFlowRecord.objects.with_refs(), pk=pk)
+        conditional = ConditionalGet(
+            request, obj.updated_at, references_version(), last_modified=obj.updated_at
+        )
+        response = conditional.not_modified()
+        if response is None:
+            serializer = CashFlowRecordSerializer(obj)
+            if request.accepted_renderer.format == "json":
+                response = Response(serializer.data)
+            else:
+                response = Response({"serializer": serializer, "obj": obj})
+        return conditional.finalize(response)
 
     def post(self, request, pk):
-        obj = get_object_or_404(CashFlowRecord, pk=pk)
+        obj = get_object_or_404(CashFlowRecord.objects.with_refs(), pk=pk)
         serializer = CashFlowRecordSerializer(obj, data=request.data)
         if not serializer.is_valid():
             return Response({"serializer": serializer, "obj": obj})
@@ -125,7 +447,7 @@ class CashFlowUpdateView(APIView):
     template_name = "dds/cashflow_create.html"
 
     def get(self, request, pk):
-        obj = get_object_or_404(CashFlowRecord, pk=pk)
+        obj = get_object_or_404(CashFlowRecord.objects.with_refs(), pk=pk)
         serializer = CashFlowRecordSerializer(obj)
         context = {
             "serializer": serializer,
@@ -134,7 +456,7 @@ class CashFlowUpdateView(APIView):
         return Response(context)
 
     def post(self, request, pk):
-        obj = get_object_or_404(CashFlowRecord, pk=pk)
+        obj = get_object_or_404(CashFlowRecord.objects.with_refs(), pk=pk)
         serializer = CashFlowRecordSerializer(obj, data=request.data)
         if serializer.is_valid():
             serializer.save()
@@ -146,6 +468,48 @@ class CashFlowUpdateView(APIView):
         return Response(context, status=400)
 
 
+# ---------ReferenceOptionsViews---------
+class ReferenceOptionsView(APIView):
+    """
+    Варианты зависимого выпадающего списка из снимка справочников.
+
+    Ответ помечается ETag по содержимому: браузер переиспользует его
+    max_age секунд, а затем перепроверяет и получает 304 без тела,
+    пока справочники не изменились.
+    """
+
+    permission_classes = [AllowAny]
+    renderer_classes = [JSONRenderer]
+    parent_model = None
+    model = None
+    max_age = 60
+
+    def get(self, request, pk):
+        references = get_references()
+        if references.get(self.parent_model, pk) is None:
+            raise Http404
+        options = references.children(self.model, pk)
+        etag = quote_etag(
+            hashlib.md5(
+                json.dumps(options, sort_keys=True).encode(), usedforsecurity=False
+            ).hexdigest()
+        )
+        response = get_conditional_response(request, etag=etag) or Response(options)
+        response["ETag"] = etag
+        patch_cache_control(response, private=True, max_age=self.max_age)
+        return response
+
+
+class TypeCategoriesView(ReferenceOptionsView):
+    parent_model = Type
+    model = Category
+
+
+class CategorySubcategoriesView(ReferenceOptionsView):
+    parent_model = Category
+    model = SubCategory
+
+
 # ---------CategoryViews---------
 class CategoryCreateView(APIView):
     permission_classes = [AllowAny]
@@ -186,9 +550,13 @@ class CategoryListView(APIView):
     template_name = "dds/category_list.html"
 
     def get(self, request):
-        queryset = Category.objects.all()
-        serializer = CategorySerializer()
-        return Response({"serializer": serializer, "objects": queryset})
+        conditional = ConditionalGet(request, references_version())
+        response = conditional.not_modified()
+        if response is None:
+            queryset = Category.objects.all()
+            serializer = CategorySerializer()
+            response = Response({"serializer": serializer, "objects": queryset})
+        return conditional.finalize(response)
 
     def post(self, request):
         serializer = CategorySerializer(data=request.data)
@@ -205,9 +573,13 @@ class CategoryDetailView(APIView):
     template_name = "dds/category_detail.html"
 
     def get(self, request, pk):
-        obj = get_object_or_404(Category, pk=pk)
-        serializer = CategorySerializer(obj)
-        return Response({"serializer": serializer, "obj": obj})
+        conditional = ConditionalGet(request, references_version(), pk)
+        response = conditional.not_modified()
+        if response is None:
+            obj = get_object_or_404(Category, pk=pk)
+            serializer = CategorySerializer(obj)
+            response = Response({"serializer": serializer, "obj": obj})
+        return conditional.finalize(response)
 
     def post(self, request, pk):
         obj = get_object_or_404(Category, pk=pk)
@@ -225,9 +597,13 @@ class SubCategoryListView(APIView):
     template_name = "dds/subcategory_list.html"
 
     def get(self, request):
-        queryset = SubCategory.objects.all()
-        serializer = SubCategorySerializer()
-        return Response({"serializer": serializer, "objects": queryset})
+        conditional = ConditionalGet(request, references_version())
+        response = conditional.not_modified()
+        if response is None:
+            queryset = SubCategory.objects.all()
+            serializer = SubCategorySerializer()
+            response = Response({"serializer": serializer, "objects": queryset})
+        return conditional.finalize(response)
 
     def post(self, request):
         serializer = SubCategorySerializer(data=request.data)
@@ -277,9 +653,13 @@ class SubCategoryDetailView(APIView):
     template_name = "dds/subcategory_detail.html"
 
     def get(self, request, pk):
-        obj = get_object_or_404(SubCategory, pk=pk)
-        serializer = SubCategorySerializer(obj)
-        return Response({"serializer": serializer, "obj": obj})
+        conditional = ConditionalGet(request, references_version(), pk)
+        response = conditional.not_modified()
+        if response is None:
+            obj = get_object_or_404(SubCategory, pk=pk)
+            serializer = SubCategorySerializer(obj)
+            response = Response({"serializer": serializer, "obj": obj})
+        return conditional.finalize(response)
 
     def post(self, request, pk):
         obj = get_object_or_404(SubCategory, pk=pk)
@@ -330,9 +710,13 @@ class TypeListView(APIView):
     template_name = "dds/type_list.html"
 
     def get(self, request):
-        queryset = Type.objects.all()
-        serializer = TypeSerializer()
-        return Response({"serializer": serializer, "objects": queryset})
+        conditional = ConditionalGet(request, references_version())
+        response = conditional.not_modified()
+        if response is None:
+            queryset = Type.objects.all()
+            serializer = TypeSerializer()
+            response = Response({"serializer": serializer, "objects": queryset})
+        return conditional.finalize(response)
 
     def post(self, request):
         serializer = TypeSerializer(data=request.data)
@@ -349,9 +733,13 @@ class TypeDetailView(APIView):
     template_name = "dds/type_detail.html"
 
     def get(self, request, pk):
-        obj = get_object_or_404(Type, pk=pk)
-        serializer = TypeSerializer(obj)
-        return Response({"serializer": serializer, "obj": obj})
+        conditional = ConditionalGet(request, references_version(), pk)
+        response = conditional.not_modified()
+        if response is None:
+            obj = get_object_or_404(Type, pk=pk)
+            serializer = TypeSerializer(obj)
+            response = Response({"serializer": serializer, "obj": obj})
+        return conditional.finalize(response)
 
     def post(self, request, pk):
         obj = get_object_or_404(Type, pk=pk)
@@ -369,9 +757,13 @@ class StatusListView(APIView):
     template_name = "dds/status_list.html"
 
     def get(self, request):
-        queryset = Status.objects.all()
-        serializer = StatusSerializer()
-        return Response({"serializer": serializer, "objects": queryset})
+        conditional = ConditionalGet(request, references_version())
+        response = conditional.not_modified()
+        if response is None:
+            queryset = Status.objects.all()
+            serializer = StatusSerializer()
+            response = Response({"serializer": serializer, "objects": queryset})
+        return conditional.finalize(response)
 
     def post(self, request):
         serializer = StatusSerializer(data=request.data)
@@ -388,9 +780,13 @@ class StatusDetailView(APIView):
     template_name = "dds/status_detail.html"
 
     def get(self, request, pk):
-        obj = get_object_or_404(Status, pk=pk)
-        serializer = StatusSerializer(obj)
-        return Response({"serializer": serializer, "obj": obj})
+        conditional = ConditionalGet(request, references_version(), pk)
+        response = conditional.not_modified()
+        if response is None:
+            obj = get_object_or_404(Status, pk=pk)
+            serializer = StatusSerializer(obj)
+            response = Response({"serializer": serializer, "obj": obj})
+        return conditional.finalize(response)
 
     def post(self, request, pk):
         obj = get_object_or_404(Status, pk=pk)
@@ -432,3 +828,55 @@ class StatusDeleteView(APIView):
         obj = get_object_or_404(Status, pk=pk)
         obj.delete()
         return redirect("status_list")
+
+
+# ---------ServiceViews---------
+class DatabaseHealthView(APIView):
+    """
+    Проверка соединения с БД и состояние пула соединений текущего процесса
+    (для мониторинга и проб балансировщика).
+    """
+
+    permission_classes = [AllowAny]
+    renderer_classes = [JSONRenderer]
+
+    def get(self, request):
+        # Текст ошибки (хост, пользователь, имя БД) пишется только в журнал:
+        # проверка доступна без авторизации
+        ok = self.check("default")
+        data = {"database": "ok" if ok else "error", "pool": pool_stats()}
+        # Недоступная реплика не делает сервис неработоспособным
+        replicas = getattr(settings, "DATABASE_REPLICAS", {})
+        if replicas:
+            data["replicas"] = {
+                alias: "ok" if self.check(alias) else "error" for alias in replicas
+            }
+        return Response(data, status=200 if ok else 503)
+
+    def check(self, alias):
+        ok, error = check_database(alias)
+        if not ok:
+            health_logger.error("БД %s недоступна: %s", alias, error)
+        return ok
+
+
+class MetricsView(APIView):
+    """
+    Гистограммы метрик запросов текущего процесса и счётчики кеша таблицы
+    записей (общие для процессов) в формате Prometheus.
+
+    Доступно только с адресов из METRICS_ALLOWED_IPS (по умолчанию —
+    локальных), чтобы метрики не были видны снаружи.
+    """
+
+    permission_classes = [AllowAny]
+    renderer_classes = [JSONRenderer]
+
+    def get(self, request):
+        allowed = getattr(settings, "METRICS_ALLOWED_IPS", ("127.0.0.1", "::1"))
+        if request.META.get("REMOTE_ADDR") not in allowed:
+            raise Http404
+        return HttpResponse(
+            registry.expose() + fragment_cache_metrics(),
+            content_type="text/plain; version=0.0.4; charset=utf-8",
+        )
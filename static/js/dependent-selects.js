@@ -0,0 +1,70 @@
+/*
+ * Зависимые списки тип -> категория -> подкатегория.
+ *
+ * Форма с классом js-dependent-selects указывает адреса вариантов
+ * в data-categories-url и data-subcategories-url (с 0 вместо
+ * идентификатора родителя). При смене родителя варианты дочернего
+ * списка загружаются с сервера; ответы кешируются браузером по ETag.
+ */
+
+(() => {
+  'use strict'
+
+  const optionsUrl = (template, id) => template.replace(/\/0\/$/, `/${id}/`)
+
+  const resetOptions = select => {
+    // Пустой вариант («Все») остаётся, остальные удаляются
+    for (const option of Array.from(select.options)) {
+      if (option.value !== '') {
+        option.remove()
+      }
+    }
+  }
+
+  const loadOptions = async (select, template, parentId, selectedId) => {
+    resetOptions(select)
+    if (!parentId) {
+      return
+    }
+    const response = await fetch(optionsUrl(template, parentId), {
+      headers: { Accept: 'application/json' }
+    })
+    if (!response.ok) {
+      return
+    }
+    for (const item of await response.json()) {
+      const option = new Option(item.name, item.id)
+      option.selected = String(item.id) === selectedId
+      select.add(option)
+    }
+  }
+
+  const bind = (parent, child, template, next) => {
+    if (!parent || !child || !template) {
+      return
+    }
+    parent.addEventListener('change', async () => {
+      await loadOptions(child, template, parent.value, child.value)
+      child.dispatchEvent(new Event('change'))
+    })
+    const hasOptions = Array.from(child.options).some(option => option.value !== '')
+    if (!hasOptions && parent.value) {
+      loadOptions(child, template, parent.value, child.value).then(next)
+    } else if (next) {
+      next()
+    }
+  }
+
+  const init = form => {
+    const type = form.querySelector('select[name="type"]')
+    const category = form.querySelector('select[name="category"]')
+    const subcategory = form.querySelector('select[name="subcategory"]')
+    bind(type, category, form.dataset.categoriesUrl, () => {
+      bind(category, subcategory, form.dataset.subcategoriesUrl)
+    })
+  }
+
+  window.addEventListener('DOMContentLoaded', () => {
+    document.querySelectorAll('form.js-dependent-selects').forEach(init)
+  })
+})()